@@ -64,6 +64,7 @@ from .covariance_estimator import *
 from .matrix_ops import *
 from .ringbuffer import *
 from .spike_alignment import *
+from .spike_store import *
 
 from .funcs_preprocessing import *
 
@@ -88,6 +88,7 @@ class BaseTimeSeriesCovarianceEstimator(object):
         self._is_initialised = False
         self._n_upd = 0
         self._n_upd_smpl = 0
+        self._version = 0
 
     ## getter and setter methods
 
@@ -123,6 +124,14 @@ class BaseTimeSeriesCovarianceEstimator(object):
     def _get_whitening_op(self, **kwargs):
         raise NotImplementedError
 
+    def get_whitening_filter(self, **kwargs):
+        if self._is_initialised is False:
+            raise RuntimeError('Estimator has not been initialised!')
+        return self._get_whitening_filter(**kwargs)
+
+    def _get_whitening_filter(self, **kwargs):
+        raise NotImplementedError
+
     def get_cond(self, **kwargs):
         if not self.is_initialised:
             raise RuntimeError('Estimator has not been initialised!')
@@ -156,6 +165,13 @@ class BaseTimeSeriesCovarianceEstimator(object):
     def is_initialised(self):
         return self._is_initialised
 
+    def get_version(self):
+        return self._version
+
+    version = property(get_version,
+                       doc='counter of changes to the estimate, dependent '
+                           'results only have to be recalculated on change')
+
     ## public methods
 
     def reset(self):
@@ -164,6 +180,7 @@ class BaseTimeSeriesCovarianceEstimator(object):
         self._is_initialised = False
         self._n_upd = 0
         self._n_upd_smpl = 0
+        self._version += 1
         self._reset()
 
     def update(self, data, **kwargs):
@@ -186,6 +203,7 @@ class BaseTimeSeriesCovarianceEstimator(object):
         if n_smpl > 0:
             self._n_upd += 1
             self._n_upd_smpl += n_smpl
+            self._version += 1
 
     ## private methods
 
@@ -255,6 +273,7 @@ class TimeSeriesCovE(BaseTimeSeriesCovarianceEstimator):
         self._buf_icmx = {}
         self._buf_svd = {}
         self._buf_whi = {}
+        self._buf_whf = {}
         self._chan_set = []
 
         # init
@@ -358,6 +377,45 @@ class TimeSeriesCovE(BaseTimeSeriesCovarianceEstimator):
                 sp.dot(svd[0], sp.diag(sp.sqrt(1. / svd[1]))), svd[2])
         return self._buf_whi[buf_key]
 
+    def _get_whitening_filter(self, **kwargs):
+        """yield a streaming whitening filter with respect to the current
+        estimate
+
+        The filter is the multichanneled prediction error filter for a
+        prediction over tf - 1 past samples, scaled to unit covariance of the
+        prediction error. Its taps are read off the block row of the inverse
+        (block-) toeplitz covariance matrix over tf samples that belongs to
+        the most recent sample, which takes one solve for the channels
+        instead of a full inverse. Applied to a signal with
+        `mcfilter_bank_hist` it yields the whitened signal, one filter per
+        output channel.
+
+        :type chan_set: tuple
+        :keyword chan_set: channel ids forming a valid channel set
+        :type tf: int
+        :keyword tf: length of the whitening filter in samples
+        :returns: ndarray - whitening filter bank [channels, tf, channels]
+        """
+
+        tf, chan_set = self._process_keywords(kwargs)
+        buf_key = (tf, chan_set)
+        if buf_key not in self._buf_whf:
+            nc = len(chan_set)
+            cmx = self._get_cmx(**kwargs)
+            # rows of the most recent sample, concatenated form is channel
+            # major
+            last = sp.arange(nc) * tf + tf - 1
+            rhs = sp.zeros((cmx.shape[0], nc))
+            rhs[last, sp.arange(nc)] = 1.0
+            row = sp_la.solve(cmx, rhs, sym_pos=True).T
+            icov = row[:, last]
+            cov = sp_la.inv(icov)
+            icov_sqrt = sp_la.cholesky((icov + icov.T) / 2.0)
+            whf = sp.dot(icov_sqrt, sp.dot(cov, row))
+            self._buf_whf[buf_key] = sp.ascontiguousarray(
+                whf.reshape(nc, nc, tf).transpose(0, 2, 1), dtype=self.dtype)
+        return self._buf_whf[buf_key]
+
     # getter and setter - own
 
     def get_tf_max(self):
@@ -472,6 +530,7 @@ class TimeSeriesCovE(BaseTimeSeriesCovarianceEstimator):
         self._buf_icmx.clear()
         self._buf_svd.clear()
         self._buf_whi.clear()
+        self._buf_whf.clear()
 
     def _reset(self):
         self._store.reset()
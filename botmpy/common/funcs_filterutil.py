@@ -55,20 +55,31 @@ __all__ = ['xi_vs_f', 'kteo', 'mteo']
 ##---IMPORTS
 
 import scipy as sp
-from .funcs_general import mcvec_from_conc
-from .funcs_spike import get_cut
-from .mcfilter import mcfilter
+from numpy.fft import rfft, irfft
 from .util import log
 
 ##---FUNCTIONS
 
-def xi_vs_f(xi, f, nc=4):
+def xi_vs_f(xi, f, nc=4, idx=None, out=None, symmetric=False):
     """cross-correlation-tensor for a set of matched patterns and filters
 
     The xcorr-tensor for a set of patterns (xi) and their matched filters (f)
     with a certain lag is returned as ndarray with dimensions [xi, f, tau].
     All multichanneled vectors are presented in their concatenated form.
 
+    All pairs are calculated in one batched operation in the frequency
+    domain, the sum over the channels is taken on the spectra and a single
+    inverse transform yields all lags.
+
+    If `idx` is given, only the rows and columns of the tensor for these
+    patterns/filters are calculated and written to `out`, the other entries
+    of `out` are kept. This updates a tensor after some filters changed.
+
+    If `symmetric` is True, only the pairs i <= j are calculated and the
+    others are mirrored as xcorr[j, i] = xcorr[i, j, ::-1]. This is exact
+    if the filters are the patterns themselves and a close approximation
+    for matched filters under a common noise covariance.
+
     :type xi: ndarray
     :param xi: The patterns, one concatenated pattern per row.
     :type f: ndarray
@@ -77,6 +88,20 @@ def xi_vs_f(xi, f, nc=4):
     :param nc: The channel count for the concatenated patterns and filters.
 
         Default=4
+    :type idx: iterable
+    :param idx: indices of the rows and columns to calculate, if None
+        calculate the full tensor.
+
+        Default=None
+    :type out: ndarray
+    :param out: tensor to write the result to, required if `idx` is given.
+
+        Default=None
+    :type symmetric: bool
+    :param symmetric: if True, calculate only half of the pairs and mirror
+        the rest.
+
+        Default=False
     :returns: ndarray - The tensor of cross-correlation for each pattern
         with each filter. Dimensions as [xi, f, xcorr].
     """
@@ -95,16 +120,44 @@ def xi_vs_f(xi, f, nc=4):
     if tf != round(float(xi.shape[1]) / float(nc)):
         raise ValueError('sample count does not match to nc: xi(%s), nc(%s)' %
                          (xi.shape[1], nc))
-    pad_len = get_cut(tf)[0]
-    pad = sp.zeros((pad_len, nc))
-    rval = sp.zeros((n, n, 2 * tf - 1))
-
-    # calc xcorrs
-    for i in xrange(n):
-        xi_i = sp.vstack((pad, mcvec_from_conc(xi[i], nc=nc), pad))
-        for j in xrange(n):
-            f_j = sp.vstack((pad, mcvec_from_conc(f[j], nc=nc), pad))
-            rval[i, j] = mcfilter(xi_i, f_j)
+    if idx is None:
+        rval = sp.zeros((n, n, 2 * tf - 1))
+        pairs = sp.ones((n, n), dtype=bool)
+    else:
+        if out is None or out.shape != (n, n, 2 * tf - 1):
+            raise ValueError('out has to be of shape %s' %
+                             str((n, n, 2 * tf - 1)))
+        rval = out
+        pairs = sp.zeros((n, n), dtype=bool)
+        idx = list(idx)
+        pairs[idx, :] = True
+        pairs[:, idx] = True
+    if symmetric is True:
+        pairs = sp.triu(pairs | pairs.T)
+    if not pairs.any():
+        return rval
+
+    # spectra per pattern/filter, concatenated form is channel major
+    nfft = 1
+    while nfft < 2 * tf - 1:
+        nfft *= 2
+    xi_fft = rfft(xi.reshape(n, nc, tf), nfft, axis=2)
+    f_fft = rfft(f.reshape(n, nc, tf), nfft, axis=2).conj()
+
+    # calc xcorrs for all pairs at once, channel sum in the frequency domain
+    if pairs.all():
+        xc = irfft(sp.einsum('icw,jcw->ijw', xi_fft, f_fft), nfft, axis=2)
+        pi, pj = slice(None), slice(None)
+    else:
+        pi, pj = sp.nonzero(pairs)
+        xc = irfft(sp.einsum('pcw,pcw->pw', xi_fft[pi], f_fft[pj]), nfft,
+                   axis=1)
+    # lags -(tf-1) .. tf-1
+    rval[pi, pj, :tf - 1] = xc[..., nfft - tf + 1:]
+    rval[pi, pj, tf - 1:] = xc[..., :tf]
+    if symmetric is True:
+        pi, pj = sp.nonzero(pairs & ~sp.eye(n, dtype=bool))
+        rval[pj, pi] = rval[pi, pj, ::-1]
 
     # return
     return rval
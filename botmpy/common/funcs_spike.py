@@ -351,6 +351,8 @@ def chunk_data(data, epochs=None, invert=False, min_len=0):
 def extract_spikes(data, epochs, mc=False):
     """extract spike waveforms of size tf from data
 
+    Epochs reaching past the ends of :data: are zero padded.
+
     :type data: ndarray
     :param data: signal data [[samples, channels]]
     :type epochs: ndarray
@@ -375,24 +377,21 @@ def extract_spikes(data, epochs, mc=False):
     if epochs.shape[0] == 0:
         # early exit
         return sp.zeros((0, epochs.shape[1]))
-    tf, nc = epochs[0, 1] - epochs[0, 0], data.shape[1]
+    starts = sp.asarray(epochs[:, 0], dtype=INDEX_DTYPE)
+    tf, nc = int(epochs[0, 1] - epochs[0, 0]), data.shape[1]
+    ns = data.shape[0]
+    clamped = starts.min() < 0 or starts.max() + tf > ns
 
     # extract
-    if mc is True:
-        rval = sp.zeros((nspikes, tf, nc), dtype=data.dtype)
+    idx = starts[:, None] + sp.arange(tf)
+    if clamped:
+        valid = (idx >= 0) & (idx < ns)
+        rval = data[sp.clip(idx, 0, ns - 1)]
+        rval[~valid] = 0
     else:
-        rval = sp.zeros((nspikes, tf * nc), dtype=data.dtype)
-    for s in xrange(nspikes):
-        for c in xrange(nc):
-            clamp = 0
-            if epochs[s, 1] > data.shape[0]:
-                clamp = epochs[s, 1] - data.shape[0]
-            if mc is True:
-                rval[s, :tf - clamp, c] = \
-                    data[epochs[s, 0]:epochs[s, 1] - clamp, c]
-            else:
-                rval[s, c * tf:(c + 1) * tf - clamp] = \
-                    data[epochs[s, 0]:epochs[s, 1] - clamp, c]
+        rval = data[idx]
+    if mc is False:
+        rval = rval.transpose(0, 2, 1).reshape(nspikes, tf * nc)
 
     # return
     return rval
@@ -498,6 +497,11 @@ def overlaps(sts, window):
     """produces dict of boolean sequences indicating for all spikes in all
     spike trains in :sts: if it participates in an overlap event.
 
+    All spike trains are merged into one time sorted sequence. The closest
+    spikes of other units are the neighbours of the run of spikes of the
+    same unit a spike belongs to, so one sweep over the merged sequence finds
+    all overlaps in O(N log N).
+
     :type sts: dict
     :param sts: spike train set
     :type window: int
@@ -507,34 +511,40 @@ def overlaps(sts, window):
     """
 
     # inits
-    n = len(sts)
+    keys = sts.keys()
+    sizes = [sp.size(sts[k]) for k in keys]
     ovlp, ovlp_nums = {}, {}
-    for k in sts.keys():
-        ovlp[k] = sp.zeros(sts[k].shape, dtype=bool)
-        ovlp_nums[k] = 0
-
-    # run over all pairs of spike trains in sts
-    for i in xrange(n):
-        i_ = sts.keys()[i]
-        trainI = sts[i_]
-        for j in xrange(i + 1, n):
-            # for every pair run over all spikes in i and check if a spike
-            # in j overlaps
-            j_ = sts.keys()[j]
-            trainJ = sts[j_]
-
-            for spkI, spk in enumerate(trainI):
-                d = trainJ - spk
-                overlap_indices = sp.absolute(d) < window
-                if not overlap_indices.sum():
-                    continue
-                ovlp_nums[i_] += 1
-                ovlp_nums[j_] = overlap_indices.sum()
-
-                ovlp[i_][spkI] = True
-                ovlp[j_][overlap_indices] = True
-
-        ovlp_nums[i_] = sum(ovlp[i_])
+    if sum(sizes) == 0:
+        for k in keys:
+            ovlp[k] = sp.zeros(sp.shape(sts[k]), dtype=bool)
+            ovlp_nums[k] = 0
+        return ovlp, ovlp_nums
+
+    # merge all spike trains, sorted by time
+    times = sp.concatenate([sp.ravel(sts[k]) for k in keys])
+    units = sp.repeat(sp.arange(len(keys)), sizes)
+    order = sp.argsort(times, kind='mergesort')
+    times, units = times[order], units[order]
+
+    # nearest spikes of other units are just outside the run of the unit
+    new_run = sp.concatenate(([True], units[1:] != units[:-1]))
+    run = sp.cumsum(new_run) - 1
+    run_start = sp.nonzero(new_run)[0]
+    run_stop = sp.concatenate((run_start[1:], [times.size]))
+    before, after = run_start[run] - 1, run_stop[run]
+    hit = sp.zeros(times.size, dtype=bool)
+    has = before >= 0
+    hit[has] = times[has] - times[before[has]] < window
+    has = after < times.size
+    hit[has] |= times[after[has]] - times[has] < window
+
+    # split into spike trains
+    flags = sp.empty(times.size, dtype=bool)
+    flags[order] = hit
+    bounds = sp.cumsum([0] + sizes)
+    for i, k in enumerate(keys):
+        ovlp[k] = flags[bounds[i]:bounds[i + 1]].reshape(sp.shape(sts[k]))
+        ovlp_nums[k] = ovlp[k].sum()
 
     return ovlp, ovlp_nums
 
@@ -54,33 +54,305 @@ chunk is passed on as the so called history item.
 
 Implementations are given in Python and alternatively as in Cython. On
 import the Cython function is being tried to load, on failure the python
-version is loaded as a fallback.
+version is loaded as a fallback. The Python history kernels are vectorised
+over samples and channels and perform close to the Cython kernels.
+
+The filtering work is done by backends, which are kept in a registry:
+
+* "direct" - the time domain kernels on a single thread
+* "threaded" - the time domain kernels with the output time range split
+  across a pool of threads, see `set_n_threads`
+* "fft" - FFT overlap-save kernels, fastest for long filters and many channels
+* "numpy" - the vectorised Python kernels
+
+Without Cython, "direct" and "threaded" run the Python kernels. Every backend
+provides kernels for a single filter and for a bank of filters sharing the
+same channel set, which is applied by `mcfilter_bank_hist` in a single pass
+over the data using one history item for all filters.
+
+Large banks of similar filters can be factorised into a few shared
+components with `lowrank_factors`. Filtering with the components and
+rebuilding the bank output with `lowrank_rebuild` makes the cost independent
+of the number of filters.
+
+The history functions accept raw int16 ADC samples with a per channel gain
+and offset (physical = gain * raw + offset) and a channel subset. The
+conversion happens inside the kernels, no float copy of the input is made.
+
+Unless a backend is requested explicitly, the backend is looked up in the
+table of tuned choices, and else chosen by the cost model of
+`select_backend`. `tune` runs a micro-benchmark of all backends for a
+filtering task and stores the fastest in a cache file, see `mcfilter_tune`,
+which is loaded on import. With autotuning enabled (`set_autotune` or the
+environment variable BOTMPY_MCFILTER_AUTOTUNE=1), every untuned filtering
+task is benchmarked on first use.
 """
 __docformat__ = "restructuredtext"
-__all__ = ["mcfilter", "mcfilter_hist", "CYTHON_AVAILABLE"]
+__all__ = ["mcfilter", "mcfilter_hist", "mcfilter_bank_hist", "select_backend",
+           "register_backend", "tune", "set_autotune", "get_n_threads",
+           "set_n_threads", "lowrank_factors", "lowrank_rebuild",
+           "CYTHON_AVAILABLE", "BACKENDS"]
 
 ## IMPORTS
 
+import os
+import time
 import scipy as sp
 import warnings
+from .mcfilter_py import (_mcfilter_py, _mcfilter_hist_py, _mcfilter_bank_hist_py,
+                          _mcfilter_bank_hist_adc_py, _adc_convert)
+from .mcfilter_fft import (_mcfilter_fft, _mcfilter_hist_fft,
+                           _mcfilter_bank_hist_fft, _mcfilter_bank_hist_adc_fft,
+                           fft_size)
+from .mcfilter_mt import (_mcfilter_mt, _mcfilter_hist_mt, get_n_threads,
+                          set_n_threads, get_segments)
+from .mcfilter_tune import cache_key, load_cache, save_cache
+from .mcfilter_lowrank import lowrank_factors, lowrank_rebuild
 
 warnings.simplefilter("once")
 
 ## USE_CYTHON
 
 try:
-    from .mcfilter_cy import (_mcfilter_cy32, _mcfilter_cy64, _mcfilter_hist_cy32, _mcfilter_hist_cy64)
+    from .mcfilter_cy import (_mcfilter_cy32, _mcfilter_cy64, _mcfilter_hist_cy32, _mcfilter_hist_cy64,
+                              _mcfilter_bank_hist_cy32, _mcfilter_bank_hist_cy64,
+                              _mcfilter_bank_hist_adc_cy32, _mcfilter_bank_hist_adc_cy64)
 
     CYTHON_AVAILABLE = True
 except ImportError, ex:
-    from .mcfilter_py import _mcfilter_py, _mcfilter_hist_py
-
     warnings.warn("Cython implementation not found! Falling back to Python!\n{}".format(ex), ImportWarning)
     CYTHON_AVAILABLE = False
 
+## CONSTANTS
+
+BACKENDS = []
+
+# relative cost of one FFT operation (per sample and log2(nfft)) with respect
+# to one multiply-add of the direct kernel
+FFT_COST_FACTOR = 3.0
+
+## GLOBALS
+
+_REGISTRY = {}
+_TUNED = load_cache()
+AUTOTUNE = os.environ.get("BOTMPY_MCFILTER_AUTOTUNE", "0") not in ["", "0"]
+
 ##---FUNCTIONS
 
-def mcfilter(mc_data, mc_filt):
+def register_backend(name, hist_kernels, bank_kernels, batch_kernels=None,
+                     threaded=False, adc_kernels=None):
+    """register a filter backend
+
+    All kernels are given per dtype (float32 and float64) and operate on
+    C-contiguous input of that dtype. History kernels update the history
+    item in place.
+
+    :type name: str
+    :param name: name of the backend
+    :type hist_kernels: dict
+    :param hist_kernels: single filter history kernels,
+        {dtype: kernel(mc_data, mc_filt, mc_hist) -> (fout, mc_hist)}
+    :type bank_kernels: dict
+    :param bank_kernels: filter bank history kernels, with the same signature
+        and a filter bank [filters, filter_samples, channels] for mc_filt
+    :type batch_kernels: dict
+    :param batch_kernels: batch mode kernels,
+        {dtype: kernel(mc_data, mc_filt) -> fout}. If None, batch mode runs
+        through the history kernels.
+        Default=None
+    :type threaded: bool
+    :param threaded: if True, the history kernels are split across the thread
+        pool, else they are run on the calling thread.
+        Default=False
+    :type adc_kernels: dict
+    :param adc_kernels: filter bank history kernels for int16 input, per
+        float dtype of the filter,
+        {dtype: kernel(mc_data, mc_filt, mc_hist, chan, gain, offset)}. If
+        None, integer input is converted before the bank kernel is applied.
+        Default=None
+    """
+
+    _REGISTRY[name] = {"hist": hist_kernels,
+                       "bank": bank_kernels,
+                       "batch": batch_kernels,
+                       "threaded": bool(threaded),
+                       "adc": adc_kernels}
+    if name not in BACKENDS:
+        BACKENDS.append(name)
+
+
+def set_autotune(value):
+    """enable or disable benchmarking of untuned filtering tasks
+
+    :type value: bool
+    :param value: if True, filtering tasks that have no tuned backend choice
+        are benchmarked on first use
+    """
+
+    global AUTOTUNE
+    AUTOTUNE = bool(value)
+
+
+def select_backend(ns, tf, nc, nf=1, n_threads=None):
+    """choose the filter backend for a filtering task by a cost model
+
+    The cost of the direct kernel grows with tf * nc per output sample and
+    filter, the cost of the FFT overlap-save kernel grows with the channel
+    and filter count and the logarithm of the block size only. Chunks that
+    do not fill a single FFT block are always filtered in the time domain.
+    The time domain kernel cost is shared by the threads that the chunk is
+    split across.
+
+    :type ns: int
+    :param ns: number of samples to filter
+    :type tf: int
+    :param tf: filter length in samples
+    :type nc: int
+    :param nc: channel count
+    :type nf: int
+    :param nf: filter count
+    :type n_threads: int
+    :param n_threads: thread count, if None use `get_n_threads()`
+    :rtype: str
+    :returns: one of `BACKENDS`
+    """
+
+    nseg = len(get_segments(ns, n_threads, min_len=tf - 1))
+    direct = "threaded" if nseg > 1 else "direct"
+    nfft = fft_size(tf)
+    if ns < nfft:
+        return direct
+    cost_direct = float(tf * nc * nf) / nseg
+    cost_fft = FFT_COST_FACTOR * (nc + nf) * nfft * sp.log2(nfft) / (
+        nfft - tf + 1)
+    if cost_fft < cost_direct:
+        return "fft"
+    return direct
+
+
+def tune(dtype, tf, nc, ns, nf=1, n_threads=None, repeats=3, save=True):
+    """find the fastest backend for a filtering task by a micro-benchmark
+
+    Every registered backend filters random data of the task shape
+    `repeats` times, the backend with the lowest time wins. The result is
+    stored in the table of tuned choices, which is used by the filter
+    functions for all tasks with the same cache key, see
+    `mcfilter_tune.cache_key`.
+
+    :type dtype: dtype
+    :param dtype: data type, float32 or float64, or an integer type for ADC
+        input (filtered with float32 filters)
+    :type tf: int
+    :param tf: filter length in samples
+    :type nc: int
+    :param nc: channel count
+    :type ns: int
+    :param ns: chunk length in samples
+    :type nf: int
+    :param nf: filter count, for nf > 1 the filter bank kernels are tuned
+        Default=1
+    :type n_threads: int
+    :param n_threads: thread count, if None use `get_n_threads()`
+        Default=None
+    :type repeats: int
+    :param repeats: number of timed runs per backend
+        Default=3
+    :type save: bool
+    :param save: if True, write the tuned choices to the cache file
+        Default=True
+    :rtype: str
+    :returns: name of the fastest backend
+    """
+
+    if n_threads is None:
+        n_threads = get_n_threads()
+    adc = None
+    if sp.dtype(dtype).kind in "iu":
+        dtype = sp.dtype(dtype)
+        fdtype = sp.dtype(sp.float32)
+        mc_data = (sp.randn(ns, nc) * 100).astype(dtype)
+        adc = (sp.arange(nc), sp.ones(nc, dtype=fdtype),
+               sp.zeros(nc, dtype=fdtype))
+    else:
+        dtype = fdtype = _check_dtype(dtype)
+        mc_data = sp.randn(ns, nc).astype(dtype)
+    mc_filt = sp.randn(nf, tf, nc).astype(fdtype)
+    kind = "bank" if nf > 1 or adc is not None else "hist"
+    if kind == "hist":
+        mc_filt = mc_filt[0]
+    timings = {}
+    for name in BACKENDS:
+        best = None
+        for _ in xrange(repeats):
+            mc_hist = sp.zeros((tf - 1, nc), dtype=fdtype)
+            t0 = time.time()
+            _run_hist(name, kind, mc_data, mc_filt, mc_hist, n_threads, adc)
+            dt = time.time() - t0
+            if best is None or dt < best:
+                best = dt
+        timings[name] = best
+    rval = min(timings, key=timings.get)
+    _TUNED[cache_key(dtype, tf, nc, ns, nf, n_threads)] = rval
+    if save is True:
+        save_cache(_TUNED)
+    return rval
+
+
+def _check_dtype(dtype):
+    if dtype not in [sp.float32, sp.float64]:
+        return sp.dtype(sp.float32)
+    return sp.dtype(dtype)
+
+
+def _check_backend(backend, dtype, ns, tf, nc, nf=1, n_threads=None):
+    if backend is None or backend == "auto":
+        if n_threads is None:
+            n_threads = get_n_threads()
+        key = cache_key(dtype, tf, nc, ns, nf, n_threads)
+        rval = _TUNED.get(key)
+        if rval in _REGISTRY:
+            return rval
+        if AUTOTUNE is True:
+            return tune(dtype, tf, nc, ns, nf, n_threads)
+        return select_backend(ns, tf, nc, nf, n_threads)
+    if backend not in _REGISTRY:
+        raise ValueError("unknown backend: %s" % backend)
+    return backend
+
+
+def _check_adc(nc_in, chan_set, gain, offset, dtype):
+    if chan_set is None:
+        chan = sp.arange(nc_in, dtype=sp.intp)
+    else:
+        chan = sp.asarray(chan_set, dtype=sp.intp)
+    gain = sp.ones(nc_in, dtype=dtype) * (1.0 if gain is None else gain)
+    offset = sp.ones(nc_in, dtype=dtype) * (0.0 if offset is None else offset)
+    return (chan,
+            sp.ascontiguousarray(gain[chan], dtype=dtype),
+            sp.ascontiguousarray(offset[chan], dtype=dtype))
+
+
+def _run_hist(backend, kind, mc_data, mc_filt, mc_hist, n_threads, adc=None):
+    entry = _REGISTRY[backend]
+    dtype = mc_filt.dtype.type
+    hist_convert = None
+    if adc is None:
+        kernel = entry[kind][dtype]
+    else:
+        chan, gain, offset = adc
+        adc_kernels = entry["adc"]
+        if adc_kernels is None or mc_data.dtype != sp.int16:
+            adc_kernels = _ADC_FALLBACK
+        adc_kernel = adc_kernels[dtype]
+        kernel = lambda d, f, h: adc_kernel(d, f, h, chan, gain, offset)
+        hist_convert = lambda d: _adc_convert(d, chan, gain, offset, dtype)
+    if entry["threaded"] is False:
+        return kernel(mc_data, mc_filt, mc_hist)
+    return _mcfilter_hist_mt(kernel, mc_data, mc_filt, mc_hist, n_threads,
+                             hist_convert)
+
+
+def mcfilter(mc_data, mc_filt, backend=None, n_threads=None):
     """filter a multi-channeled signal with a multi-channeled filter
 
     This is the Python implementation for batch mode filtering. The signal
@@ -90,69 +362,223 @@ def mcfilter(mc_data, mc_filt):
     :param mc_data: signal data [data_samples, channels]
     :type mc_filt: ndarray
     :param mc_filt: FIR filter [filter_samples, channels]
+    :type backend: str
+    :param backend: one of `BACKENDS` or "auto". If None or "auto", the
+        tuned choice or `select_backend` will choose the backend.
+        Default=None
+    :type n_threads: int
+    :param n_threads: number of threads for the "threaded" backend, if None
+        use `get_n_threads()`.
+        Default=None
     :rtype: ndarray
     :returns: filtered signal [data_samples]
     """
 
-    if CYTHON_AVAILABLE is True:
-        dtype = mc_data.dtype
-        if dtype not in [sp.float32, sp.float64]:
-            dtype = sp.float32
-        if mc_data.shape[1] != mc_filt.shape[1]:
-            raise ValueError("channel count does not match")
-        mc_data, mc_filt = (sp.ascontiguousarray(mc_data, dtype=dtype),
-                            sp.ascontiguousarray(mc_filt, dtype=dtype))
-        if dtype == sp.float32:
-            return _mcfilter_cy32(mc_data, mc_filt)
-        elif dtype == sp.float64:
-            return _mcfilter_cy64(mc_data, mc_filt)
-        else:
-            raise TypeError("dtype is not float32 or float64: %s" % dtype)
-    else:
-        return _mcfilter_py(mc_data, mc_filt)
+    if mc_data.ndim != mc_filt.ndim > 2:
+        raise ValueError("wrong dimensions: %s, %s" %
+                         (mc_data.shape, mc_filt.shape))
+    if mc_data.shape[1] != mc_filt.shape[1]:
+        raise ValueError("channel count does not match")
+    dtype = _check_dtype(mc_data.dtype)
+    tf, nc = mc_filt.shape
+    backend = _check_backend(backend, dtype, mc_data.shape[0], tf, nc,
+                             n_threads=n_threads)
+    mc_data, mc_filt = (sp.ascontiguousarray(mc_data, dtype=dtype),
+                        sp.ascontiguousarray(mc_filt, dtype=dtype))
+    entry = _REGISTRY[backend]
+    if entry["batch"] is not None:
+        return entry["batch"][dtype.type](mc_data, mc_filt)
+    if entry["threaded"] is False:
+        n_threads = 1
+    return _mcfilter_mt(entry["hist"][dtype.type], mc_data, mc_filt,
+                        n_threads)
 
 
-def mcfilter_hist(mc_data, mc_filt, mc_hist=None):
+def mcfilter_hist(mc_data, mc_filt, mc_hist=None, backend=None,
+                  n_threads=None, chan_set=None, gain=None, offset=None):
     """filter a multichanneled signal with a multichanneled fir filter
 
     This is the Python implementation for online mode filtering with a
     chunk-wise history item, holding the last samples of tha preceding chunk.
 
     :type mc_data: ndarray
-    :param mc_data: signal data [data_samples, channels]
+    :param mc_data: signal data [data_samples, channels]. for integer ADC
+        samples, the filter output is computed for gain * mc_data + offset
+        without converting the input first, using the dtype of the history
+        item (or the filter, if no history is given).
     :type mc_filt: ndarray
     :param mc_filt: FIR filter [filter_samples, channels]
     :type mc_hist:
     :param mc_hist: history [hist_samples, channels]. the history is of size
         ´filter_samples - 1´. If None, this will be substituted with zeros.
+    :type backend: str
+    :param backend: one of `BACKENDS` or "auto". If None or "auto", the
+        tuned choice or `select_backend` will choose the backend. All
+        backends produce the same history item, so the backend may change
+        from chunk to chunk.
+        Default=None
+    :type n_threads: int
+    :param n_threads: number of threads for the "threaded" backend, if None
+        use `get_n_threads()`.
+        Default=None
+    :type chan_set: tuple
+    :param chan_set: channels of mc_data to filter, if None use all channels.
+        Default=None
+    :type gain: float or ndarray
+    :param gain: ADC gain, scalar or per channel of mc_data. Only applies to
+        integer input.
+        Default=None
+    :type offset: float or ndarray
+    :param offset: ADC offset, scalar or per channel of mc_data. Only applies
+        to integer input.
+        Default=None
     :rtype: tuple(ndarray,ndarray)
     :returns: filter output [data_samples], history item [hist_samples,
         channels]
     """
 
+    if mc_data.ndim != mc_filt.ndim > 2:
+        raise ValueError("wrong dimensions: %s, %s" %
+                         (mc_data.shape, mc_filt.shape))
+    if mc_data.dtype.kind in "iu":
+        fout, mc_hist = mcfilter_bank_hist(
+            mc_data, mc_filt[sp.newaxis], mc_hist, backend, n_threads,
+            chan_set, gain, offset)
+        return fout[:, 0].copy(), mc_hist
+    if chan_set is not None:
+        mc_data = mc_data[:, chan_set]
     if mc_hist is None:
-        mc_hist = sp.zeros((mc_filt.shape[0] - 1, mc_data.shape[0]))
+        mc_hist = sp.zeros((mc_filt.shape[0] - 1, mc_data.shape[1]))
     if mc_hist.shape[0] + 1 != mc_filt.shape[0]:
         raise ValueError("len(history)+1[%d] != len(filter)[%d]" %
                          (mc_hist.shape[0] + 1, mc_filt.shape[0]))
-    if CYTHON_AVAILABLE is True:
-        dtype = mc_data.dtype
-        if dtype not in [sp.float32, sp.float64]:
-            dtype = sp.float32
-        if mc_data.shape[1] != mc_filt.shape[1]:
-            raise ValueError("channel count does not match")
-        mc_data, mc_filt, mc_hist = (
-            sp.ascontiguousarray(mc_data, dtype=dtype),
-            sp.ascontiguousarray(mc_filt, dtype=dtype),
-            sp.ascontiguousarray(mc_hist, dtype=dtype))
-        if dtype == sp.float32:
-            return _mcfilter_hist_cy32(mc_data, mc_filt, mc_hist)
-        elif dtype == sp.float64:
-            return _mcfilter_hist_cy64(mc_data, mc_filt, mc_hist)
-        else:
-            raise TypeError("dtype is not float32 or float64: %s" % dtype)
+    if mc_data.shape[1] != mc_filt.shape[1]:
+        raise ValueError("channel count does not match")
+    dtype = _check_dtype(mc_data.dtype)
+    tf, nc = mc_filt.shape
+    backend = _check_backend(backend, dtype, mc_data.shape[0], tf, nc,
+                             n_threads=n_threads)
+    mc_data, mc_filt, mc_hist = (
+        sp.ascontiguousarray(mc_data, dtype=dtype),
+        sp.ascontiguousarray(mc_filt, dtype=dtype),
+        sp.ascontiguousarray(mc_hist, dtype=dtype))
+    return _run_hist(backend, "hist", mc_data, mc_filt, mc_hist, n_threads)
+
+
+def mcfilter_bank_hist(mc_data, mc_filt, mc_hist=None, backend=None,
+                       n_threads=None, chan_set=None, gain=None, offset=None):
+    """filter a multichanneled signal with a bank of multichanneled fir filters
+
+    All filters are applied in one pass over the data, sharing one history
+    item. This is equivalent to calling `mcfilter_hist` for each filter with
+    its own copy of the history, but reads the data only once.
+
+    :type mc_data: ndarray
+    :param mc_data: signal data [data_samples, channels]. for integer ADC
+        samples, the filter output is computed for gain * mc_data + offset
+        without converting the input first, using the dtype of the history
+        item (or the filter, if no history is given).
+    :type mc_filt: ndarray
+    :param mc_filt: FIR filter bank [filters, filter_samples, channels]
+    :type mc_hist:
+    :param mc_hist: history [hist_samples, channels]. the history is of size
+        ´filter_samples - 1´. If None, this will be substituted with zeros.
+    :type backend: str
+    :param backend: one of `BACKENDS` or "auto". If None or "auto", the
+        tuned choice or `select_backend` will choose the backend.
+        Default=None
+    :type n_threads: int
+    :param n_threads: number of threads for the "threaded" backend, if None
+        use `get_n_threads()`.
+        Default=None
+    :type chan_set: tuple
+    :param chan_set: channels of mc_data to filter, if None use all channels.
+        Default=None
+    :type gain: float or ndarray
+    :param gain: ADC gain, scalar or per channel of mc_data. Only applies to
+        integer input.
+        Default=None
+    :type offset: float or ndarray
+    :param offset: ADC offset, scalar or per channel of mc_data. Only applies
+        to integer input.
+        Default=None
+    :rtype: tuple(ndarray,ndarray)
+    :returns: filter output [data_samples, filters], history item
+        [hist_samples, channels]
+    """
+
+    if mc_data.ndim != 2 or mc_filt.ndim != 3:
+        raise ValueError("filter bank has to be of shape "
+                         "[filters, filter_samples, channels]")
+    nf, tf, nc = mc_filt.shape
+    adc = None
+    if mc_data.dtype.kind in "iu":
+        # the float dtype is given by the history item, or the filter
+        dtype = _check_dtype(mc_filt.dtype if mc_hist is None
+                             else mc_hist.dtype)
+        adc = _check_adc(mc_data.shape[1], chan_set, gain, offset, dtype)
+        nc_data = len(adc[0])
+    else:
+        dtype = _check_dtype(mc_data.dtype)
+        if chan_set is not None:
+            mc_data = mc_data[:, chan_set]
+        nc_data = mc_data.shape[1]
+    if nc_data != nc:
+        raise ValueError("channel count does not match")
+    if mc_hist is None:
+        mc_hist = sp.zeros((tf - 1, nc))
+    if mc_hist.shape[0] + 1 != tf:
+        raise ValueError("len(history)+1[%d] != len(filter)[%d]" %
+                         (mc_hist.shape[0] + 1, tf))
+    if adc is None:
+        backend = _check_backend(backend, dtype, mc_data.shape[0], tf, nc, nf,
+                                 n_threads)
+        mc_data = sp.ascontiguousarray(mc_data, dtype=dtype)
     else:
-        return _mcfilter_hist_py(mc_data, mc_filt, mc_hist)
+        backend = _check_backend(backend, mc_data.dtype, mc_data.shape[0], tf,
+                                 nc, nf, n_threads)
+    mc_filt, mc_hist = (sp.ascontiguousarray(mc_filt, dtype=dtype),
+                        sp.ascontiguousarray(mc_hist, dtype=dtype))
+    return _run_hist(backend, "bank", mc_data, mc_filt, mc_hist, n_threads,
+                     adc)
+
+## BACKENDS
+
+if CYTHON_AVAILABLE is True:
+    _HIST_KERNELS = {sp.float32: _mcfilter_hist_cy32,
+                     sp.float64: _mcfilter_hist_cy64}
+    _BANK_KERNELS = {sp.float32: _mcfilter_bank_hist_cy32,
+                     sp.float64: _mcfilter_bank_hist_cy64}
+    _BATCH_KERNELS = {sp.float32: _mcfilter_cy32,
+                      sp.float64: _mcfilter_cy64}
+    _ADC_KERNELS = {sp.float32: _mcfilter_bank_hist_adc_cy32,
+                    sp.float64: _mcfilter_bank_hist_adc_cy64}
+else:
+    _HIST_KERNELS = {sp.float32: _mcfilter_hist_py,
+                     sp.float64: _mcfilter_hist_py}
+    _BANK_KERNELS = {sp.float32: _mcfilter_bank_hist_py,
+                     sp.float64: _mcfilter_bank_hist_py}
+    _BATCH_KERNELS = {sp.float32: _mcfilter_py,
+                      sp.float64: _mcfilter_py}
+    _ADC_KERNELS = None
+_ADC_FALLBACK = {sp.float32: _mcfilter_bank_hist_adc_py,
+                 sp.float64: _mcfilter_bank_hist_adc_py}
+register_backend("direct", _HIST_KERNELS, _BANK_KERNELS, _BATCH_KERNELS,
+                 adc_kernels=_ADC_KERNELS)
+register_backend("threaded", _HIST_KERNELS, _BANK_KERNELS, threaded=True,
+                 adc_kernels=_ADC_KERNELS)
+register_backend(
+    "fft",
+    {sp.float32: _mcfilter_hist_fft, sp.float64: _mcfilter_hist_fft},
+    {sp.float32: _mcfilter_bank_hist_fft, sp.float64: _mcfilter_bank_hist_fft},
+    {sp.float32: _mcfilter_fft, sp.float64: _mcfilter_fft},
+    adc_kernels={sp.float32: _mcfilter_bank_hist_adc_fft,
+                 sp.float64: _mcfilter_bank_hist_adc_fft})
+register_backend(
+    "numpy",
+    {sp.float32: _mcfilter_hist_py, sp.float64: _mcfilter_hist_py},
+    {sp.float32: _mcfilter_bank_hist_py, sp.float64: _mcfilter_bank_hist_py},
+    {sp.float32: _mcfilter_py, sp.float64: _mcfilter_py})
 
 ## MAIN
 
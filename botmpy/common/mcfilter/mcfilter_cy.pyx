@@ -123,21 +123,34 @@ def _mcfilter_hist_cy32(
         unsigned int tf = mc_filt.shape[0]
         unsigned int th = mc_hist.shape[0]
         np.ndarray[np.float32_t, ndim=1] fout
-        np.ndarray[np.float32_t, ndim=2] data
         np.float32_t value
-        unsigned int t, tau, c
-    data = np.vstack((mc_hist, mc_data))
+        unsigned int t, tau, c, nh
     fout = np.empty(td, dtype=np.float32)
     with nogil:
         for t in range(td):
+            # the first nh filter taps read from the history
+            nh = th - t if t < th else 0
             value = 0.0
             for c in range(nc):
-                for tau in range(tf):
-                    value += data[t + tau, c] * mc_filt[tau, c]
+                for tau in range(nh):
+                    value += mc_hist[t + tau, c] * mc_filt[tau, c]
+                for tau in range(nh, tf):
+                    value += mc_data[t + tau - th, c] * mc_filt[tau, c]
             fout[t] = value
-        for t in range(th):
-            for c in range(nc):
-                mc_hist[t, c] = data[td + t, c]
+        # history item is the last th samples of [mc_hist; mc_data], it is
+        # written in place. for chunks shorter than the history, the old
+        # history is shifted towards the front first
+        if td >= th:
+            for t in range(th):
+                for c in range(nc):
+                    mc_hist[t, c] = mc_data[td - th + t, c]
+        else:
+            for t in range(th - td):
+                for c in range(nc):
+                    mc_hist[t, c] = mc_hist[td + t, c]
+            for t in range(td):
+                for c in range(nc):
+                    mc_hist[th - td + t, c] = mc_data[t, c]
     return fout, mc_hist
 
 @cython.boundscheck(False)
@@ -152,21 +165,230 @@ def _mcfilter_hist_cy64(
         unsigned int tf = mc_filt.shape[0]
         unsigned int th = mc_hist.shape[0]
         np.ndarray[np.float64_t, ndim=1] fout
-        np.ndarray[np.float64_t, ndim=2] data
         np.float64_t value
-        unsigned int t, tau, c
-    data = np.vstack((mc_hist, mc_data))
+        unsigned int t, tau, c, nh
     fout = np.empty(td, dtype=np.float64)
     with nogil:
         for t in range(td):
+            # the first nh filter taps read from the history
+            nh = th - t if t < th else 0
             value = 0.0
             for c in range(nc):
-                for tau in range(tf):
-                    value += data[t + tau, c] * mc_filt[tau, c]
+                for tau in range(nh):
+                    value += mc_hist[t + tau, c] * mc_filt[tau, c]
+                for tau in range(nh, tf):
+                    value += mc_data[t + tau - th, c] * mc_filt[tau, c]
             fout[t] = value
-        for t in range(th):
-            for c in range(nc):
-                mc_hist[t, c] = data[td + t, c]
+        # history item is the last th samples of [mc_hist; mc_data], it is
+        # written in place. for chunks shorter than the history, the old
+        # history is shifted towards the front first
+        if td >= th:
+            for t in range(th):
+                for c in range(nc):
+                    mc_hist[t, c] = mc_data[td - th + t, c]
+        else:
+            for t in range(th - td):
+                for c in range(nc):
+                    mc_hist[t, c] = mc_hist[td + t, c]
+            for t in range(td):
+                for c in range(nc):
+                    mc_hist[th - td + t, c] = mc_data[t, c]
+    return fout, mc_hist
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def _mcfilter_bank_hist_cy32(
+        np.ndarray[np.float32_t, ndim=2] mc_data,
+        np.ndarray[np.float32_t, ndim=3] mc_filt,
+        np.ndarray[np.float32_t, ndim=2] mc_hist):
+    cdef:
+        unsigned int nc = mc_data.shape[1]
+        unsigned int td = mc_data.shape[0]
+        unsigned int nf = mc_filt.shape[0]
+        unsigned int tf = mc_filt.shape[1]
+        unsigned int th = mc_hist.shape[0]
+        np.ndarray[np.float32_t, ndim=2] fout
+        np.float32_t value
+        unsigned int t, tau, c, f, nh
+    fout = np.empty((td, nf), dtype=np.float32)
+    with nogil:
+        for t in range(td):
+            # the first nh filter taps read from the history
+            nh = th - t if t < th else 0
+            for f in range(nf):
+                value = 0.0
+                for tau in range(nh):
+                    for c in range(nc):
+                        value += mc_hist[t + tau, c] * mc_filt[f, tau, c]
+                for tau in range(nh, tf):
+                    for c in range(nc):
+                        value += mc_data[t + tau - th, c] * mc_filt[f, tau, c]
+                fout[t, f] = value
+        # history item is the last th samples of [mc_hist; mc_data], it is
+        # written in place. for chunks shorter than the history, the old
+        # history is shifted towards the front first
+        if td >= th:
+            for t in range(th):
+                for c in range(nc):
+                    mc_hist[t, c] = mc_data[td - th + t, c]
+        else:
+            for t in range(th - td):
+                for c in range(nc):
+                    mc_hist[t, c] = mc_hist[td + t, c]
+            for t in range(td):
+                for c in range(nc):
+                    mc_hist[th - td + t, c] = mc_data[t, c]
+    return fout, mc_hist
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def _mcfilter_bank_hist_cy64(
+        np.ndarray[np.float64_t, ndim=2] mc_data,
+        np.ndarray[np.float64_t, ndim=3] mc_filt,
+        np.ndarray[np.float64_t, ndim=2] mc_hist):
+    cdef:
+        unsigned int nc = mc_data.shape[1]
+        unsigned int td = mc_data.shape[0]
+        unsigned int nf = mc_filt.shape[0]
+        unsigned int tf = mc_filt.shape[1]
+        unsigned int th = mc_hist.shape[0]
+        np.ndarray[np.float64_t, ndim=2] fout
+        np.float64_t value
+        unsigned int t, tau, c, f, nh
+    fout = np.empty((td, nf), dtype=np.float64)
+    with nogil:
+        for t in range(td):
+            # the first nh filter taps read from the history
+            nh = th - t if t < th else 0
+            for f in range(nf):
+                value = 0.0
+                for tau in range(nh):
+                    for c in range(nc):
+                        value += mc_hist[t + tau, c] * mc_filt[f, tau, c]
+                for tau in range(nh, tf):
+                    for c in range(nc):
+                        value += mc_data[t + tau - th, c] * mc_filt[f, tau, c]
+                fout[t, f] = value
+        # history item is the last th samples of [mc_hist; mc_data], it is
+        # written in place. for chunks shorter than the history, the old
+        # history is shifted towards the front first
+        if td >= th:
+            for t in range(th):
+                for c in range(nc):
+                    mc_hist[t, c] = mc_data[td - th + t, c]
+        else:
+            for t in range(th - td):
+                for c in range(nc):
+                    mc_hist[t, c] = mc_hist[td + t, c]
+            for t in range(td):
+                for c in range(nc):
+                    mc_hist[th - td + t, c] = mc_data[t, c]
+    return fout, mc_hist
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def _mcfilter_bank_hist_adc_cy32(
+        np.ndarray[np.int16_t, ndim=2] mc_data,
+        np.ndarray[np.float32_t, ndim=3] mc_filt,
+        np.ndarray[np.float32_t, ndim=2] mc_hist,
+        np.ndarray[np.intp_t, ndim=1] chan,
+        np.ndarray[np.float32_t, ndim=1] gain,
+        np.ndarray[np.float32_t, ndim=1] offset):
+    cdef:
+        unsigned int nc = mc_filt.shape[2]
+        unsigned int td = mc_data.shape[0]
+        unsigned int nf = mc_filt.shape[0]
+        unsigned int tf = mc_filt.shape[1]
+        unsigned int th = mc_hist.shape[0]
+        np.ndarray[np.float32_t, ndim=2] fout
+        np.ndarray[np.float32_t, ndim=3] filt_g
+        np.ndarray[np.float32_t, ndim=2] ocum
+        np.float32_t value
+        unsigned int t, tau, c, f, nh
+    # the gain is folded into the filter, the offset contributes a constant
+    # per filter and number of taps that read from the data
+    filt_g = np.ascontiguousarray(mc_filt * gain, dtype=np.float32)
+    ocum = np.zeros((nf, tf + 1), dtype=np.float32)
+    ocum[:, :tf] = (mc_filt * offset).sum(axis=2)[:, ::-1].cumsum(axis=1)[:, ::-1]
+    fout = np.empty((td, nf), dtype=np.float32)
+    with nogil:
+        for t in range(td):
+            # the first nh filter taps read from the history
+            nh = th - t if t < th else 0
+            for f in range(nf):
+                value = ocum[f, nh]
+                for tau in range(nh):
+                    for c in range(nc):
+                        value += mc_hist[t + tau, c] * mc_filt[f, tau, c]
+                for tau in range(nh, tf):
+                    for c in range(nc):
+                        value += mc_data[t + tau - th, chan[c]] * filt_g[f, tau, c]
+                fout[t, f] = value
+        # history item holds converted samples
+        if td >= th:
+            for t in range(th):
+                for c in range(nc):
+                    mc_hist[t, c] = mc_data[td - th + t, chan[c]] * gain[c] + offset[c]
+        else:
+            for t in range(th - td):
+                for c in range(nc):
+                    mc_hist[t, c] = mc_hist[td + t, c]
+            for t in range(td):
+                for c in range(nc):
+                    mc_hist[th - td + t, c] = mc_data[t, chan[c]] * gain[c] + offset[c]
+    return fout, mc_hist
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def _mcfilter_bank_hist_adc_cy64(
+        np.ndarray[np.int16_t, ndim=2] mc_data,
+        np.ndarray[np.float64_t, ndim=3] mc_filt,
+        np.ndarray[np.float64_t, ndim=2] mc_hist,
+        np.ndarray[np.intp_t, ndim=1] chan,
+        np.ndarray[np.float64_t, ndim=1] gain,
+        np.ndarray[np.float64_t, ndim=1] offset):
+    cdef:
+        unsigned int nc = mc_filt.shape[2]
+        unsigned int td = mc_data.shape[0]
+        unsigned int nf = mc_filt.shape[0]
+        unsigned int tf = mc_filt.shape[1]
+        unsigned int th = mc_hist.shape[0]
+        np.ndarray[np.float64_t, ndim=2] fout
+        np.ndarray[np.float64_t, ndim=3] filt_g
+        np.ndarray[np.float64_t, ndim=2] ocum
+        np.float64_t value
+        unsigned int t, tau, c, f, nh
+    # the gain is folded into the filter, the offset contributes a constant
+    # per filter and number of taps that read from the data
+    filt_g = np.ascontiguousarray(mc_filt * gain, dtype=np.float64)
+    ocum = np.zeros((nf, tf + 1), dtype=np.float64)
+    ocum[:, :tf] = (mc_filt * offset).sum(axis=2)[:, ::-1].cumsum(axis=1)[:, ::-1]
+    fout = np.empty((td, nf), dtype=np.float64)
+    with nogil:
+        for t in range(td):
+            # the first nh filter taps read from the history
+            nh = th - t if t < th else 0
+            for f in range(nf):
+                value = ocum[f, nh]
+                for tau in range(nh):
+                    for c in range(nc):
+                        value += mc_hist[t + tau, c] * mc_filt[f, tau, c]
+                for tau in range(nh, tf):
+                    for c in range(nc):
+                        value += mc_data[t + tau - th, chan[c]] * filt_g[f, tau, c]
+                fout[t, f] = value
+        # history item holds converted samples
+        if td >= th:
+            for t in range(th):
+                for c in range(nc):
+                    mc_hist[t, c] = mc_data[td - th + t, chan[c]] * gain[c] + offset[c]
+        else:
+            for t in range(th - td):
+                for c in range(nc):
+                    mc_hist[t, c] = mc_hist[td + t, c]
+            for t in range(td):
+                for c in range(nc):
+                    mc_hist[th - td + t, c] = mc_data[t, chan[c]] * gain[c] + offset[c]
     return fout, mc_hist
 
 def lib_info():
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+#_____________________________________________________________________________
+#
+# Copyright (c) 2012 Berlin Institute of Technology
+# All rights reserved.
+#
+# Developed by:	Philipp Meier <pmeier82@gmail.com>
+#               Neural Information Processing Group (NI)
+#               School for Electrical Engineering and Computer Science
+#               Berlin Institute of Technology
+#               MAR 5-6, Marchstr. 23, 10587 Berlin, Germany
+#               http://www.ni.tu-berlin.de/
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to
+# deal with the Software without restriction, including without limitation the
+# rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+# sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# * Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimers.
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimers in the documentation
+#   and/or other materials provided with the distribution.
+# * Neither the names of Neural Information Processing Group (NI), Berlin
+#   Institute of Technology, nor the names of its contributors may be used to
+#   endorse or promote products derived from this Software without specific
+#   prior written permission.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# CONTRIBUTORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# WITH THE SOFTWARE.
+#_____________________________________________________________________________
+#
+# Acknowledgements:
+#   Philipp Meier <pmeier82@gmail.com>
+#_____________________________________________________________________________
+#
+
+
+"""multichanneled filter application for time domain FIR filters
+
+FFT OVERLAP-SAVE IMPLEMENTATIONS USING SCIPY
+
+The signal is cut into overlapping blocks of `nfft` samples, each block is
+transformed once per channel and multiplied with the spectrum of the filter.
+The channel sum is taken in the frequency domain, so there is one inverse
+transform per block regardless of the channel count.
+"""
+__docformat__ = 'restructuredtext'
+__all__ = ['_mcfilter_fft', '_mcfilter_hist_fft', '_mcfilter_bank_hist_fft',
+           '_mcfilter_bank_hist_adc_fft', 'fft_size']
+
+##---IMPORTS
+
+import scipy as sp
+from numpy.fft import rfft, irfft
+from numpy.lib.stride_tricks import as_strided
+from .mcfilter_py import _hist_update, _adc_convert
+
+##---CONSTANTS
+
+# number of blocks transformed at once, bounds the size of the spectra
+FFT_BATCH = 64
+
+##---FUNCTIONS
+
+def fft_size(tf):
+    """block size for the overlap-save scheme
+
+    :type tf: int
+    :param tf: filter length in samples
+    :rtype: int
+    :returns: smallest power of two that is >= 4 * tf (at least 64)
+    """
+
+    nfft = 64
+    while nfft < 4 * tf:
+        nfft *= 2
+    return nfft
+
+
+def _mc_correlate_valid(mc_sig, mc_filt, nfft=None, mc_hist=None, adc=None):
+    """valid part of the channel summed correlation of signal and filter(s)
+
+    :type mc_sig: ndarray
+    :param mc_sig: signal data [sig_samples, channels]
+    :type mc_filt: ndarray
+    :param mc_filt: FIR filter [filter_samples, channels] or stack of FIR
+        filters [filters, filter_samples, channels]
+    :type nfft: int
+    :param nfft: block size, if None use `fft_size(filter_samples)`
+    :type mc_hist: ndarray
+    :param mc_hist: samples preceding the signal [hist_samples, channels],
+        they are staged in front of the signal without concatenating first
+    :type adc: tuple
+    :param adc: (chan, gain, offset) for integer signal data, the channel
+        subset is converted to float while staging the signal
+    :rtype: ndarray
+    :returns: filter output [sig_samples - filter_samples + 1] or
+        [sig_samples - filter_samples + 1, filters] for a filter stack, where
+        sig_samples includes the history samples
+    """
+
+    bank = mc_filt.ndim == 3
+    if bank is False:
+        mc_filt = mc_filt[sp.newaxis]
+    ns, nc = mc_sig.shape
+    if adc is not None:
+        nc = len(adc[0])
+    th = 0
+    if mc_hist is not None:
+        th = mc_hist.shape[0]
+        ns += th
+    nf, tf = mc_filt.shape[:2]
+    nv = max(ns - tf + 1, 0)
+    if nfft is None:
+        nfft = fft_size(tf)
+    step = nfft - tf + 1
+    nblk = int(sp.ceil(nv / float(step)))
+    rval = sp.empty((nblk * step, nf), dtype=mc_filt.dtype)
+
+    if nblk > 0:
+        # staging buffer, zero padded to a whole number of blocks
+        buf = sp.zeros(((nblk - 1) * step + nfft, nc))
+        if th > 0:
+            buf[:th] = mc_hist
+        if adc is None:
+            buf[th:ns] = mc_sig
+        else:
+            buf[th:ns] = mc_sig[:, adc[0]]
+            buf[th:ns] *= adc[1]
+            buf[th:ns] += adc[2]
+        blocks = as_strided(
+            buf,
+            shape=(nblk, nfft, nc),
+            strides=(step * buf.strides[0], buf.strides[0], buf.strides[1]))
+
+        # correlation is convolution with the time reversed filter, the
+        # blocks are transformed once and reused for all filters
+        spec_f = rfft(mc_filt[:, ::-1], nfft, axis=1)
+        for b in xrange(0, nblk, FFT_BATCH):
+            spec_x = rfft(blocks[b:b + FFT_BATCH], axis=1)
+            spec = sp.einsum('bwc,fwc->bwf', spec_x, spec_f)
+            out = irfft(spec, nfft, axis=1)[:, tf - 1:]
+            rval[b * step:b * step + out.shape[0] * step] = out.reshape(-1, nf)
+
+    rval = rval[:nv]
+    if bank is False:
+        rval = sp.ascontiguousarray(rval[:, 0])
+    return rval
+
+
+def _mcfilter_fft(mc_data, mc_filt):
+    if mc_data.ndim != mc_filt.ndim > 2:
+        raise ValueError('wrong dimensions: %s, %s' %
+                         (mc_data.shape, mc_filt.shape))
+    if mc_data.shape[1] != mc_filt.shape[1]:
+        raise ValueError('channel count does not match')
+    td, nc = mc_data.shape
+    pad = sp.zeros((int(mc_filt.shape[0] / 2), nc), dtype=mc_data.dtype)
+    return _mc_correlate_valid(sp.vstack((pad, mc_data, pad)), mc_filt)[:td]
+
+
+def _mcfilter_hist_fft(mc_data, mc_filt, mc_hist):
+    if mc_data.ndim != mc_filt.ndim > 2:
+        raise ValueError('wrong dimensions: %s, %s' %
+                         (mc_data.shape, mc_filt.shape))
+    if mc_data.shape[1] != mc_filt.shape[1]:
+        raise ValueError('channel count does not match')
+    rval = _mc_correlate_valid(mc_data, mc_filt, mc_hist=mc_hist)
+    return rval, _hist_update(mc_hist, mc_data)
+
+
+def _mcfilter_bank_hist_fft(mc_data, mc_filt, mc_hist):
+    if mc_data.ndim != 2 or mc_filt.ndim != 3:
+        raise ValueError('wrong dimensions: %s, %s' %
+                         (mc_data.shape, mc_filt.shape))
+    if mc_data.shape[1] != mc_filt.shape[2]:
+        raise ValueError('channel count does not match')
+    rval = _mc_correlate_valid(mc_data, mc_filt, mc_hist=mc_hist)
+    return rval, _hist_update(mc_hist, mc_data)
+
+
+def _mcfilter_bank_hist_adc_fft(mc_data, mc_filt, mc_hist, chan, gain, offset):
+    rval = _mc_correlate_valid(mc_data, mc_filt, mc_hist=mc_hist,
+                               adc=(chan, gain, offset))
+    # only the samples that end up in the history item are converted
+    td = mc_data.shape[0]
+    n = min(td, mc_hist.shape[0])
+    return rval, _hist_update(
+        mc_hist,
+        _adc_convert(mc_data[td - n:], chan, gain, offset, mc_hist.dtype))
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+#_____________________________________________________________________________
+#
+# Copyright (c) 2012 Berlin Institute of Technology
+# All rights reserved.
+#
+# Developed by:	Philipp Meier <pmeier82@gmail.com>
+#               Neural Information Processing Group (NI)
+#               School for Electrical Engineering and Computer Science
+#               Berlin Institute of Technology
+#               MAR 5-6, Marchstr. 23, 10587 Berlin, Germany
+#               http://www.ni.tu-berlin.de/
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to
+# deal with the Software without restriction, including without limitation the
+# rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+# sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# * Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimers.
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimers in the documentation
+#   and/or other materials provided with the distribution.
+# * Neither the names of Neural Information Processing Group (NI), Berlin
+#   Institute of Technology, nor the names of its contributors may be used to
+#   endorse or promote products derived from this Software without specific
+#   prior written permission.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# CONTRIBUTORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# WITH THE SOFTWARE.
+#_____________________________________________________________________________
+#
+# Acknowledgements:
+#   Philipp Meier <pmeier82@gmail.com>
+#_____________________________________________________________________________
+#
+
+"""multichanneled filter application for time domain FIR filters
+
+LOW-RANK FACTORISATION OF FILTER BANKS
+
+Filters of neighbouring units share most of their spatio-temporal structure.
+The filter bank [filters, filter_samples, channels] is factorised by a
+truncated singular value decomposition into K shared components and a
+coefficient matrix [filters, K]. The data is filtered with the components
+only and the output of every filter is rebuilt as a linear combination of
+the component outputs, so the filtering cost depends on K instead of the
+number of filters.
+"""
+__docformat__ = 'restructuredtext'
+__all__ = ['lowrank_factors', 'lowrank_rebuild']
+
+##---IMPORTS
+
+import scipy as sp
+from scipy import linalg as sp_la
+
+##---FUNCTIONS
+
+def lowrank_factors(mc_filt, tol=0.01, max_rank=None):
+    """factorise a filter bank into shared components
+
+    The rank K is the smallest rank for which the relative reconstruction
+    error of every filter is at most `tol`, limited by `max_rank`.
+
+    :type mc_filt: ndarray
+    :param mc_filt: FIR filter bank [filters, filter_samples, channels]
+    :type tol: float
+    :param tol: tolerated relative reconstruction error per filter,
+        |f - f_rec| / |f|.
+        Default=0.01
+    :type max_rank: int
+    :param max_rank: upper limit for K, if None no limit.
+        Default=None
+    :rtype: tuple(ndarray,ndarray,ndarray)
+    :returns: components [K, filter_samples, channels], coefficients
+        [filters, K], relative reconstruction error per filter [filters]
+    """
+
+    if mc_filt.ndim != 3:
+        raise ValueError('filter bank has to be of shape '
+                         '[filters, filter_samples, channels]')
+    nf, tf, nc = mc_filt.shape
+    if tol < 0:
+        raise ValueError('tol has to be >= 0')
+    dtype = mc_filt.dtype
+    f_mat = mc_filt.reshape(nf, tf * nc).astype(sp.float64)
+    f_norm = sp.sqrt((f_mat * f_mat).sum(axis=1))
+    f_norm[f_norm == 0.0] = 1.0
+    u, s, vt = sp_la.svd(f_mat, full_matrices=False)
+    k_max = len(s) if max_rank is None else max(1, min(int(max_rank), len(s)))
+
+    # residual energy per filter when truncating after rank k
+    coef_full = u * s
+    res = (coef_full * coef_full)[:, ::-1].cumsum(axis=1)[:, ::-1]
+    res = sp.hstack([res, sp.zeros((nf, 1))])
+    err_k = sp.sqrt(sp.maximum(res, 0.0)) / f_norm[:, sp.newaxis]
+    k = 1
+    while k < k_max and err_k[:, k].max() > tol:
+        k += 1
+
+    comps = vt[:k].reshape(k, tf, nc).astype(dtype)
+    coefs = coef_full[:, :k].astype(dtype)
+    return comps, coefs, err_k[:, k]
+
+
+def lowrank_rebuild(comp_out, coefs):
+    """rebuild the filter bank output from the component output
+
+    :type comp_out: ndarray
+    :param comp_out: filter output of the components [data_samples, K]
+    :type coefs: ndarray
+    :param coefs: coefficients [filters, K]
+    :rtype: ndarray
+    :returns: filter output of the filter bank [data_samples, filters]
+    """
+
+    return sp.dot(comp_out, coefs.T)
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+#_____________________________________________________________________________
+#
+# Copyright (c) 2012 Berlin Institute of Technology
+# All rights reserved.
+#
+# Developed by:	Philipp Meier <pmeier82@gmail.com>
+#               Neural Information Processing Group (NI)
+#               School for Electrical Engineering and Computer Science
+#               Berlin Institute of Technology
+#               MAR 5-6, Marchstr. 23, 10587 Berlin, Germany
+#               http://www.ni.tu-berlin.de/
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to
+# deal with the Software without restriction, including without limitation the
+# rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+# sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# * Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimers.
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimers in the documentation
+#   and/or other materials provided with the distribution.
+# * Neither the names of Neural Information Processing Group (NI), Berlin
+#   Institute of Technology, nor the names of its contributors may be used to
+#   endorse or promote products derived from this Software without specific
+#   prior written permission.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# CONTRIBUTORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# WITH THE SOFTWARE.
+#_____________________________________________________________________________
+#
+# Acknowledgements:
+#   Philipp Meier <pmeier82@gmail.com>
+#_____________________________________________________________________________
+#
+
+
+"""multichanneled filter application for time domain FIR filters
+
+MULTI-THREADED IMPLEMENTATIONS USING A THREAD POOL
+
+The output time range is split into contiguous segments, which are filtered
+by the history kernels in a pool of threads. The Cython kernels release the
+GIL for the filter loops, so the segments are processed in parallel. Every
+segment takes its history item from the samples preceding it, so the result
+is identical to filtering the chunk in one go.
+"""
+__docformat__ = 'restructuredtext'
+__all__ = ['_mcfilter_mt', '_mcfilter_hist_mt', 'get_n_threads',
+           'set_n_threads', 'get_segments']
+
+##---IMPORTS
+
+import scipy as sp
+import threading
+from multiprocessing.pool import ThreadPool
+
+##---CONSTANTS
+
+# segments shorter than this are not worth the dispatch overhead
+MIN_SEGMENT = 2048
+
+##---GLOBALS
+
+_N_THREADS = 1
+_POOL = None
+_POOL_SIZE = 0
+_POOL_USERS = 0
+_POOL_COND = threading.Condition()
+
+##---FUNCTIONS
+
+def get_n_threads():
+    """number of threads used for filtering if not requested otherwise
+
+    :rtype: int
+    :returns: global thread count
+    """
+
+    return _N_THREADS
+
+
+def set_n_threads(n_threads):
+    """set the number of threads used for filtering if not requested otherwise
+
+    :type n_threads: int
+    :param n_threads: global thread count, 1 disables multi-threading
+    """
+
+    global _N_THREADS
+    n_threads = int(n_threads)
+    if n_threads < 1:
+        raise ValueError('n_threads has to be >= 1: %s' % n_threads)
+    _N_THREADS = n_threads
+
+
+def _pool_map(func, items):
+    """map `func` over `items` with one worker thread per item
+
+    All callers share one thread pool, it is grown to the largest number of
+    items requested so far. The pool is only replaced while no map is
+    running on it, the replaced pool is closed and joined.
+
+    :type func: callable
+    :param func: function to apply
+    :type items: list
+    :param items: items to apply `func` to
+    :rtype: list
+    :returns: results in the order of `items`
+    """
+
+    global _POOL, _POOL_SIZE, _POOL_USERS
+    n_threads = len(items)
+    with _POOL_COND:
+        if _POOL is None or _POOL_SIZE < n_threads:
+            while _POOL_USERS > 0:
+                _POOL_COND.wait()
+        if _POOL is None or _POOL_SIZE < n_threads:
+            if _POOL is not None:
+                _POOL.close()
+                _POOL.join()
+            _POOL = ThreadPool(n_threads)
+            _POOL_SIZE = n_threads
+        pool = _POOL
+        _POOL_USERS += 1
+    try:
+        return pool.map(func, items)
+    finally:
+        with _POOL_COND:
+            _POOL_USERS -= 1
+            _POOL_COND.notify_all()
+
+
+def get_segments(ns, n_threads=None, min_len=0):
+    """split the output time range into segments for the threads
+
+    :type ns: int
+    :param ns: number of output samples
+    :type n_threads: int
+    :param n_threads: thread count, if None use `get_n_threads()`
+    :type min_len: int
+    :param min_len: minimal segment length, at least `MIN_SEGMENT` is used
+    :rtype: list
+    :returns: list of (start, stop) tuples
+    """
+
+    if n_threads is None:
+        n_threads = _N_THREADS
+    nseg = max(1, min(int(n_threads), ns // max(MIN_SEGMENT, min_len)))
+    bounds = sp.linspace(0, ns, nseg + 1).astype(int)
+    return zip(bounds[:-1], bounds[1:])
+
+
+def _mcfilter_hist_mt(kernel, mc_data, mc_filt, mc_hist, n_threads=None,
+                      hist_convert=None):
+    """apply a history kernel with the output time range split across threads
+
+    :type kernel: callable
+    :param kernel: history kernel, with signature
+        kernel(mc_data, mc_filt, mc_hist) -> (fout, mc_hist)
+    :type mc_data: ndarray
+    :param mc_data: signal data [data_samples, channels]
+    :type mc_filt: ndarray
+    :param mc_filt: FIR filter [filter_samples, channels] or filter bank
+        [filters, filter_samples, channels]
+    :type mc_hist: ndarray
+    :param mc_hist: history [hist_samples, channels], updated in place
+    :type n_threads: int
+    :param n_threads: thread count, if None use `get_n_threads()`
+    :type hist_convert: callable
+    :param hist_convert: if not None, converts rows of mc_data into rows of
+        the history item, for data that is not stored like the history (e.g.
+        integer ADC samples)
+    :rtype: tuple(ndarray,ndarray)
+    :returns: filter output, history item
+    """
+
+    th = mc_hist.shape[0]
+    segments = get_segments(mc_data.shape[0], n_threads, min_len=th)
+    if len(segments) == 1:
+        return kernel(mc_data, mc_filt, mc_hist)
+
+    def task(segment):
+        # segments are at least th long, so the history of every segment
+        # but the first is found in the data; the kernels write the history
+        # in place, so each segment gets its own copy
+        t0, t1 = segment
+        if t0 == 0:
+            hist = mc_hist.copy()
+        elif hist_convert is not None:
+            hist = hist_convert(mc_data[t0 - th:t0])
+        else:
+            hist = mc_data[t0 - th:t0].copy()
+        return kernel(mc_data[t0:t1], mc_filt, hist)
+
+    rval = _pool_map(task, segments)
+    mc_hist[:] = rval[-1][1]
+    return sp.concatenate([fout for fout, _ in rval]), mc_hist
+
+
+def _mcfilter_mt(kernel, mc_data, mc_filt, n_threads=None):
+    """batch mode filtering with a history kernel split across threads
+
+    The signal is padded with zeros on both ends like in `mcfilter`.
+
+    :type kernel: callable
+    :param kernel: history kernel, see `_mcfilter_hist_mt`
+    :type mc_data: ndarray
+    :param mc_data: signal data [data_samples, channels]
+    :type mc_filt: ndarray
+    :param mc_filt: FIR filter [filter_samples, channels]
+    :type n_threads: int
+    :param n_threads: thread count, if None use `get_n_threads()`
+    :rtype: ndarray
+    :returns: filtered signal [data_samples]
+    """
+
+    td, nc = mc_data.shape
+    tf = mc_filt.shape[0]
+    pad = sp.zeros((int(tf / 2), nc), dtype=mc_data.dtype)
+    mc_data_pad = sp.vstack((pad, mc_data, pad))
+    mc_hist = mc_data_pad[:tf - 1].copy()
+    return _mcfilter_hist_mt(kernel, mc_data_pad[tf - 1:], mc_filt, mc_hist,
+                             n_threads)[0][:td]
+
+if __name__ == '__main__':
+    pass
@@ -45,9 +45,14 @@
 """multichanneled filter application for time domain FIR filters
 
 PYTHON IMPLEMENTATIONS USING SCIPY
+
+The history kernels loop over the filter taps only, each tap contributes a
+matrix product of the (shifted) signal with the tap over all samples and
+channels at once.
 """
 __docformat__ = 'restructuredtext'
-__all__ = ['_mcfilter_py', '_mcfilter_hist_py', ]
+__all__ = ['_mcfilter_py', '_mcfilter_hist_py', '_mcfilter_bank_hist_py',
+           '_mcfilter_bank_hist_adc_py', '_adc_convert']
 
 ##---IMPORTS
 
@@ -72,13 +77,79 @@ def _mcfilter_hist_py(mc_data, mc_filt, mc_hist):
                          (mc_data.shape, mc_filt.shape))
     if mc_data.shape[1] != mc_filt.shape[1]:
         raise ValueError('channel count does not match')
-    mc_hist_and_data = sp.vstack((mc_hist, mc_data))
-    rval = sp.zeros(mc_data.shape[0], dtype=mc_data.dtype)
-    for t in xrange(mc_data.shape[0]):
-        for c in xrange(mc_hist_and_data.shape[1]):
-            rval[t] += sp.dot(mc_hist_and_data[t:t + mc_filt.shape[0], c],
-                              mc_filt[:, c])
-    return rval, mc_data[t + 1:, :].copy()
+    rval, mc_hist = _mcfilter_bank_hist_py(
+        mc_data, mc_filt[sp.newaxis], mc_hist)
+    return rval[:, 0].copy(), mc_hist
+
+
+def _mcfilter_bank_hist_py(mc_data, mc_filt, mc_hist):
+    if mc_data.ndim != 2 or mc_filt.ndim != 3:
+        raise ValueError('wrong dimensions: %s, %s' %
+                         (mc_data.shape, mc_filt.shape))
+    if mc_data.shape[1] != mc_filt.shape[2]:
+        raise ValueError('channel count does not match')
+    td = mc_data.shape[0]
+    th = mc_hist.shape[0]
+    rval = sp.zeros((td, mc_filt.shape[0]), dtype=mc_data.dtype)
+    for tau in xrange(mc_filt.shape[1]):
+        # outputs before n read filter tap tau from the history
+        n = min(max(th - tau, 0), td)
+        rval[:n] += sp.dot(mc_hist[tau:tau + n], mc_filt[:, tau, :].T)
+        rval[n:] += sp.dot(mc_data[n + tau - th:td + tau - th],
+                           mc_filt[:, tau, :].T)
+    return rval, _hist_update(mc_hist, mc_data)
+
+
+def _mcfilter_bank_hist_adc_py(mc_data, mc_filt, mc_hist, chan, gain, offset):
+    return _mcfilter_bank_hist_py(
+        _adc_convert(mc_data, chan, gain, offset, mc_filt.dtype), mc_filt,
+        mc_hist)
+
+
+def _adc_convert(mc_data, chan, gain, offset, dtype):
+    """convert integer ADC samples of a channel subset to float
+
+    :type mc_data: ndarray
+    :param mc_data: integer signal data [data_samples, all_channels]
+    :type chan: ndarray
+    :param chan: channel subset [channels]
+    :type gain: ndarray
+    :param gain: gain per channel in the subset [channels]
+    :type offset: ndarray
+    :param offset: offset per channel in the subset [channels]
+    :type dtype: dtype
+    :param dtype: float dtype of the output
+    :rtype: ndarray
+    :returns: gain * mc_data[:, chan] + offset [data_samples, channels]
+    """
+
+    rval = sp.asarray(mc_data[:, chan], dtype=dtype)
+    rval *= gain
+    rval += offset
+    return rval
+
+
+def _hist_update(mc_hist, mc_data):
+    """update the history item in place
+
+    The history item is set to the last samples of [mc_hist; mc_data].
+
+    :type mc_hist: ndarray
+    :param mc_hist: history [hist_samples, channels]
+    :type mc_data: ndarray
+    :param mc_data: signal data [data_samples, channels]
+    :rtype: ndarray
+    :returns: mc_hist
+    """
+
+    td = mc_data.shape[0]
+    th = mc_hist.shape[0]
+    if td >= th:
+        mc_hist[:] = mc_data[td - th:]
+    else:
+        mc_hist[:th - td] = mc_hist[td:].copy()
+        mc_hist[th - td:] = mc_data
+    return mc_hist
 
 if __name__ == '__main__':
     pass
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+#_____________________________________________________________________________
+#
+# Copyright (c) 2012 Berlin Institute of Technology
+# All rights reserved.
+#
+# Developed by:	Philipp Meier <pmeier82@gmail.com>
+#               Neural Information Processing Group (NI)
+#               School for Electrical Engineering and Computer Science
+#               Berlin Institute of Technology
+#               MAR 5-6, Marchstr. 23, 10587 Berlin, Germany
+#               http://www.ni.tu-berlin.de/
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to
+# deal with the Software without restriction, including without limitation the
+# rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+# sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# * Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimers.
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimers in the documentation
+#   and/or other materials provided with the distribution.
+# * Neither the names of Neural Information Processing Group (NI), Berlin
+#   Institute of Technology, nor the names of its contributors may be used to
+#   endorse or promote products derived from this Software without specific
+#   prior written permission.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# CONTRIBUTORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# WITH THE SOFTWARE.
+#_____________________________________________________________________________
+#
+# Acknowledgements:
+#   Philipp Meier <pmeier82@gmail.com>
+#_____________________________________________________________________________
+#
+
+
+"""multichanneled filter application for time domain FIR filters
+
+PERSISTENCE OF TUNED BACKEND CHOICES
+
+The fastest backend for a filtering task is found by a micro-benchmark, see
+`mcfilter.tune`. The results are stored in a JSON file, so later runs start
+tuned. The file location is read from the environment variable
+BOTMPY_MCFILTER_CACHE and defaults to ~/.botmpy/mcfilter_backends.json.
+"""
+__docformat__ = 'restructuredtext'
+__all__ = ['cache_key', 'get_cache_path', 'load_cache', 'save_cache']
+
+##---IMPORTS
+
+import json
+import logging
+import os
+import tempfile
+import scipy as sp
+
+##---CONSTANTS
+
+CACHE_ENV = 'BOTMPY_MCFILTER_CACHE'
+CACHE_DEFAULT = os.path.join('~', '.botmpy', 'mcfilter_backends.json')
+
+##---FUNCTIONS
+
+def cache_key(dtype, tf, nc, ns, nf, n_threads):
+    """key of a filtering task in the backend cache
+
+    The chunk length is rounded up to the next power of two, so that chunks
+    of similar length share the tuning result.
+
+    :type dtype: dtype
+    :param dtype: data type of the filtering task
+    :type tf: int
+    :param tf: filter length in samples
+    :type nc: int
+    :param nc: channel count
+    :type ns: int
+    :param ns: chunk length in samples
+    :type nf: int
+    :param nf: filter count
+    :type n_threads: int
+    :param n_threads: thread count
+    :rtype: str
+    :returns: cache key
+    """
+
+    ns_bucket = 2 ** int(sp.ceil(sp.log2(max(ns, 1))))
+    return '%s:%d:%d:%d:%d:%d' % (
+        sp.dtype(dtype).name, tf, nc, ns_bucket, nf, n_threads)
+
+
+def get_cache_path():
+    """path of the backend cache file
+
+    :rtype: str
+    :returns: value of BOTMPY_MCFILTER_CACHE or the default location
+    """
+
+    return os.path.expanduser(os.environ.get(CACHE_ENV, CACHE_DEFAULT))
+
+
+def load_cache(path=None):
+    """load tuned backend choices
+
+    :type path: str
+    :param path: cache file, if None use `get_cache_path()`
+    :rtype: dict
+    :returns: mapping of cache key to backend name, empty if the file is
+        missing or cannot be read
+    """
+
+    path = path or get_cache_path()
+    if not os.path.isfile(path):
+        return {}
+    try:
+        with open(path, 'r') as f:
+            rval = json.load(f)
+        if not isinstance(rval, dict):
+            raise ValueError('not a mapping')
+        return dict((str(k), str(v)) for k, v in rval.items())
+    except (IOError, ValueError), ex:
+        logging.warn('could not read mcfilter backend cache %s: %s' %
+                     (path, ex))
+        return {}
+
+
+def save_cache(cache, path=None):
+    """store tuned backend choices
+
+    The file is replaced atomically, so concurrent processes never read a
+    partial file.
+
+    :type cache: dict
+    :param cache: mapping of cache key to backend name
+    :type path: str
+    :param path: cache file, if None use `get_cache_path()`
+    :rtype: bool
+    :returns: True on success, False else
+    """
+
+    path = path or get_cache_path()
+    try:
+        dirname = os.path.dirname(path) or '.'
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        fd, tmp = tempfile.mkstemp(dir=dirname, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(cache, f, indent=1, sort_keys=True)
+        os.rename(tmp, path)
+        return True
+    except (IOError, OSError), ex:
+        logging.warn('could not write mcfilter backend cache %s: %s' %
+                     (path, ex))
+        return False
+
+if __name__ == '__main__':
+    pass
@@ -58,11 +58,20 @@ class MxRingBuffer(object):
 
     Ringbuffer behavior is archived by cycling though the buffer forward,
     wrapping around to the start upon reaching capacity.
+
+    Every change to the contents through the methods of the ringbuffer
+    increments `version`, so dependent results can be cached. Writes to the
+    views returned by indexing are not tracked.
+
+    A running sum of the contents is kept, the evicted datum is subtracted
+    on overwrite. So the mean over all contents is available without a
+    reduction over the buffer. To bound the floating point drift of the
+    running sum, it is recalculated from the contents every `resum` appends.
     """
 
     ## constructor
 
-    def __init__(self, capacity=64, dimension=1, dtype=None):
+    def __init__(self, capacity=64, dimension=1, dtype=None, resum=1024):
         """
         :type capacity: int
         :param capacity: capacity of the ringbuffer (rows)
@@ -74,11 +83,17 @@ class MxRingBuffer(object):
         :type dtype: dtype resolvable
         :param dtype: dtype of single entries
             Default=float32
+        :type resum: int
+        :param resum: number of appends after which the running sum is
+            recalculated from the contents. If None, never recalculate.
+            Default=1024
         """
 
         # checks
         if capacity < 1:
             raise ValueError('capacity < 1')
+        if resum is not None and resum < 1:
+            raise ValueError('resum < 1')
         if isinstance(dimension, int):
             dimension = (dimension,)
         elif isinstance(dimension, tuple):
@@ -94,15 +109,11 @@ class MxRingBuffer(object):
                               dtype=self._dtype)
         self._next = 0
         self._full = False
-
-        # mapping prototypes
-        self._idx_belowcap_proto = lambda:range(self._next)
-        self._idx_fullcap_proto =\
-        lambda:range(self._next, self._capacity) + range(self._next)
-
-        # mappings
-        self._idx_append = self._idx_fullcap_proto
-        self._idx_retrieve = self._idx_belowcap_proto
+        self._version = 0
+        self._sum_dtype = sp.result_type(self._dtype, sp.float64)
+        self._sum = sp.zeros(self._dimension, dtype=self._sum_dtype)
+        self._resum = resum
+        self._n_since_resum = 0
 
     ## properties
 
@@ -116,6 +127,11 @@ class MxRingBuffer(object):
 
     is_full = property(get_is_full)
 
+    def get_version(self):
+        return self._version
+
+    version = property(get_version, doc='counter of changes to the contents')
+
     def get_capacity(self):
         return self._capacity
 
@@ -151,25 +167,93 @@ class MxRingBuffer(object):
                              (self._dimension, datum.shape))
 
         # append
-        self._data[self._idx_append()[0], :] = datum
+        idx = self._next
+        if self._full is True:
+            self._sum -= self._data[idx]
+        self._data[idx, :] = datum
+        self._sum += self._data[idx]
 
         # index and capacity status bookkeeping
+        self._version += 1
+        self._n_since_resum += 1
         self._next += 1
         if self._next == self._capacity:
             self._next = 0
-            if self._full is False:
-                self._idx_retrieve = self._idx_fullcap_proto
-                self._full = True
+            self._full = True
+        if self._resum is not None and self._n_since_resum >= self._resum:
+            self._calc_sum()
 
     def extend(self, iterable):
-        """append iterable at the end of the buffer using multiple append's
+        """append iterable at the end of the buffer
+
+        The items are written as one block, using at most two slice
+        assignments. If there are more items than the capacity, only the last
+        items are kept.
 
         :type iterable: iterable
-        :param iterable: iterable of objects to be stored in the ringbuffer
+        :param iterable: iterable of objects to be stored in the ringbuffer,
+            or ndarray of shape (n,) + :self.dimension:
+        """
+
+        # checks
+        if not isinstance(iterable, sp.ndarray):
+            iterable = list(iterable)
+            if len(iterable) == 0:
+                return
+        data = sp.asarray(iterable)
+        if data.shape[1:] != self._dimension:
+            raise ValueError('data has wrong dimension! expected %s was %s' %
+                             (self._dimension, data.shape[1:]))
+        n = data.shape[0]
+        if n == 0:
+            return
+
+        # write block
+        if n >= self._capacity:
+            self._data[:] = data[-self._capacity:]
+            self._next = 0
+            self._full = True
+            self._version += 1
+            self._calc_sum()
+            return
+        n0 = min(n, self._capacity - self._next)
+        block = slice(self._next, self._next + n0)
+        if self._full is True:
+            self._sum -= self._data[block].sum(axis=0, dtype=self._sum_dtype)
+        self._data[block] = data[:n0]
+        self._sum += self._data[block].sum(axis=0, dtype=self._sum_dtype)
+        if n0 < n:
+            # wrap around, the slots at the start are always in use
+            wrap = slice(0, n - n0)
+            self._sum -= self._data[wrap].sum(axis=0, dtype=self._sum_dtype)
+            self._data[wrap] = data[n0:]
+            self._sum += self._data[wrap].sum(axis=0, dtype=self._sum_dtype)
+
+        # index and capacity status bookkeeping
+        self._version += 1
+        self._n_since_resum += n
+        self._next += n
+        if self._next >= self._capacity:
+            self._next -= self._capacity
+            self._full = True
+        if self._resum is not None and self._n_since_resum >= self._resum:
+            self._calc_sum()
+
+    def views(self):
+        """the contents in order, as at most two views on the buffer
+
+        No data is copied, the views become invalid with the next change to
+        the buffer. sp.concatenate(rb.views()) is equivalent to rb[:].
+
+        :rtype: tuple
+        :returns: tuple of ndarray - views on the buffer, oldest datum first
         """
 
-        for item in iterable:
-            self.append(item)
+        if self._full is False:
+            return self._data[:self._next],
+        if self._next == 0:
+            return self._data[:],
+        return self._data[self._next:], self._data[:self._next]
 
     def tolist(self):
         """return the buffer as a list
@@ -184,8 +268,10 @@ class MxRingBuffer(object):
 
         self._next = 0
         self._full = False
-        self._idx_retrieve = self._idx_belowcap_proto
         self._data[:] = 0.0
+        self._sum[:] = 0.0
+        self._n_since_resum = 0
+        self._version += 1
 
     def flush(self):
         """return the buffer as a list and clear the RingBuffer
@@ -222,7 +308,12 @@ class MxRingBuffer(object):
             last = len(self)
 
         # return
-        return sp.mean(self._data[self._idx_retrieve()[-last:], :], axis=0)
+        if last == len(self):
+            mean = self._sum / last
+            if self._dtype.kind in 'fc':
+                mean = mean.astype(self._dtype)
+            return mean
+        return sp.mean(self[-last:], axis=0)
 
     def fill(self, datum):
         """fill all slots of the ringbuffer with the same datum.
@@ -242,10 +333,18 @@ class MxRingBuffer(object):
         self._data *= datum
 
         # index and capacity status bookkeeping
+        self._version += 1
         self._next = 0
-        if self._full is False:
-            self._idx_retrieve = self._idx_fullcap_proto
-            self._full = True
+        self._full = True
+        self._calc_sum()
+
+    def _calc_sum(self):
+        """recalculate the running sum from the contents"""
+
+        self._sum = sp.zeros(self._dimension, dtype=self._sum_dtype)
+        for view in self.views():
+            self._sum += view.sum(axis=0, dtype=self._sum_dtype)
+        self._n_since_resum = 0
 
     ## special methods
 
@@ -258,17 +357,21 @@ class MxRingBuffer(object):
                                                        str(self._dimension))
 
     def __len__(self):
-        return len(self._idx_retrieve())
+        return self._capacity if self._full is True else self._next
 
     def __getitem__(self, k):
-        try:
-            idx = self._idx_retrieve()[k]
-            return self._data[idx, ...]
-        except IndexError:
-            raise IndexError('ringbuffer index out of range')
+        n = len(self)
+        offset = self._next if self._full is True else 0
+        if isinstance(k, slice):
+            idx = (sp.arange(n)[k] + offset) % self._capacity
+        else:
+            if not -n <= k < n:
+                raise IndexError('ringbuffer index out of range')
+            idx = (k % n + offset) % self._capacity
+        return self._data[idx, ...]
 
     def __iter__(self):
-        return self._data[self._idx_retrieve(), ...].__iter__()
+        return self[:].__iter__()
 
 ##---MAIN
 
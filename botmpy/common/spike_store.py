@@ -0,0 +1,298 @@
+# -*- coding: utf-8 -*-
+#_____________________________________________________________________________
+#
+# Copyright (c) 2012 Berlin Institute of Technology
+# All rights reserved.
+#
+# Developed by:	Philipp Meier <pmeier82@gmail.com>
+#               Neural Information Processing Group (NI)
+#               School for Electrical Engineering and Computer Science
+#               Berlin Institute of Technology
+#               MAR 5-6, Marchstr. 23, 10587 Berlin, Germany
+#               http://www.ni.tu-berlin.de/
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to
+# deal with the Software without restriction, including without limitation the
+# rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+# sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# * Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimers.
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimers in the documentation
+#   and/or other materials provided with the distribution.
+# * Neither the names of Neural Information Processing Group (NI), Berlin
+#   Institute of Technology, nor the names of its contributors may be used to
+#   endorse or promote products derived from this Software without specific
+#   prior written permission.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# CONTRIBUTORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# WITH THE SOFTWARE.
+#_____________________________________________________________________________
+#
+# Acknowledgements:
+#   Philipp Meier <pmeier82@gmail.com>
+#_____________________________________________________________________________
+#
+"""columnar store for sorted spikes"""
+__docformat__ = 'restructuredtext'
+__all__ = ['SpikeStore']
+
+##---IMPORTS
+
+import scipy as sp
+
+##---CLASSES
+
+class SpikeStore(object):
+    """growable columnar store for sorted spikes
+
+    Spikes are stored in preallocated columns, one entry per spike:
+
+    - "sample": sample index of the spike (int64)
+    - "unit": unit id of the spike (int32)
+    - "disc": discriminant value the spike was found at (float32)
+    - "ovlp": True if the spike was found as part of an overlap (bool)
+
+    Capacity is doubled when exhausted, so appends are amortised O(1).
+    After sorting, the spikes of a unit are contiguous and per unit views
+    do not copy.
+
+    If a filename is given, the columns are memory-mapped files named
+    "<filename>.<column>", so very long sessions do not need to fit into
+    memory. Views into the columns are only valid until the next `clear`
+    in this mode.
+    """
+
+    COLUMNS = [('sample', sp.int64), ('unit', sp.int32),
+               ('disc', sp.float32), ('ovlp', sp.bool_)]
+
+    ## constructor
+
+    def __init__(self, capacity=1024, filename=None):
+        """
+        :type capacity: int
+        :param capacity: initial capacity (spikes)
+            Default=1024
+        :type filename: str
+        :param filename: if not None, path prefix for the memory-mapped
+            column files
+            Default=None
+        """
+
+        # checks
+        if capacity < 1:
+            raise ValueError('capacity < 1')
+
+        # members
+        self._init_capacity = int(capacity)
+        self._filename = filename
+        self._cols = {}
+        self._capacity = 0
+        self._n = 0
+        self._sorted = True
+
+    ## properties
+
+    def get_capacity(self):
+        return self._capacity
+
+    capacity = property(get_capacity, doc='allocated number of spikes')
+
+    def get_filename(self):
+        return self._filename
+
+    filename = property(get_filename, doc='path prefix of the column files')
+
+    ## interface
+
+    def append(self, sample, unit, disc=sp.nan, ovlp=False):
+        """append a single spike
+
+        :type sample: int
+        :param sample: sample index of the spike
+        :type unit: int
+        :param unit: unit id of the spike
+        :type disc: float
+        :param disc: discriminant value of the spike
+            Default=nan
+        :type ovlp: bool
+        :param ovlp: True if the spike is part of an overlap
+            Default=False
+        """
+
+        self._reserve(self._n + 1)
+        n = self._n
+        self._cols['sample'][n] = sample
+        self._cols['unit'][n] = unit
+        self._cols['disc'][n] = disc
+        self._cols['ovlp'][n] = ovlp
+        self._n += 1
+        self._sorted = False
+
+    def extend(self, samples, units, disc=None, ovlp=None):
+        """append a batch of spikes
+
+        :type samples: array_like
+        :param samples: sample indices of the spikes
+        :type units: array_like
+        :param units: unit ids of the spikes, scalar or one per spike
+        :type disc: array_like
+        :param disc: discriminant values of the spikes, if None nan
+            Default=None
+        :type ovlp: array_like
+        :param ovlp: overlap flags of the spikes, if None False
+            Default=None
+        """
+
+        samples = sp.asarray(samples)
+        k = samples.size
+        if k == 0:
+            return
+        self._reserve(self._n + k)
+        n0, n1 = self._n, self._n + k
+        self._cols['sample'][n0:n1] = samples.ravel()
+        self._cols['unit'][n0:n1] = units
+        self._cols['disc'][n0:n1] = sp.nan if disc is None else disc
+        self._cols['ovlp'][n0:n1] = False if ovlp is None else ovlp
+        self._n = n1
+        self._sorted = False
+
+    def keep(self, mask, start=0):
+        """keep only the spikes from `start` on where `mask` is True
+
+        :type mask: ndarray
+        :param mask: boolean mask for the spikes [start:]
+        :type start: int
+        :param start: first spike the mask applies to
+            Default=0
+        """
+
+        mask = sp.asarray(mask, dtype=bool)
+        if mask.size != self._n - start:
+            raise ValueError('mask does not match the spikes from start')
+        k = mask.sum()
+        for name, _ in self.COLUMNS:
+            col = self._cols[name]
+            col[start:start + k] = col[start:self._n][mask]
+        self._n = start + k
+
+    def clear(self):
+        """remove all spikes
+
+        In memory, new columns are allocated, so views into the previous
+        contents stay valid.
+        """
+
+        if self._filename is None:
+            self._cols = {}
+            self._capacity = 0
+        self._n = 0
+        self._sorted = True
+
+    def sort(self):
+        """order the spikes by unit, then by sample"""
+
+        if self._sorted is True:
+            return
+        order = sp.lexsort((self._cols['sample'][:self._n],
+                            self._cols['unit'][:self._n]))
+        for name, _ in self.COLUMNS:
+            col = self._cols[name]
+            col[:self._n] = col[:self._n][order]
+        self._sorted = True
+
+    def get_column(self, name):
+        """view of a column for the stored spikes
+
+        :type name: str
+        :param name: one of "sample", "unit", "disc", "ovlp"
+        :rtype: ndarray
+        :returns: view on the column
+        """
+
+        if name not in dict(self.COLUMNS):
+            raise KeyError('no column %r' % name)
+        if self._n == 0:
+            return sp.zeros(0, dtype=dict(self.COLUMNS)[name])
+        return self._cols[name][:self._n]
+
+    def get_unit(self, unit, column='sample'):
+        """view of a column for the spikes of one unit, sorts if needed
+
+        :type unit: int
+        :param unit: unit id
+        :type column: str
+        :param column: column to view
+            Default='sample'
+        :rtype: ndarray
+        :returns: view on the column for the spikes of the unit, ordered
+            by sample
+        """
+
+        self.sort()
+        units = self.get_column('unit')
+        lo, hi = units.searchsorted([unit, unit + 1])
+        return self.get_column(column)[lo:hi]
+
+    def get_units(self):
+        """unit ids present in the store
+
+        :rtype: ndarray
+        :returns: sorted unit ids
+        """
+
+        return sp.unique(self.get_column('unit'))
+
+    def flush(self):
+        """write memory-mapped columns to disk"""
+
+        if self._filename is not None:
+            for col in self._cols.values():
+                col.flush()
+
+    ## internals
+
+    def _reserve(self, n):
+        if n <= self._capacity:
+            return
+        capacity = max(self._capacity, self._init_capacity)
+        while capacity < n:
+            capacity *= 2
+        for name, dtype in self.COLUMNS:
+            old = self._cols.get(name)
+            if self._filename is None:
+                col = sp.empty(capacity, dtype=dtype)
+                if old is not None:
+                    col[:self._n] = old[:self._n]
+            else:
+                # grow the file, the contents are kept by the file
+                fname = '%s.%s' % (self._filename, name)
+                if old is not None:
+                    old.flush()
+                with open(fname, 'r+b' if old is not None else 'w+b') as f:
+                    f.truncate(capacity * sp.dtype(dtype).itemsize)
+                col = sp.memmap(fname, dtype=dtype, mode='r+',
+                                shape=(capacity,))
+            self._cols[name] = col
+        self._capacity = capacity
+
+    ## special methods
+
+    def __len__(self):
+        return self._n
+
+    def __str__(self):
+        return 'SpikeStore{%d/%d}' % (self._n, self._capacity)
+
+##---MAIN
+
+if __name__ == '__main__':
+    pass
@@ -44,7 +44,7 @@
 
 """abstract base classes derived from MDP nodes"""
 __docformat__ = 'restructuredtext'
-__all__ = ['Node', 'ResetNode', 'TrainingResetMixin', 'PCANode']
+__all__ = ['Node', 'ResetNode', 'TrainingResetMixin', 'ADCInputMixin', 'PCANode']
 
 ##---IMPORTS
 
@@ -62,6 +62,7 @@ os.environ['MDP_DISABLE_SKLEARN'] = 'True'
 
 # MPD DONE
 
+import scipy as sp
 from mdp import Node
 from mdp.nodes import PCANode
 
@@ -95,6 +96,80 @@ class TrainingResetMixin(object):
         pass
 
 
+class ADCInputMixin(object):
+    """allows :py:class:`mdp.Node` to take raw integer ADC samples as input
+
+    This is a mixin class for subclasses of :py:class:`mdp.Node`. To use it
+    inherit from :py:class:`mdp.Node` and put this mixin as the first
+    superclass.
+
+    Integer input is passed on to `_execute` (and `_train`) as is, instead of
+    being cast to the node dtype, so the implementation can convert it where
+    the data is actually read. The physical signal is given by
+    gain * raw + offset, per channel. If the node dtype is not set when the
+    first integer input arrives, it is set to float32. Float input is
+    handled as usual and is assumed to be in physical units already.
+    """
+
+    ## additional interface
+
+    def get_adc_gain(self):
+        return getattr(self, '_adc_gain', None)
+
+    def set_adc_gain(self, value):
+        self._adc_gain = None if value is None else sp.asarray(value)
+
+    adc_gain = property(get_adc_gain, set_adc_gain,
+                        doc='ADC gain, scalar or per channel of the input')
+
+    def get_adc_offset(self):
+        return getattr(self, '_adc_offset', None)
+
+    def set_adc_offset(self, value):
+        self._adc_offset = None if value is None else sp.asarray(value)
+
+    adc_offset = property(get_adc_offset, set_adc_offset,
+                          doc='ADC offset, scalar or per channel of the input')
+
+    def adc_to_float(self, x, chan_set=None):
+        """convert (a channel subset of) integer input to physical units
+
+        :type x: ndarray
+        :param x: input data [samples, channels]
+        :type chan_set: tuple
+        :param chan_set: channels to convert, if None use all channels
+        :rtype: ndarray
+        :returns: float data of the node dtype [samples, len(chan_set)]
+        """
+
+        if chan_set is not None:
+            x = x[:, chan_set]
+        if x.dtype.kind not in 'iu':
+            return x
+        dtype = sp.float32 if self.dtype is None else self.dtype
+        rval = sp.asarray(x, dtype=dtype)
+        gain, offset = self.get_adc_gain(), self.get_adc_offset()
+        if gain is not None:
+            rval *= gain if gain.ndim == 0 or chan_set is None else \
+                gain[list(chan_set)]
+        if offset is not None:
+            rval += offset if offset.ndim == 0 or chan_set is None else \
+                offset[list(chan_set)]
+        return rval
+
+    ## mdp.Node hooks
+
+    def _check_input(self, x):
+        if self.dtype is None and x.dtype.kind in 'iu':
+            self.dtype = sp.float32
+        super(ADCInputMixin, self)._check_input(x)
+
+    def _refcast(self, x):
+        if x.dtype.kind in 'iu':
+            return x
+        return super(ADCInputMixin, self)._refcast(x)
+
+
 class ResetNode(TrainingResetMixin, Node):
     pass
 
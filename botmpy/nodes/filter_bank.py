@@ -56,9 +56,11 @@ __all__ = ['FilterBankError', 'FilterBankNode']
 
 import logging
 import scipy as sp
-from .base_nodes import Node
+from .base_nodes import Node, ADCInputMixin
 from .linear_filter import FilterNode, REMF
-from ..common import (TimeSeriesCovE, xi_vs_f, VERBOSE)
+from ..common import (TimeSeriesCovE, xi_vs_f, mcfilter_bank_hist,
+                      lowrank_factors, lowrank_rebuild, mcvec_to_conc,
+                      VERBOSE)
 
 ##---CLASSES
 
@@ -66,11 +68,26 @@ class FilterBankError(Exception):
     pass
 
 
-class FilterBankNode(Node):
+class FilterBankNode(ADCInputMixin, Node):
     """abstract class that handles filter instances and their outputs
 
     All filters constituting the filter bank have to be of the same temporal extend (Tf) and process
-    the same channel set.
+    the same channel set. The filter bank output is computed for all active filters in one pass over
+    the data, using a history item shared by all filters. Raw integer ADC samples are accepted as
+    input, see `ADCInputMixin`, and are converted inside the filter kernel.
+
+    In low-rank mode (`lowrank_tol` is set) the filter set is factorised into a few shared
+    components, see `mcfilter.lowrank_factors`. The data is filtered with the components only and
+    the output of every filter is rebuilt from the component outputs, which pays off for large
+    banks of similar filters. The factorisation is only used if it has fewer components than there
+    are active filters. The reconstruction error per filter is reported by `lowrank_error`.
+
+    In prewhitening mode (`whiten` is True) the input is whitened once per chunk by the streaming
+    whitening filter of the covariance estimator, see `TimeSeriesCovE.get_whitening_filter`. Each
+    filter is then a plain correlation of its whitened template with the whitened signal, see
+    `FilterNode.whitened_filter`. The output approximates the output of the filters on the raw
+    signal. A covariance update only changes the shared whitener and the whitened templates, the
+    filters themselves are only calculated on request.
 
     There are two different index sets. One is abbreviated "idx" and one "key". The "idx" the index
     of filter in `self.bank` and thus a unique, hashable identifier. Where as the "key" an index in a
@@ -82,11 +99,24 @@ class FilterBankNode(Node):
     def __init__(self, **kwargs):
         """see `mdp.Node`
 
+        :type adc_gain: float or ndarray
+        :keyword adc_gain: gain for integer input, scalar or per input
+            channel.
+            Default=None
+        :type adc_offset: float or ndarray
+        :keyword adc_offset: offset for integer input, scalar or per input
+            channel.
+            Default=None
         :type ce: TimeSeriesCovE
         :keyword ce: covariance estimator instance, if None a new instance
             will be created and initialised with the identity matrix
             corresponding to the template size.
             required
+        :type backend: str
+        :keyword backend: filter backend for the bank kernel, one of
+            `mcfilter.BACKENDS` or "auto". If None or "auto", the backend is
+            chosen per chunk.
+            Default=None
         :type chan_set: tuple
         :keyword chan_set: tuple of int designating the subset of channels
             this filter bank operates on. Defaults to all the channels of
@@ -97,6 +127,19 @@ class FilterBankNode(Node):
         :keyword filter_cls: the class of filter node to use for the filter
             bank, this must be a subclass of 'FilterNode'.
             required
+        :type lowrank_tol: float
+        :keyword lowrank_tol: if not None, use the low-rank mode with this
+            tolerated relative reconstruction error per filter.
+            Default=None
+        :type lowrank_max: int
+        :keyword lowrank_max: maximum number of components in low-rank
+            mode, if None no limit.
+            Default=None
+        :type n_threads: int
+        :keyword n_threads: number of threads to split the filter bank
+            output across. If None, the global setting of
+            `mcfilter.get_n_threads` is used.
+            Default=None
         :type rb_cap: int
         :keyword rb_cap: capacity of the ringbuffer that stored observations
             for the filters to calculate the mean template.
@@ -108,15 +151,30 @@ class FilterBankNode(Node):
         :type verbose: int
         :keyword verbose: verbosity level, 0:none, >1: print .. ref `VERBOSE`
             Default=0
+        :type whiten: bool
+        :keyword whiten: if True, use the prewhitening mode.
+            Default=False
+        :type whiten_order: int
+        :keyword whiten_order: number of past samples the whitening filter
+            predicts from, if None use tf - 1.
+            Default=None
         """
 
         # kwargs
+        adc_gain = kwargs.pop('adc_gain', None)
+        adc_offset = kwargs.pop('adc_offset', None)
         ce = kwargs.pop('ce', None)
+        backend = kwargs.pop('backend', None)
         chan_set = kwargs.pop('chan_set', None)
         filter_cls = kwargs.pop('filter_cls', REMF)
+        lowrank_max = kwargs.pop('lowrank_max', None)
+        lowrank_tol = kwargs.pop('lowrank_tol', None)
+        n_threads = kwargs.pop('n_threads', None)
         rb_cap = kwargs.pop('rb_cap', 350)
         tf = kwargs.pop('tf', 47)
         verbose = kwargs.pop('verbose', 0)
+        whiten = kwargs.pop('whiten', False)
+        whiten_order = kwargs.pop('whiten_order', None)
         # everything not popped goes to mdp.Node.__init__ via super
 
         # checks
@@ -126,6 +184,10 @@ class FilterBankNode(Node):
             raise TypeError('\'filter_cls\' of type FilterNode is required!')
         if chan_set is None:
             chan_set = tuple(range(ce.get_nc()))
+        if whiten_order is None:
+            whiten_order = int(tf) - 1
+        if whiten is True and not 0 <= whiten_order < ce.tf_max:
+            raise ValueError('whiten_order has to be in [0, tf_max of ce)')
 
         # super
         super(FilterBankNode, self).__init__(**kwargs)
@@ -135,12 +197,28 @@ class FilterBankNode(Node):
         self._nc = None
         self._chan_set = None
         self._xcorrs = None
+        self._xc_store = None
+        self._xc_valid = None
+        self._xc_version = {}
+        self._hist = None
+        self._backend = backend
+        self._n_threads = n_threads
+        self._lowrank = None
+        self._lowrank_max = lowrank_max
+        self._lowrank_tol = None
+        self._whiten = bool(whiten)
+        self._whiten_order = int(whiten_order)
+        self._whist = None
+        self._wf = {}
         self._ce = None
         self._filter_cls = filter_cls
         self._rb_cap = int(rb_cap)
         self._idx_active_set = set()
         self.bank = {}
         self.verbose = VERBOSE(verbose)
+        self.adc_gain = adc_gain
+        self.adc_offset = adc_offset
+        self.lowrank_tol = lowrank_tol
 
         # set members
         self.cs = chan_set
@@ -182,6 +260,10 @@ class FilterBankNode(Node):
             shape = (0, self._tf, self._nc) if mc else (0, self._tf * self._nc)
             return sp.zeros(shape, dtype=self.dtype)
         f_list = self._get_idx_set(key_set)
+        if self._whiten is True:
+            # DOC: filters are only built on request in prewhitening mode
+            for f in f_list:
+                f.calc_filter()
         return sp.asarray([f.f if mc else f.f_conc for f in f_list])
 
     filter_set = property(get_filter_set, doc='filter set of active filters')
@@ -202,6 +284,53 @@ class FilterBankNode(Node):
     def _get_idx_set(self, key_set):
         return [self.bank[k] for k in key_set]
 
+    def get_whitener(self):
+        return self._ce.get_whitening_filter(tf=self._whiten_order + 1,
+                                             chan_set=self._chan_set)
+
+    whitener = property(get_whitener,
+                        doc='whitening filter bank for the prewhitening mode')
+
+    def _get_whitened(self, idx_list):
+        """whitened templates and filters on whitened data for filters
+
+        Both are cached per filter and recalculated when the template or
+        the covariance estimate changed. All stale templates are whitened in
+        one pass, separated by zeros.
+
+        :type idx_list: list
+        :param idx_list: filter idx list
+        :rtype: list
+        :returns: list of tuple(whitened template, filter for the whitened
+            signal)
+        """
+
+        keys = [(self.bank[i].version[0], self._ce, self._ce.version)
+                for i in idx_list]
+        stale = [(i, key) for i, key in zip(idx_list, keys)
+                 if self._wf.get(i, (None,))[0] != key]
+        if stale:
+            p = self._whiten_order
+            blk = p + self._tf
+            xi = sp.zeros((len(stale) * blk, self._nc), dtype=self.dtype)
+            for k, (i, _) in enumerate(stale):
+                xi[k * blk + p:(k + 1) * blk] = self.bank[i].xi
+            xi_w = mcfilter_bank_hist(xi, self.get_whitener(),
+                                      backend=self._backend)[0]
+            for k, (i, key) in enumerate(stale):
+                xi_w_i = xi_w[k * blk + p:(k + 1) * blk]
+                self._wf[i] = (key, xi_w_i,
+                               self.bank[i].whitened_filter(xi_w_i))
+        return [self._wf[i][1:] for i in idx_list]
+
+    def _get_bank_filters(self):
+        """filters applied by the filter bank kernel, for the active set"""
+
+        if self._whiten is True:
+            wf = self._get_whitened(list(self._idx_active_set))
+            return sp.asarray([f_w for _, f_w in wf])
+        return self.get_filter_set()
+
     ## properties public
 
     def get_chan_set(self):
@@ -213,6 +342,50 @@ class FilterBankNode(Node):
 
     cs = property(get_chan_set, set_chan_set)
 
+    def get_n_threads(self):
+        return self._n_threads
+
+    def set_n_threads(self, value):
+        if value is not None and int(value) < 1:
+            raise ValueError('n_threads has to be >= 1 or None')
+        self._n_threads = value
+
+    n_threads = property(get_n_threads, set_n_threads,
+                         doc='number of filtering threads, None for global')
+
+    def get_lowrank_tol(self):
+        return self._lowrank_tol
+
+    def set_lowrank_tol(self, value):
+        if value is not None and float(value) < 0:
+            raise ValueError('lowrank_tol has to be >= 0 or None')
+        self._lowrank_tol = value
+        self._lowrank = None
+
+    lowrank_tol = property(get_lowrank_tol, set_lowrank_tol,
+                           doc='reconstruction tolerance, None to disable '
+                               'the low-rank mode')
+
+    def get_lowrank_rank(self):
+        factors = self._get_lowrank()
+        if factors is None:
+            return None
+        return factors[0].shape[0]
+
+    lowrank_rank = property(get_lowrank_rank,
+                            doc='number of components in low-rank mode, '
+                                'None if not in use')
+
+    def get_lowrank_error(self):
+        factors = self._get_lowrank()
+        if factors is None:
+            return None
+        return factors[2]
+
+    lowrank_error = property(get_lowrank_error,
+                             doc='relative reconstruction error per active '
+                                 'filter in low-rank mode, None if not in use')
+
     def get_ce(self):
         return self._ce
 
@@ -237,9 +410,47 @@ class FilterBankNode(Node):
     def reset_history(self):
         """sets the history to all zeros for all filters"""
 
+        if self._hist is not None:
+            self._hist[:] = 0.0
+        if self._whist is not None:
+            self._whist[:] = 0.0
         for filt in self.bank.values():
             filt.reset_history()
 
+    def _get_filter_version(self, i):
+        """version of the filter applied for filter idx, changes whenever
+        the template or the filter changes"""
+
+        if self._whiten is True:
+            return self.bank[i].version[0], self._ce, self._ce.version
+        return self.bank[i].version
+
+    def _get_lowrank(self):
+        """factorisation of the active filter set for the low-rank mode
+
+        :rtype: tuple
+        :returns: components, coefficients and reconstruction error, or None
+            if the low-rank mode is disabled or does not reduce the number of
+            filters to apply.
+        """
+
+        if self._lowrank_tol is None or not self._idx_active_set:
+            return None
+        act = list(self._idx_active_set)
+        key = tuple((i, self._get_filter_version(i)) for i in act)
+        if self._lowrank is None or self._lowrank[0] != key:
+            factors = lowrank_factors(
+                sp.asarray(self._get_bank_filters(), dtype=self.dtype),
+                tol=self._lowrank_tol, max_rank=self._lowrank_max)
+            if factors[0].shape[0] >= self.get_nf():
+                factors = False
+            elif self.verbose.has_print:
+                print 'low-rank filter set: %d components for %d filters, ' \
+                      'max error %.4f' % (factors[0].shape[0], self.get_nf(),
+                                          factors[2].max())
+            self._lowrank = key, factors
+        return self._lowrank[1] or None
+
     def reset_rates(self):
         """resets the rate estimators for all filters (if applicable)"""
 
@@ -267,7 +478,9 @@ class FilterBankNode(Node):
             self._ce,
             rb_cap=self._rb_cap,
             chan_set=self._chan_set,
-            dtype=self.dtype)
+            dtype=self.dtype,
+            adc_gain=self.adc_gain,
+            adc_offset=self.adc_offset)
         #new_f.fill_xi_buf(xi)
         new_f.append_xi_buf(xi)
         idx = 0
@@ -275,6 +488,7 @@ class FilterBankNode(Node):
             idx = max(self.bank.keys()) + 1
         self.bank[idx] = new_f
         self._idx_active_set.add(idx)
+        self._lowrank = None
 
         # return and check internals
         rval = True
@@ -287,7 +501,8 @@ class FilterBankNode(Node):
 
         Filters are never deleted, but can be de-/reactivated and will be used
         respecting there activation state for the filter output of the
-        filter bank.
+        filter bank. The cross-correlation tensor is reduced to the remaining
+        active filters, no filters are recalculated.
 
         No effect if idx not in self.bank.
         """
@@ -295,8 +510,9 @@ class FilterBankNode(Node):
         if idx in self.bank:
             self.bank[idx].active = False
             self._idx_active_set.discard(idx)
-            if check is True:
-                self._check_internals()
+            self._lowrank = None
+            if check is True or self._xcorrs is not None:
+                self._update_xcorrs()
         else:
             logging.warn('no idx=%s in filter bank!' % idx)
 
@@ -313,13 +529,14 @@ class FilterBankNode(Node):
         if idx in self.bank:
             self.bank[idx].active = True
             self._idx_active_set.add(idx)
+            self._lowrank = None
             if check is True:
                 self._check_internals()
         else:
             logging.warn('no idx=%s in filter bank!' % idx)
 
     def _check_internals(self):
-        """triggers filter recalculation and rebuild xcorr tensor"""
+        """triggers filter recalculation and updates the xcorr tensor"""
 
         # check
         if self.verbose.has_print:
@@ -327,15 +544,78 @@ class FilterBankNode(Node):
         if not self.bank:
             return
 
-        # build filters
-        for i in self._idx_active_set:
-            self.bank[i].calc_filter()
+        # build filters, in prewhitening mode only on request
+        if self._whiten is False:
+            for i in self._idx_active_set:
+                self.bank[i].calc_filter()
+        self._lowrank = None
+
+        # update cross-correlation tensor
+        self._update_xcorrs()
+
+    def _update_xcorrs(self):
+        """update the xcorr tensor for the active filters
+
+        The xcorrs of all filters in the bank are kept in a store indexed by
+        the filter idx, together with a mask of the valid entries. Filters
+        with a template or filter that changed since the last update, as told
+        by `FilterNode.version`, get their rows and columns invalidated. In
+        prewhitening mode, the xcorrs are those of the whitened templates and
+        the filters for the whitened signal. Only invalid entries among the
+        active filters are recalculated, the tensor of the active filters is
+        then taken from the store.
+        """
 
-        # build cross-correlation tensor
-        self._xcorrs = xi_vs_f(
-            self.get_template_set(mc=False),
-            self.get_filter_set(mc=False),
-            nc=self._nc)
+        act = list(self._idx_active_set)
+        ntau = 2 * self._tf - 1
+        if not act:
+            self._xcorrs = sp.zeros((0, 0, ntau))
+            return
+        if (self._whiten is False and
+                any([self.bank[i].f is None for i in act])):
+            self._xcorrs = None
+            return
+
+        # grow store
+        nb = max(self.bank.keys()) + 1
+        if self._xc_store is None or self._xc_store.shape[0] < nb:
+            store = sp.zeros((nb, nb, ntau))
+            valid = sp.zeros((nb, nb), dtype=bool)
+            if self._xc_store is not None:
+                n0 = self._xc_store.shape[0]
+                store[:n0, :n0] = self._xc_store
+                valid[:n0, :n0] = self._xc_valid
+            self._xc_store, self._xc_valid = store, valid
+
+        # invalidate changed filters
+        for i in act:
+            version = self._get_filter_version(i)
+            if self._xc_version.get(i) != version:
+                self._xc_valid[i, :] = False
+                self._xc_valid[:, i] = False
+                self._xc_version[i] = version
+
+        # recalculate invalid entries
+        ix = sp.ix_(act, act)
+        valid = self._xc_valid[ix]
+        if not valid.all():
+            redo = [k for k in xrange(len(act)) if not valid[k].all()]
+            sub = self._xc_store[ix]
+            if self._whiten is True:
+                wf = self._get_whitened(act)
+                xi_set = [mcvec_to_conc(xi_w) for xi_w, _ in wf]
+                f_set = [mcvec_to_conc(f_w) for _, f_w in wf]
+            else:
+                xi_set = [self.bank[i].xi_conc for i in act]
+                f_set = [self.bank[i].f_conc for i in act]
+            xi_vs_f(sp.asarray(xi_set), sp.asarray(f_set), nc=self._nc,
+                    idx=redo, out=sub)
+            self._xc_store[ix] = sub
+            self._xc_valid[ix] = True
+            if self.verbose.has_print:
+                print 'xcorrs updated for %d of %d filters' % (len(redo),
+                                                               len(act))
+        self._xcorrs = self._xc_store[ix]
 
     ## mpd.Node interface
 
@@ -348,11 +628,43 @@ class FilterBankNode(Node):
     def _execute(self, x):
         if not self._idx_active_set:
             return sp.zeros((x.shape[0], 0), dtype=self.dtype)
-        rval = sp.empty((x.shape[0], self.nf))
-        for k, i in enumerate(self._idx_active_set):
-            rval[:, k] = self.bank[i](x)
+        if self._hist is None:
+            self._hist = sp.zeros((self._tf - 1, self._nc), dtype=self.dtype)
+        # DOC: the history item holds data, so it is valid in both modes
+        factors = self._get_lowrank()
+        f_set = self._get_bank_filters() if factors is None else factors[0]
+        if self._whiten is True:
+            if self._whist is None:
+                self._whist = sp.zeros((self._whiten_order, self._nc),
+                                       dtype=self.dtype)
+            x_w, self._whist = self._filter_input(x, self.get_whitener(),
+                                                  self._whist)
+            rval, self._hist = mcfilter_bank_hist(
+                x_w, f_set, self._hist, backend=self._backend,
+                n_threads=self._n_threads)
+        else:
+            rval, self._hist = self._filter_input(x, f_set, self._hist)
+        if factors is not None:
+            rval = lowrank_rebuild(rval, factors[1])
         return rval
 
+    def _filter_input(self, x, f_set, hist):
+        """apply a filter bank to the channel set of the input"""
+
+        if x.dtype.kind in 'iu':
+            # DOC: integer input is converted inside the kernel
+            return mcfilter_bank_hist(
+                x, f_set, hist, backend=self._backend,
+                n_threads=self._n_threads, chan_set=self._chan_set,
+                gain=self.adc_gain, offset=self.adc_offset)
+        # DOC: one contiguous copy of the channel subset for all filters
+        x_in = sp.ascontiguousarray(x, dtype=self.dtype)
+        if self._chan_set != tuple(range(x_in.shape[1])):
+            x_in = x_in[:, self._chan_set]
+        return mcfilter_bank_hist(
+            x_in, f_set, hist, backend=self._backend,
+            n_threads=self._n_threads)
+
     ## plotting methods
 
     def plot_xvft(self, ph=None, show=False):
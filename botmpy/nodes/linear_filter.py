@@ -50,7 +50,7 @@ __all__ = ['FilterError', 'FilterNode', 'MatchedFilterNode',
 ##---IMPORTS
 
 import scipy as sp
-from .base_nodes import Node
+from .base_nodes import Node, ADCInputMixin
 from ..common import (mcfilter_hist, mcvec_from_conc, mcvec_to_conc,
                       TimeSeriesCovE, MxRingBuffer, snr_maha)
 from collections import deque
@@ -61,7 +61,7 @@ class FilterError(Exception):
     pass
 
 
-class FilterNode(Node):
+class FilterNode(ADCInputMixin, Node):
     """linear filter in the time domain
 
     This node applies a linear filter to the data and returns the filtered
@@ -70,11 +70,19 @@ class FilterNode(Node):
     classmethod. The template will be averaged from a ringbuffer of
     observations. The covariance matrix is supplied from an external
     covariance estimator.
+
+    Raw integer ADC samples are accepted as input, see `ADCInputMixin`. They
+    are converted inside the filter kernel.
+
+    The filter and the SNR are only recalculated if the template buffer or
+    the covariance estimator changed since their last calculation, as told
+    by the version counters of both.
     """
 
     ## constructor
 
-    def __init__(self, tf, nc, ce, chan_set=None, rb_cap=None, dtype=None):
+    def __init__(self, tf, nc, ce, chan_set=None, rb_cap=None, dtype=None,
+                 adc_gain=None, adc_offset=None):
         """
         :type tf: int
         :param tf: template length in samples
@@ -92,6 +100,13 @@ class FilterNode(Node):
         :type dtype: dtype resolvable
         :param dtype: determines the internal dtype
             Default=None
+        :type adc_gain: float or ndarray
+        :param adc_gain: gain for integer input, scalar or per input channel
+            Default=None
+        :type adc_offset: float or ndarray
+        :param adc_offset: offset for integer input, scalar or per input
+            channel
+            Default=None
         """
 
         # checks
@@ -110,10 +125,15 @@ class FilterNode(Node):
                                     dtype=self.dtype)
         self._ce = None
         self._f = None
+        self._f_key = None
+        self._snr = None
+        self._snr_key = None
         self._hist = sp.zeros((tf - 1, nc), dtype=self.dtype)
         self._chan_set = tuple(sorted(chan_set))
         self.ce = ce
         self.active = True
+        self.adc_gain = adc_gain
+        self.adc_offset = adc_offset
 
     ## properties static or protected
 
@@ -147,6 +167,16 @@ class FilterNode(Node):
 
     f_conc = property(get_f_conc, doc='filter (concatenated)')
 
+    def get_version(self):
+        return self._xi_buf.version, self._f_key
+
+    version = property(get_version,
+                       doc='version of template and filter, changes whenever '
+                           'one of them changes')
+
+    def _get_key(self):
+        return self._ce, self._ce.version, self._xi_buf.version
+
     ## properties public
 
     def get_ce(self):
@@ -168,9 +198,13 @@ class FilterNode(Node):
     ce = property(get_ce, set_ce, doc='covariance estimator')
 
     def get_snr(self):
-        return snr_maha(
-            sp.array([mcvec_to_conc(self.xi)]),
-            self._ce.get_icmx(tf=self.tf, chan_set=self._chan_set))[0]
+        key = self._get_key()
+        if self._snr is None or self._snr_key != key:
+            self._snr = snr_maha(
+                sp.array([mcvec_to_conc(self.xi)]),
+                self._ce.get_icmx(tf=self.tf, chan_set=self._chan_set))[0]
+            self._snr_key = key
+        return self._snr
 
     snr = property(get_snr, doc='signal to noise ratio (mahalanobis distance)')
 
@@ -179,6 +213,12 @@ class FilterNode(Node):
     def _execute(self, x):
         """apply the filter to data"""
 
+        if x.dtype.kind in 'iu':
+            rval, self._hist = mcfilter_hist(
+                x, self._f, self._hist, chan_set=self._chan_set,
+                gain=self.adc_gain, offset=self.adc_offset)
+            return rval
+
         # DOC: ascontiguousarray is here for ctypes/cython purposes
         x_in = sp.ascontiguousarray(x, dtype=self.dtype)[:, self._chan_set]
         rval, self._hist = mcfilter_hist(x_in, self._f, self._hist)
@@ -277,10 +317,21 @@ class FilterNode(Node):
 
     ## filter calculation
 
-    def calc_filter(self):
-        """initiate a calculation of the filter"""
+    def calc_filter(self, force=False):
+        """initiate a calculation of the filter
+
+        The calculation is skipped if neither the template buffer nor the
+        covariance estimator changed since the last calculation.
+
+        :type force: bool
+        :param force: if True, always recalculate the filter
+        """
 
+        key = self._get_key()
+        if force is False and self._f is not None and self._f_key == key:
+            return
         self._f = self.filter_calculation(self.xi, self._ce, self._chan_set)
+        self._f_key = key
 
     @classmethod
     def filter_calculation(cls, xi, ce, cs, *args, **kwargs):
@@ -295,6 +346,18 @@ class FilterNode(Node):
 
         raise  NotImplementedError
 
+    @classmethod
+    def whitened_filter(cls, xi_w):
+        """ABSTRACT METHOD FOR THE FILTER ON WHITENED DATA
+
+        Implement this in a subclass to support filtering of prewhitened
+        data. The method should return the filter to apply to the whitened
+        signal given the whitened multichanneled template `xi_w`, such that
+        the output approximates the output of the filter on the raw signal.
+        """
+
+        raise NotImplementedError
+
     ## special methods
 
     def __str__(self):
@@ -324,6 +387,10 @@ class MatchedFilterNode(FilterNode):
         return sp.ascontiguousarray(mcvec_from_conc(f, nc=nc),
                                     dtype=xi.dtype)
 
+    @classmethod
+    def whitened_filter(cls, xi_w):
+        return xi_w
+
 
 class NormalisedMatchedFilterNode(FilterNode):
     """matched filters in the time domain optimise the signal to noise ratio
@@ -349,6 +416,11 @@ class NormalisedMatchedFilterNode(FilterNode):
         return sp.ascontiguousarray(mcvec_from_conc(f / norm_factor, nc=nc),
                                     dtype=sp.float32)
 
+    @classmethod
+    def whitened_filter(cls, xi_w):
+        return sp.ascontiguousarray(xi_w / (xi_w * xi_w).sum(),
+                                    dtype=sp.float32)
+
 
 class RateEstimator(object):
     def __init__(self, *args, **kwargs):
@@ -61,7 +61,7 @@ __all__ = ['EnergyNotCalculatedError', 'ThresholdDetectorNode', 'SDAbsNode',
 
 import scipy as sp
 from scipy.stats.mstats import mquantiles
-from .base_nodes import ResetNode
+from .base_nodes import ResetNode, ADCInputMixin
 from ..common import (threshold_detection, extract_spikes, merge_epochs,
                       get_cut, kteo, mteo, INDEX_DTYPE, get_aligned_spikes)
 
@@ -74,7 +74,7 @@ class EnergyNotCalculatedError(Exception):
         super(EnergyNotCalculatedError, self).__init__('self.energy is None')
 
 
-class ThresholdDetectorNode(ResetNode):
+class ThresholdDetectorNode(ADCInputMixin, ResetNode):
     """abstract interface for detecting feature epochs in a signal
 
     The ThresholdDetectorNode is the abstract interface for all detectors. The
@@ -97,6 +97,10 @@ class ThresholdDetectorNode(ResetNode):
 
     Extra information about the events or the internals has to be saved in
     member variables along with a proper interface.
+
+    Raw integer ADC samples are accepted as input, see `ADCInputMixin`. The
+    input is kept as is, the energy is computed from one converted channel at
+    a time.
     """
 
     ## constructor
@@ -104,7 +108,8 @@ class ThresholdDetectorNode(ResetNode):
     def __init__(self, input_dim=None, output_dim=None, dtype=None,
                  energy_func=None, threshold_func=None, threshold_mode='gt',
                  threshold_base='energy', threshold_factor=1.0, tf=47,
-                 min_dist=1, find_max=True, ch_separate=False):
+                 min_dist=1, find_max=True, ch_separate=False, adc_gain=None,
+                 adc_offset=None):
         """
         see mdp.Node
         :type energy_func: function
@@ -155,6 +160,12 @@ class ThresholdDetectorNode(ResetNode):
         :param ch_separate: if True, find event per channel separatly, else
             use the max along the signal energy function.
             Default=False
+        :type adc_gain: float or ndarray
+        :param adc_gain: gain for integer input, scalar or per channel.
+            Default=None
+        :type adc_offset: float or ndarray
+        :param adc_offset: offset for integer input, scalar or per channel.
+            Default=None
         """
 
         # super
@@ -182,6 +193,8 @@ class ThresholdDetectorNode(ResetNode):
         self.nchan = None
         self.extracted_events = None
         self.ch_sep = bool(ch_separate)
+        self.adc_gain = adc_gain
+        self.adc_offset = adc_offset
         # properties handles
         self._events = None
 
@@ -236,7 +249,13 @@ class ThresholdDetectorNode(ResetNode):
         # produce data in one piece
         self.data = sp.vstack(self.data)
         # calculate energy
-        self.energy = self._energy_func(self.data)
+        if self.data.dtype.kind in 'iu':
+            self.energy = sp.empty(self.data.shape, dtype=self.dtype)
+            for c in xrange(self.data.shape[1]):
+                self.energy[:, c] = sp.ravel(
+                    self._energy_func(self.adc_to_float(self.data, (c,))))
+        else:
+            self.energy = self._energy_func(self.data)
         if self.energy.ndim == 1:
             self.energy = sp.atleast_2d(self.energy).T
         self.size, self.nchan = self.energy.shape
@@ -357,7 +376,7 @@ class ThresholdDetectorNode(ResetNode):
                     align_at *= self.tf
                 align_at = int(align_at)
             self.extracted_events, self.events = get_aligned_spikes(
-                self.data, self.events, align_at=align_at, tf=self.tf, mc=mc,
+                self.adc_to_float(self.data), self.events, align_at=align_at, tf=self.tf, mc=mc,
                 kind=kind, rsf=rsf)
 
         # return extracted events
@@ -396,10 +415,10 @@ class ThresholdDetectorNode(ResetNode):
     def _calc_threshold(self):
         """calculates the threshold"""
 
-        base = {
-                   'signal': self.data,
-                   'energy': self.energy
-               }[self.th_base]
+        if self.th_base == 'signal':
+            base = self.adc_to_float(self.data)
+        else:
+            base = self.energy
         if self.ch_sep is False:
             base = sp.atleast_2d(sp.absolute(base).max(axis=1)).T
         self.threshold = sp.asarray(
@@ -59,12 +59,12 @@ __all__ = ['FilterBankSortingNode', 'AdaptiveBayesOptimalTemplateMatchingNode',
 ##---IMPORTS
 
 import collections
-import copy
 import logging
 import sys
+from threading import Thread
 
 import scipy as sp
-from scipy import linalg as sp_la
+from scipy.signal import resample
 
 from sklearn.mixture import log_multivariate_normal_density
 from sklearn.utils.extmath import logsumexp
@@ -77,11 +77,11 @@ from .prewhiten import PrewhiteningNode
 from .spike_detection import SDMteoNode, ThresholdDetectorNode
 from ..common import (
     overlaps, epochs_from_spiketrain, epochs_from_spiketrain_set,
-    shifted_matrix_sub, mcvec_to_conc, epochs_from_binvec, merge_epochs,
-    matrix_argmax, dict_list_to_ndarray, get_cut, GdfFile, MxRingBuffer,
+    mcvec_to_conc, epochs_from_binvec, merge_epochs,
+    matrix_argmax, get_cut, GdfFile, MxRingBuffer,
     mcvec_from_conc, get_aligned_spikes, vec2ten, get_tau_align_min,
     get_tau_align_max, get_tau_align_energy, mad_scaling, mad_scale_op_mx,
-    mad_scale_op_vec, xi_vs_f)
+    mad_scale_op_vec, xi_vs_f, SpikeStore)
 
 ##---CONSTANTS
 
@@ -101,6 +101,9 @@ class FilterBankSortingNode(FilterBankNode):
     `self._sort_chunk` and `self._post_sort` methods with meaning full
     processing. After the filter steps the filter output is present and can be
     processed on. Input data can be partitioned into chunks of smaller size.
+
+    Integer ADC input is converted to physical units once on entry, as the
+    sorting stages operate on the float input data.
     """
 
     def __init__(self, **kwargs):
@@ -138,6 +141,25 @@ class FilterBankSortingNode(FilterBankNode):
         :keyword chunk_size: if input data will be longer than chunk_size, the
             input will be processed chunk per chunk to overcome memory sinks
             Default=100000
+        :type pipeline: bool
+        :keyword pipeline: if True, the next chunk is filtered in a background
+            thread while the current chunk is sorted. The filter bank must
+            not change during the sorting of a chunk.
+            Default=False
+        :type halo: int
+        :keyword halo: number of samples of context on both sides of a chunk.
+            Each chunk is sorted together with its halo and only the spikes
+            detected in the chunk itself are kept, so spikes close to chunk
+            borders are not truncated. A halo of about `2 * tf` is sufficient
+            for spikes and their overlap partners. There is no halo at the
+            ends of the input data.
+            Default=0
+        :type store_file: str
+        :keyword store_file: if not None, the sorted spikes are kept in
+            memory-mapped files with this path prefix, see `SpikeStore`.
+            The files are reused by every call, the per unit spike trains in
+            `rval` are copies in this case.
+            Default=None
         :type verbose: int
         :keyword verbose: verbosity level, 0:none, >1: print .. ref `VERBOSE`
                 Default=0
@@ -160,6 +182,9 @@ class FilterBankSortingNode(FilterBankNode):
                     '[ntemps][tf][nc]!')
             kwargs['tf'] = templates.shape[1]
         chunk_size = kwargs.pop('chunk_size', 100000)
+        pipeline = kwargs.pop('pipeline', False)
+        halo = kwargs.pop('halo', 0)
+        store_file = kwargs.pop('store_file', None)
         # everything not popped goes to super
         super(FilterBankSortingNode, self).__init__(**kwargs)
 
@@ -168,7 +193,13 @@ class FilterBankSortingNode(FilterBankNode):
         self._data = None
         self._chunk = None
         self._chunk_offset = 0
+        self._chunk_core = None
         self._chunk_size = int(chunk_size)
+        self._pipeline = bool(pipeline)
+        self._halo = None
+        self.halo = halo
+        self._store = SpikeStore(filename=store_file)
+        self._rval_units = []
         self.rval = {}
 
         # create filters for templates
@@ -176,6 +207,13 @@ class FilterBankSortingNode(FilterBankNode):
             for temp in templates:
                 self.create_filter(temp)
 
+    ## mdp.Node interface
+
+    def _refcast(self, x):
+        if x.dtype.kind in 'iu':
+            return self.adc_to_float(x)
+        return super(FilterBankSortingNode, self)._refcast(x)
+
     ## SortingNode interface
 
     def _execute(self, x):
@@ -183,44 +221,113 @@ class FilterBankSortingNode(FilterBankNode):
         #self._data = x[:, self._chan_set]
         self._data = x
         dlen = self._data.shape[0]
-        self.rval.clear()
-        for i in self._idx_active_set:
-            self.rval[i] = []
-        curr_chunk = 0
-        has_next_chunk = True
-
-        # sort per chunk
-        while has_next_chunk:
-            # get chunk limits
-            self._chunk_offset = curr_chunk * self._chunk_size
-            clen = min(dlen, (curr_chunk + 1) * self._chunk_size)
-            clen -= self._chunk_offset
-
-            # generate data chunk and process
-            self._chunk = self._data[
-                          self._chunk_offset:self._chunk_offset + clen]
-            self._fout = sp.empty((clen, self.nf))
-
-            # filtering
-            self._pre_filter()
-            self._fout = super(FilterBankSortingNode, self)._execute(
-                self._chunk)
+        self._store.clear()
+        self._rval_units = sorted(self._idx_active_set)
+        chunks = [(start, min(dlen, start + self._chunk_size))
+                  for start in xrange(0, max(dlen, 1), self._chunk_size)]
+
+        # sort per chunk, including the halo around the chunk
+        fouts = self._iter_fout(chunks)
+        buf = collections.deque()
+        for start, stop in chunks:
+            # filter ahead for the halo, drop filter outputs left of it
+            w0 = max(0, start - self._halo)
+            w1 = min(dlen, stop + self._halo)
+            while not buf or buf[-1][1] < w1:
+                buf.append(fouts.next())
+            while len(buf) > 1 and buf[0][1] <= w0:
+                buf.popleft()
+            self._set_chunk(w0, w1)
+            self._chunk_core = start, stop
+            if len(buf) == 1:
+                self._fout = buf[0][2][w0 - buf[0][0]:w1 - buf[0][0]]
+            else:
+                self._fout = sp.concatenate(
+                    [fout[max(w0, f0) - f0:min(w1, f1) - f0]
+                     for f0, f1, fout in buf])
             self._post_filter()
 
-            # sorting
+            # sorting, only spikes in the chunk core are kept
+            n_spks = len(self._store)
             self._pre_sort()
             self._sort_chunk()
+            if self._halo > 0:
+                samples = self._store.get_column('sample')[n_spks:]
+                self._store.keep((samples >= start) & (samples < stop),
+                                 start=n_spks)
             self._post_sort()
-
-            # iteration
-            curr_chunk += 1
-            if self._chunk_offset + clen >= dlen:
-                has_next_chunk = False
         self._combine_results()
 
         # return input data
         return x
 
+    def _set_chunk(self, start, stop):
+        self._chunk_offset = start
+        self._chunk = self._data[start:stop]
+
+    def _iter_fout(self, chunks):
+        """yields the filter outputs of the chunks in order
+
+        In pipeline mode, the chunk after the yielded one is filtered in a
+        background thread, while the caller processes the yielded one.
+
+        :type chunks: list
+        :param chunks: list of (start, stop) tuples
+        :returns: generator of (start, stop, fout) tuples
+        """
+
+        fetch = None
+        for k, (start, stop) in enumerate(chunks):
+            if fetch is None:
+                self._set_chunk(start, stop)
+                self._pre_filter()
+                fetch = self._filter_chunk(self._chunk)
+            fout = fetch()
+            fetch = None
+            if self._pipeline is True and k + 1 < len(chunks):
+                self._set_chunk(*chunks[k + 1])
+                self._pre_filter()
+                fetch = self._filter_chunk(self._chunk, background=True)
+            yield start, stop, fout
+
+    def _filter_chunk(self, chunk, background=False):
+        """filter a chunk, in a background thread if requested
+
+        The filter history carries over between calls, so chunks have to be
+        filtered in order.
+
+        :type chunk: ndarray
+        :param chunk: input data chunk
+        :type background: bool
+        :param background: if True, filter in a background thread
+        :rtype: callable
+        :returns: callable yielding the filter output of the chunk
+        """
+
+        if background is False:
+            fout = super(FilterBankSortingNode, self)._execute(chunk)
+            return lambda: fout
+
+        rval = {}
+
+        def run():
+            try:
+                rval['fout'] = super(FilterBankSortingNode, self)._execute(
+                    chunk)
+            except Exception:
+                rval['exc_info'] = sys.exc_info()
+
+        def fetch():
+            thread.join()
+            if 'exc_info' in rval:
+                exc_type, exc_value, exc_tb = rval['exc_info']
+                raise exc_type, exc_value, exc_tb
+            return rval['fout']
+
+        thread = Thread(target=run)
+        thread.start()
+        return fetch
+
     ## FilterBankSortingNode interface - prototypes
 
     def _pre_filter(self):
@@ -239,11 +346,69 @@ class FilterBankSortingNode(FilterBankNode):
         pass
 
     def _combine_results(self):
-        self.rval = dict_list_to_ndarray(self.rval)
-        correct = int(self._tf / 2)
-        for k in self.rval:
-            self.rval[k].sort()
-            self.rval[k] -= correct
+        # DOC: the per unit spike trains are views into the spike store. A
+        # store on disk reuses its files for the next call, so the trains are
+        # copied in that case to stay valid.
+        self._store.sort()
+        self._store.get_column('sample')[:] -= int(self._tf / 2)
+        on_disk = self._store.filename is not None
+        self.rval = {}
+        for k in self._rval_units:
+            st = self._store.get_unit(k)
+            self.rval[k] = st.copy() if on_disk else st
+
+    ## streaming interface
+
+    def sort_stream(self, chunks):
+        """sort an input stream chunk by chunk
+
+        Each chunk is sorted as if passed to the node, the filter history
+        carries over between chunks. The result is yielded as soon as a chunk
+        has been sorted, so memory stays bounded for long recordings.
+
+        :type chunks: iterable
+        :param chunks: iterable of input data chunks [ns, nc]
+        :returns: generator of (units, samples) tuples of ndarray per chunk,
+            ordered by sample. Samples are relative to the stream start.
+        """
+
+        offset = 0
+        for x in chunks:
+            self.execute(x)
+            units = self._store.get_column('unit')
+            samples = self._store.get_column('sample')
+            order = sp.lexsort((units, samples))
+            yield units[order], samples[order] + offset
+            offset += x.shape[0]
+
+    ## properties
+
+    def get_pipeline(self):
+        return self._pipeline
+
+    def set_pipeline(self, value):
+        self._pipeline = bool(value)
+
+    pipeline = property(get_pipeline, set_pipeline,
+                        doc='filter the next chunk while sorting the current')
+
+    def get_halo(self):
+        return self._halo
+
+    def set_halo(self, value):
+        value = int(value)
+        if value < 0:
+            raise ValueError('halo has to be >= 0')
+        self._halo = value
+
+    halo = property(get_halo, set_halo,
+                    doc='samples of context on both sides of a chunk')
+
+    def get_spike_store(self):
+        return self._store
+
+    spike_store = property(get_spike_store,
+                           doc='store of the spikes sorted by the last call')
 
     ## result access
 
@@ -266,18 +431,17 @@ class FilterBankSortingNode(FilterBankNode):
             Default=None
         """
 
-        # init
-        cut = get_cut(self._tf)
-        rval = None
-        size = 0, sum(cut), self._data.shape[1]
-        if mc is False:
-            size = size[0], size[1] * size[2]
-        st_dict = copy.deepcopy(self.rval)
+        # init, only the spike train of u is replaced
+        st_dict = dict(self.rval)
+        st_u = self.rval[u]
+        if align_rsf != 1.0:
+            # DOC: the spike train is rescaled in place when resampling
+            st_u = st_u.astype(sp.float64)
 
         # extract spikes
         spks, st_dict[u] = get_aligned_spikes(
             self._data,
-            st_dict[u],
+            st_u,
             align_at=align_at,
             tf=self._tf,
             mc=mc,
@@ -289,6 +453,54 @@ class FilterBankSortingNode(FilterBankNode):
                 spks = spks[ovlp_info[u] == False]
         return spks
 
+    def spikes_all(self, mc=True, exclude_overlaps=True, overlap_window=None,
+                   align_at=-1, align_kind='min', align_rsf=1.):
+        """yields the spikes for all filters
+
+        Like `spikes_u` for every filter, but the data is resampled at most
+        once and the overlaps are determined once, on the aligned spike
+        trains of all filters. The spike trains of the result are not copied.
+
+        :type mc: bool
+        :param mc: if True, return spikes multi-channeled, else return spikes
+            concatenated
+            Default=True
+        :type exclude_overlaps: bool
+        :param exclude_overlaps: if True, exclude overlap spike
+        :type overlap_window: int
+        :param overlap_window: if `exclude_overlaps` is True, this will define
+            the overlap range,
+            if None set overlap_window=self._tf.
+            Default=None
+        :rtype: dict
+        :returns: dict of spikes per filter index
+        """
+
+        # init
+        data, tf, at = self._data, self._tf, align_at
+        if align_rsf != 1.0:
+            data = resample(data, align_rsf * data.shape[0])
+            tf *= align_rsf
+            at *= align_rsf
+
+        # extract spikes
+        spks, st_dict = {}, {}
+        for u in self.rval:
+            st_u = self.rval[u]
+            if align_rsf != 1.0:
+                st_u = st_u * align_rsf
+            spks[u], st_dict[u] = get_aligned_spikes(
+                data, st_u, align_at=at, tf=tf, mc=mc, kind=align_kind)
+            if align_rsf != 1.0:
+                spks[u] = resample(
+                    spks[u], spks[u].shape[1] * 1. / align_rsf, axis=1)
+                st_dict[u] = st_dict[u] * (1. / align_rsf)
+        if exclude_overlaps is True:
+            ovlp_info = overlaps(st_dict, overlap_window or self._tf)[0]
+            for u in spks:
+                spks[u] = spks[u][ovlp_info[u] == False]
+        return spks
+
     ## plotting methods
 
     def plot_sorting(self, ph=None, show=False):
@@ -364,14 +576,15 @@ class FilterBankSortingNode(FilterBankNode):
         cut = get_cut(self._tf)
 
         # build waveforms
+        spks = self.spikes_all(
+            exclude_overlaps=False, align_kind=self._align_kind,
+            align_at=getattr(self, '_learn_templates', -1),
+            align_rsf=getattr(self, '_learn_templates_rsf', 1.))
+        spks_ex = self.spikes_all(align_kind=self._align_kind)
         for u in self.rval:
-            spks_u = self.spikes_u(
-                u, exclude_overlaps=False, align_kind=self._align_kind,
-                align_at=getattr(self, '_learn_templates', -1),
-                align_rsf=getattr(self, '_learn_templates_rsf', 1.))
             temps[u] = self.bank[u].xi_conc
-            if spks_u.size > 0:
-                wf[u] = self.spikes_u(u, align_kind=self._align_kind)
+            if spks[u].size > 0:
+                wf[u] = spks_ex[u]
             else:
                 wf[u] = temps[u]
 
@@ -397,8 +610,8 @@ class BayesOptimalTemplateMatchingNode(FilterBankSortingNode):
 
     Can use two implementations of the Bayes Optimal Template-Matching (BOTM)
     algorithm as presented in [2]. First implementation uses explicitly
-    constructed overlap channels for the extend of the complete input
-    signal, the other implementation uses subtractive interference
+    constructed overlap channels, evaluated on the candidate spike epochs
+    of the input signal, the other implementation uses subtractive interference
     cancellation (SIC) on epochs of the signal, where the template
     discriminants are greater the the noise discriminant.
     """
@@ -432,10 +645,19 @@ class BayesOptimalTemplateMatchingNode(FilterBankSortingNode):
         :type sic_guard: bool
         :keyword sic_guard: when True, test before setting a spike that
             removing it does not increase the norm of all discriminants.
+        :type ovlp_margin: float
+        :keyword ovlp_margin: overlap channels are only evaluated in
+            candidate epochs, where a single unit discriminant comes within
+            `ovlp_margin` of the noise discriminant. If None, the margin is
+            derived from the template cross-correlations, so that no
+            overlap channel exceeding the noise discriminant is missed.
+
+            Default=None
         """
 
         # kwargs
         ovlp_taus = kwargs.pop('ovlp_taus', None)
+        ovlp_margin = kwargs.pop('ovlp_margin', None)
         noi_pr = kwargs.pop('noi_pr', 1e0)
         spk_pr = kwargs.pop('spk_pr', 1e-6)
         spk_pr_bias = kwargs.pop('spk_pr_bias', None)
@@ -446,6 +668,7 @@ class BayesOptimalTemplateMatchingNode(FilterBankSortingNode):
 
         # members
         self._ovlp_taus = ovlp_taus
+        self._ovlp_margin = ovlp_margin
         if self._ovlp_taus is not None:
             self._ovlp_taus = list(self._ovlp_taus)
             if self.verbose.has_print:
@@ -460,6 +683,8 @@ class BayesOptimalTemplateMatchingNode(FilterBankSortingNode):
         self._lpr_s = None
         self._pr_s_b = None
         self._oc_idx = None
+        self._ovlp_tables = None
+        self._xcorrs_sub = None
 
         self.noise_prior = noi_pr
         self.spike_prior = spk_pr
@@ -513,50 +738,168 @@ class BayesOptimalTemplateMatchingNode(FilterBankSortingNode):
     def _post_filter(self):
         """build discriminant functions, prepare for sorting"""
 
-        # tune filter outputs to prob. model
+        # tune filter outputs to prob. model, overlap channels are built
+        # locally for the spike epochs in `_get_disc`
         ns = self._fout.shape[0]
-        nf = self.nf
-        if self._ovlp_taus is not None:
-            nf += nf * (nf - 1) * 0.5 * len(self._ovlp_taus)
-        self._disc = sp.empty((ns, nf), dtype=self.dtype)
-        self._disc[:] = sp.nan
+        self._disc = sp.empty((ns, self.nf), dtype=self.dtype)
         for i in xrange(self.nf):
             self._disc[:, i] = (self._fout[:, i] + self._lpr_s -
                                 .5 * self.get_xcorrs_at(i))
 
-        self._build_overlap(ns, self._disc, self._ovlp_taus)
+    def _get_disc(self, start, stop):
+        """discriminants for the samples [start:stop] of the chunk
+
+        Single unit discriminants are taken from the chunk, overlap
+        channels are built for this window only.
+
+        :type start: int
+        :param start: first sample
+        :type stop: int
+        :param stop: sample after the last sample
+        :returns: ndarray - discriminants [stop - start, nf + n_ovlp]
+        """
+
+        if self._ovlp_taus is None:
+            return self._disc[start:stop]
+        ns = self._disc.shape[0]
+        pad = max(abs(tau) for tau in self._ovlp_taus)
+        start_p, stop_p = max(0, start - pad), min(ns, stop + pad)
+        n_oc = self.nf * (self.nf - 1) / 2 * len(self._ovlp_taus)
+        rval = sp.empty((stop_p - start_p, self.nf + n_oc), dtype=self.dtype)
+        rval[:] = sp.nan
+        rval[:, :self.nf] = self._disc[start_p:stop_p]
+        self._build_overlap(stop_p - start_p, rval, self._ovlp_taus)
+        return rval[start - start_p:stop - start_p]
+
+    def _get_ovlp_threshold(self):
+        """threshold on the single unit discriminants for candidate epochs
+
+        An overlap channel can only exceed the noise discriminant, if one of
+        its single unit discriminants exceeds half the sum of the noise
+        discriminant and the cross-correlation of the pair.
+        """
+
+        if self._ovlp_margin is not None:
+            return self._lpr_n - self._ovlp_margin
+        if self.nf < 2:
+            return self._lpr_n
+        taus = sp.asarray(self._ovlp_taus) + self._tf - 1
+        iu = sp.triu_indices(self.nf, 1)
+        xc_min = self._xcorrs[iu[0], iu[1]][:, taus].min()
+        return min(self._lpr_n, .5 * (self._lpr_n + xc_min))
+
+    def _get_spike_epochs(self):
+        """find the spike epochs of this chunk
+
+        Spike epochs are centered on the discriminant maximum. Overlap
+        channels are only evaluated within candidate epochs, so memory
+        scales with the number of spikes rather than the chunk length.
+
+        :returns: ndarray - merged spike epochs [[start, end]]
+        """
+
+        ns = self._disc.shape[0]
+        if self._ovlp_taus is None:
+            cand = [(0, ns)]
+        else:
+            pad = max(abs(tau) for tau in self._ovlp_taus) + 1
+            cand = epochs_from_binvec(
+                sp.nanmax(self._disc, axis=1) > self._get_ovlp_threshold())
+            if cand.size == 0:
+                return cand
+            cand = merge_epochs(
+                [[max(0, ep[0] - pad), min(ns, ep[1] + pad)] for ep in cand])
+        l, r = get_cut(2 * self._tf)
+
+        spk_ep = []
+        for c0, c1 in cand:
+            disc = self._get_disc(c0, c1)
+            for ep in epochs_from_binvec(sp.nanmax(disc, axis=1) >
+                                         self._lpr_n):
+                # FIX: for now we just continue for empty epochs,
+                # where do they come from anyways?!
+                if ep[1] - ep[0] < 1:
+                    spk_ep.append([c0 + ep[0], c0 + ep[1]])
+                    continue
+                mc = disc[ep[0]:ep[1], :].argmax(0).argmax()
+                s = disc[ep[0]:ep[1], mc].argmax() + ep[0] + c0
+                spk_ep.append([max(0, s - l), min(ns, s + r)])
+        if len(spk_ep) == 0:
+            return sp.zeros((0, 2))
+        return merge_epochs(spk_ep)
+
+    def _get_ovlp_tables(self, ovlp_taus):
+        """index tables for the overlap channels
+
+        The tables are rebuilt when the xcorr tensor or the overlap shifts
+        changed, i.e. once per change of the filter bank.
+
+        :type ovlp_taus: list
+        :param ovlp_taus: overlap shifts
+        :returns: tuple - (f0, f1, taus, xc, inactive) where f0 and f1 are
+            the filter keys of the pairs [n_pairs], taus the shifts [n_taus],
+            xc the pair xcorrs at the shifts [n_pairs, n_taus] and inactive
+            the mask of pairs with a deactivated filter [n_pairs]
+        """
+
+        taus_key = tuple(ovlp_taus)
+        if (self._ovlp_tables is not None and
+                self._ovlp_tables[0] is self._xcorrs and
+                self._ovlp_tables[1] == taus_key):
+            return self._ovlp_tables[2]
+
+        # Build correct indices when filters are deactivated
+        oc_map = {}
+        off = 0
+        for f in xrange(self.nf):
+            if not self.bank[f].active:
+                off += 1
+                oc_map[f] = None
+            else:
+                oc_map[f] = f - off
+
+        f0, f1 = sp.triu_indices(self.nf, 1)
+        taus = sp.asarray(ovlp_taus, dtype=int)
+        inactive = sp.array([oc_map[i] is None or oc_map[j] is None
+                             for i, j in zip(f0, f1)], dtype=bool)
+        xc = self._xcorrs[f0, f1][:, taus + self._tf - 1]
+        self._oc_idx = {}
+        oc_idx = self.nf
+        for i, j in zip(f0, f1):
+            for tau in ovlp_taus:
+                self._oc_idx[oc_idx] = (oc_map[i], oc_map[j], tau)
+                oc_idx += 1
+
+        rval = f0, f1, taus, xc, inactive
+        self._ovlp_tables = self._xcorrs, taus_key, rval
+        return rval
 
     def _build_overlap(self, ns, disc, ovlp_taus):
         # build overlap channels from filter outputs for overlap channels
-        if ovlp_taus is not None:
-            self._oc_idx = {}
-            oc_idx = self.nf
-
-            # Build correct indices when filters are deactivated
-            oc_map = {}
-            off = 0
-            for f in xrange(self.nf):
-                if not self.bank[f].active:
-                    off += 1
-                    oc_map[f] = None
-                else:
-                    oc_map[f] = f - off
-
-            for f0 in xrange(self.nf):
-                for f1 in xrange(f0 + 1, self.nf):
-                    for tau in ovlp_taus:
-                        self._oc_idx[oc_idx] = (
-                            oc_map[f0], oc_map[f1], tau)
-                        f0_lim = [max(0, 0 - tau), min(ns, ns - tau)]
-                        f1_lim = [max(0, 0 + tau), min(ns, ns + tau)]
-                        if oc_map[f0] is None or oc_map[f1] is None:
-                            disc[f0_lim[0]:f0_lim[1], oc_idx] = 0
-                        else:
-                            disc[f0_lim[0]:f0_lim[1], oc_idx] = (
-                                disc[f0_lim[0]:f0_lim[1], f0] +
-                                disc[f1_lim[0]:f1_lim[1], f1] -
-                                self.get_xcorrs_at(f0, f1, tau))
-                        oc_idx += 1
+        if ovlp_taus is None:
+            return
+        f0, f1, taus, xc, inactive = self._get_ovlp_tables(ovlp_taus)
+        n_pr, n_tau = xc.shape
+        if n_pr == 0:
+            return
+        nf = self.nf
+
+        # single unit discriminants of f1 shifted by tau [ns, pairs, taus]
+        pad = abs(taus).max()
+        d1 = sp.empty((ns + 2 * pad, nf), dtype=disc.dtype)
+        d1[:] = sp.nan
+        d1[pad:pad + ns] = disc[:ns, :nf]
+        rows = sp.arange(ns)[:, None] + taus + pad
+        d1 = d1[rows[:, None, :], f1[None, :, None]]
+
+        # samples where the shifted discriminant is within the window
+        valid = (rows >= pad) & (rows < ns + pad)
+        d1 += disc[:ns, f0][:, :, None]
+        d1 -= xc.astype(disc.dtype)
+        d1[:, inactive, :] = 0
+        disc[:ns, nf:] = sp.where(
+            valid[:, None, :], d1,
+            disc[:ns, nf:].reshape(ns, n_pr, n_tau)).reshape(ns, -1)
 
     import copy
     def _sort_chunk(self):
@@ -575,41 +918,77 @@ class BayesOptimalTemplateMatchingNode(FilterBankSortingNode):
         # init
         if self.nf == 0:
             return
-        spk_ep = epochs_from_binvec(
-            sp.nanmax(self._disc, axis=1) > self._lpr_n)
+        spk_ep = self._get_spike_epochs()
         if spk_ep.size == 0:
             return
-        l, r = get_cut(2 * self._tf)
-
-        for i in xrange(spk_ep.shape[0]):
-            # FIX: for now we just continue for empty epochs,
-            # where do they come from anyways?!
-            if spk_ep[i, 1] - spk_ep[i, 0] < 1:
-                continue
-            mc = self._disc[spk_ep[i, 0]:spk_ep[i, 1], :].argmax(0).argmax()
-            s = self._disc[spk_ep[i, 0]:spk_ep[i, 1], mc].argmax() + spk_ep[
-                i, 0]
-            spk_ep[i] = [s - l, s + r]
-            spk_ep[i][0] = max(0, spk_ep[i][0])
-            spk_ep[i][1] = min(self._disc.shape[0], spk_ep[i][1])
-
-        # check epochs
-        spk_ep = merge_epochs(spk_ep)
         n_ep = spk_ep.shape[0]
 
+        # resolve epochs
+        spks = []
         for i in xrange(n_ep):
             ep_fout = self._fout[spk_ep[i, 0]:spk_ep[i, 1]+1, :]
-            ep_fout_norm = sp_la.norm(ep_fout)
-            ep_disc = self._disc[spk_ep[i, 0]:spk_ep[i, 1]+1, :].copy()
+            ep_fout_sq = sp.square(ep_fout).sum(dtype=sp.float64)
+            ep_disc = self._get_disc(spk_ep[i, 0], spk_ep[i, 1]+1).copy()
             self._sort_sic(
-                i, spk_ep, n_ep, ep_fout, ep_fout_norm, ep_disc,
-                self._ovlp_taus)
+                i, spk_ep, n_ep, ep_fout, ep_fout_sq, ep_disc,
+                self._ovlp_taus, spks)
+
+        # collect results in epoch order
+        if spks:
+            units, samples, disc, ovlp = zip(*spks)
+            self._store.extend(samples, units, disc, ovlp)
+
+    def _get_xcorrs_sub(self):
+        """subtrahends for the filter outputs per template
 
-        #del ep_fout, ep_disc, sub
+        The negated xcorr tensor in [nf, 2tf-1, nf] layout, so the rows to
+        subtract for a spike are a contiguous slice. It is rebuilt when the
+        xcorr tensor changed.
 
-    def _sort_sic(self, i, spk_ep, n_ep, ep_fout, ep_fout_norm, ep_disc,
-                 ovlp_taus):
-        """ Perform sorting on given discriminants
+        :rtype: ndarray
+        :returns: subtrahend tensor [nf, 2tf-1, nf]
+        """
+
+        if self._xcorrs_sub is None or self._xcorrs_sub[0] is not self._xcorrs:
+            xc_sub = sp.ascontiguousarray(
+                -self._xcorrs.transpose(0, 2, 1), dtype=self.dtype)
+            self._xcorrs_sub = self._xcorrs, xc_sub
+        return self._xcorrs_sub[1]
+
+    def _get_sic_sub(self, templ_idx, ep_t, ns):
+        """subtrahend for the filter outputs of an epoch for a spike
+
+        Only the rows [lo:hi] of the epoch are touched by the subtraction,
+        the subtrahend is returned for these rows.
+
+        :type templ_idx: list
+        :param templ_idx: (filter idx, tau) for each template of the spike
+        :type ep_t: int
+        :param ep_t: sample of the spike in the epoch
+        :type ns: int
+        :param ns: sample count of the epoch
+        :rtype: tuple
+        :returns: lo, hi, subtrahend [hi-lo, nf]
+        """
+
+        xc_sub = self._get_xcorrs_sub()
+        ntau = xc_sub.shape[1]
+        offs = [(tidx, tau + ep_t - self._tf + 1) for tidx, tau in templ_idx]
+        lo = max(0, min([o for _, o in offs]))
+        hi = max(lo, min(ns, max([o for _, o in offs]) + ntau))
+        sub = sp.zeros((hi - lo, self.nf), dtype=xc_sub.dtype)
+        for tidx, o in offs:
+            a, b = max(lo, o), min(hi, o + ntau)
+            if a < b:
+                sub[a - lo:b - lo] += xc_sub[tidx, a - o:b - o]
+        return lo, hi, sub
+
+    def _sort_sic(self, i, spk_ep, n_ep, ep_fout, ep_fout_sq, ep_disc,
+                 ovlp_taus, spks):
+        """ Perform sorting on given discriminants, found spikes are appended
+        to `spks` as (idx, sample, disc, ovlp) tuples. `ep_fout_sq` is the
+        squared norm of `ep_fout`, it is updated with the rows changed by a
+        subtraction and returned.
         """
         niter = 0
         while sp.nanmax(ep_disc) > self._lpr_n:
@@ -628,6 +1007,7 @@ class BayesOptimalTemplateMatchingNode(FilterBankSortingNode):
             # find epoch details
             ep_t = sp.nanargmax(sp.nanmax(ep_disc, axis=1))
             ep_c = sp.nanargmax(ep_disc[ep_t])
+            ep_d = ep_disc[ep_t, ep_c]
 
             # Find involved templates
             templ_idx = []
@@ -640,29 +1020,28 @@ class BayesOptimalTemplateMatchingNode(FilterBankSortingNode):
                 # Corner case?
                 if my_oc_idx[2] == max(ovlp_taus) or \
                         my_oc_idx[2] == min(ovlp_taus):
-                    self._sort_sic(
+                    return self._sort_sic(
                         i, spk_ep, n_ep, ep_fout[:, :self.nf],
-                        ep_fout_norm, ep_disc[:, :self.nf], None)
-                    return
+                        ep_fout_sq, ep_disc[:, :self.nf], None, spks)
 
                 templ_idx.append((self.get_idx_for(my_oc_idx[0]), 0))
                 templ_idx.append(
                     (self.get_idx_for(my_oc_idx[1]), my_oc_idx[2]))
 
-            # build subtrahend
-            sub = shifted_matrix_sub(
-                sp.zeros_like(ep_disc[:, :self.nf]),
-                self._xcorrs[templ_idx[0][0], :, :].T,
-                templ_idx[0][1] + ep_t - self._tf + 1)
-            for tidx in templ_idx[1:]:
-                sub += shifted_matrix_sub(
-                    sp.zeros_like(ep_disc[:, :self.nf]),
-                    self._xcorrs[tidx[0], :, :].T,
-                    tidx[1] + ep_t - self._tf + 1)
+            # build subtrahend for the rows [lo:hi] of the epoch
+            ns = ep_disc.shape[0]
+            lo, hi, sub = self._get_sic_sub(templ_idx, ep_t, ns)
+            sub = sub.astype(ep_disc.dtype, copy=False)
+
+            # squared norm of the filter outputs after the subtraction
+            fout_win = ep_fout[lo:hi, :self.nf]
+            fout_new = fout_win + sub
+            fout_new_sq = (ep_fout_sq -
+                           sp.square(fout_win).sum(dtype=sp.float64) +
+                           sp.square(fout_new).sum(dtype=sp.float64))
 
             # apply subtrahend
-            if not self.use_sic_guard or \
-                    ep_fout_norm > sp_la.norm(ep_fout + sub):
+            if not self.use_sic_guard or ep_fout_sq > fout_new_sq:
                 ## DEBUG
 
                 if self.verbose.get_has_plot(1):
@@ -685,14 +1064,16 @@ class BayesOptimalTemplateMatchingNode(FilterBankSortingNode):
                     ax2.set_color_cycle(['k'] + COLOURS[:self.nf])
                     ax2.plot(x_range, sp.zeros_like(x_range),
                              ls='--')
-                    ax2.plot(x_range, sub)
+                    sub_plot = sp.zeros((ns, self.nf))
+                    sub_plot[lo:hi] = sub
+                    ax2.plot(x_range, sub_plot)
                     ax2.axvline(x_range[ep_t], c='k')
 
                 ## BUGED
 
-                ep_disc[:, :self.nf] += sub
-                ep_fout[:, :self.nf] += sub
-                ep_fout_norm = sp_la.norm(ep_fout)
+                ep_disc[lo:hi, :self.nf] += sub
+                ep_fout[lo:hi, :self.nf] = fout_new
+                ep_fout_sq = fout_new_sq
                 if self._pr_s_b is not None:
                     bias, extend = self._pr_s_b
                     if ep_c < self.nf:
@@ -727,20 +1108,23 @@ class BayesOptimalTemplateMatchingNode(FilterBankSortingNode):
                 if ep_c < self.nf:
                     # was single unit
                     fid = self.get_idx_for(ep_c)
-                    self.rval[fid].append(
-                        spk_ep[i, 0] + ep_t + self._chunk_offset)
+                    spks.append(
+                        (fid, spk_ep[i, 0] + ep_t + self._chunk_offset,
+                         ep_d, False))
                 else:
                     # was overlap
                     my_oc_idx = self._oc_idx[ep_c]
                     fid0 = self.get_idx_for(my_oc_idx[0])
-                    self.rval[fid0].append(
-                        spk_ep[i, 0] + ep_t + self._chunk_offset)
+                    spks.append(
+                        (fid0, spk_ep[i, 0] + ep_t + self._chunk_offset,
+                         ep_d, True))
                     fid1 = self.get_idx_for(my_oc_idx[1])
-                    self.rval[fid1].append(
-                        spk_ep[i, 0] + ep_t + my_oc_idx[2] +
-                        self._chunk_offset)
+                    spks.append(
+                        (fid1, spk_ep[i, 0] + ep_t + my_oc_idx[2] +
+                         self._chunk_offset, ep_d, True))
             else:
                 break
+        return ep_fout_sq
 
     ## BOTM implementation
 
@@ -1118,11 +1502,12 @@ class AdaptiveBayesOptimalTemplateMatchingNode(
 
         start = max(0, disc_ep[0] - padding)
         stop = min(self._disc.shape[0], disc_ep[1] + padding)
-        return self._disc[start:stop, :].max() >= 0.0
+        return self._get_disc(start, stop).max() >= 0.0
 
     def _post_sort(self):
         """check the spike sorting against multi unit"""
 
+        core0, core1 = self._chunk_core
         if self._external_spike_train is None:
             self.det.reset()
             self.det(self._chunk, ck0=self._chunk_offset,
@@ -1130,11 +1515,13 @@ class AdaptiveBayesOptimalTemplateMatchingNode(
             if self.det.events is None:
                 return
             events = self.det.events
+            events = events[sp.logical_and(
+                events + self._chunk_offset >= core0,
+                events + self._chunk_offset < core1)]
         else:
             events = self._external_spike_train[sp.logical_and(
-                self._external_spike_train >= self._chunk_offset,
-                self._external_spike_train < self._chunk_offset + len(
-                    self._chunk))]
+                self._external_spike_train >= core0,
+                self._external_spike_train < core1)]
 
         events_explained = sp.array([self._event_explained(e) for e in events])
         if self.verbose.has_print:
@@ -1240,11 +1627,12 @@ class AdaptiveBayesOptimalTemplateMatchingNode(
             return
 
         # adapt filters with found waveforms
+        spks = self.spikes_all(mc=True, exclude_overlaps=True,
+                               align_at=self._learn_templates or -1,
+                               align_kind=self._align_kind,
+                               align_rsf=self._learn_templates_rsf)
         for u in self.rval:
-            spks_u = self.spikes_u(u, mc=True, exclude_overlaps=True,
-                                   align_at=self._learn_templates or -1,
-                                   align_kind=self._align_kind,
-                                   align_rsf=self._learn_templates_rsf)
+            spks_u = spks[u]
             if spks_u.size == 0:
                 continue
             self.bank[u].extend_xi_buf(spks_u)
@@ -1317,7 +1705,7 @@ class AdaptiveBayesOptimalTemplateMatchingNode(
         """cluster step for initialisation"""
 
         # get all spikes and clear buffers
-        spks = self._det_buf[:].copy()
+        spks = sp.concatenate(self._det_buf.views())
         self._det_buf.clear()
         self._det_samples.clear()
 
@@ -1411,7 +1799,7 @@ class AdaptiveBayesOptimalTemplateMatchingNode(
         """cluster step for normal operation"""
 
         # get all spikes and clear buffer
-        spks = self._det_buf[:].copy()
+        spks = sp.concatenate(self._det_buf.views())
         self._det_buf.clear()
         self._det_samples.clear()
 
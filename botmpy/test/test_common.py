@@ -56,7 +56,7 @@ from botmpy.common import (
     mcvec_from_conc, mcvec_to_conc, xcorr, shifted_matrix_sub,
     dict_list_to_ndarray, dict_sort_ndarrays, get_idx, merge_epochs,
     invert_epochs, epochs_from_binvec, epochs_from_spiketrain,
-    epochs_from_spiketrain_set, chunk_data, get_cut, snr_maha, snr_peak,
+    epochs_from_spiketrain_set, chunk_data, extract_spikes, get_cut, snr_maha, snr_peak,
     snr_power, overlaps, matrix_cond, diagonal_loading, coloured_loading,
     matrix_argmax, matrix_argmin, get_tau_for_alignment, get_tau_align_min,
     get_tau_align_max, get_tau_align_energy, get_aligned_spikes)
@@ -73,6 +73,27 @@ class TestCommonFuncsFilterutil(ut.TestCase):
         assert_equal(xvf.sum(), 8.0)
         assert_equal((xvf != 0.0).sum(), 4)
 
+    def testXiVsFPartial(self, nc=3):
+        tf = 8
+        xis = sp.randn(4, tf * nc)
+        fs = sp.randn(4, tf * nc)
+        xvf = xi_vs_f(xis, fs, nc=nc)
+        # reference for one pair, lags -(tf-1) .. tf-1
+        xi0, f1 = mcvec_from_conc(xis[0], nc=nc), mcvec_from_conc(fs[1], nc=nc)
+        assert_almost_equal(xvf[0, 1], sp.correlate(
+            xi0[:, 0], f1[:, 0], 'full') + sp.correlate(
+            xi0[:, 1], f1[:, 1], 'full') + sp.correlate(
+            xi0[:, 2], f1[:, 2], 'full'))
+        # rows and columns only
+        out = xvf.copy()
+        out[2, :] = out[:, 2] = 0.0
+        xi_vs_f(xis, fs, nc=nc, idx=[2], out=out)
+        assert_almost_equal(out, xvf)
+        self.assertRaises(ValueError, xi_vs_f, xis, fs, nc, [2])
+        # symmetric for patterns as filters
+        assert_almost_equal(xi_vs_f(xis, xis, nc=nc, symmetric=True),
+                            xi_vs_f(xis, xis, nc=nc))
+
     def testKTeo(self):
         # TODO: how to test this?!
         pass
@@ -312,6 +333,26 @@ class TestCommonFuncsSpike(ut.TestCase):
             nchunks += 1
         assert_equal(nchunks, len(ep) + 1)
 
+    def testExtractSpikes(self):
+        """test for spike waveform extraction"""
+
+        data = sp.array([sp.arange(100), 100 + sp.arange(100)]).T
+        ep = sp.array([[5, 9], [20, 24], [98, 102]])
+
+        # multichanneled, end epoch zero padded
+        spks = extract_spikes(data, ep, mc=True)
+        self.assertTupleEqual(spks.shape, (3, 4, 2))
+        assert_equal(spks[0], data[5:9])
+        assert_equal(spks[1], data[20:24])
+        assert_equal(spks[2, :2], data[98:])
+        assert_equal(spks[2, 2:], 0)
+
+        # channel concatenated
+        spks_conc = extract_spikes(data, ep, mc=False)
+        self.assertTupleEqual(spks_conc.shape, (3, 8))
+        assert_equal(spks_conc[1], sp.r_[data[20:24, 0], data[20:24, 1]])
+        assert_equal(spks_conc[2], sp.r_[98, 99, 0, 0, 198, 199, 0, 0])
+
     def testGetCut(self):
         """test for cut window parameter generation"""
 
@@ -368,6 +409,20 @@ class TestCommonFuncsSpike(ut.TestCase):
             assert_equal(ovlp[k], sts_test[k])
             assert_equal(ovlp_nums[k], sum(sts_test[k]))
 
+    def testOverlapsUnsorted(self):
+        sts = {
+            0: sp.random.randint(0, 1000, 40),
+            1: sp.random.randint(0, 1000, 30),
+            2: sp.random.randint(0, 1000, 20),
+            3: sp.array([], dtype=int)}
+        ovlp, ovlp_nums = overlaps(sts, 8)
+        for k in sts:
+            others = sp.concatenate([sts[j] for j in sts if j != k])
+            test = [sp.absolute(others - t).min() < 8 if others.size
+                    else False for t in sts[k]]
+            assert_equal(ovlp[k], test)
+            assert_equal(ovlp_nums[k], sum(test))
+
 
 class TestCommonMatrixOps(ut.TestCase):
     def setUp(self):
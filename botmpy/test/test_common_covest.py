@@ -50,7 +50,7 @@ except ImportError:
 
 from numpy.testing import assert_equal, assert_almost_equal
 import scipy as sp
-from botmpy.common import TimeSeriesCovE
+from botmpy.common import TimeSeriesCovE, mcfilter_bank_hist
 
 ##---TESTS
 
@@ -88,6 +88,24 @@ class TestCovarianceEstimator(ut.TestCase):
         should_be_eye20 = sp.dot(C_2_10, iC_2_10)
         assert_almost_equal(should_be_eye20, sp.eye(20), decimal=5)
 
+    def testWhiteningFilter(self):
+        # coloured noise with cross-channel correlation
+        data = sp.randn(self.dlen / 5, 2)
+        data[1:] += 0.8 * data[:-1]
+        data[:, 1] += 0.5 * data[:, 0]
+        ce = TimeSeriesCovE(tf_max=10, nc=2, dtype=sp.float64)
+        ce.update(data)
+        whf = ce.get_whitening_filter(tf=6, chan_set=(0, 1))
+        self.assertTupleEqual(whf.shape, (2, 6, 2))
+        self.assertIs(ce.get_whitening_filter(tf=6, chan_set=(0, 1)), whf)
+        white, _ = mcfilter_bank_hist(data, whf)
+        assert_almost_equal(sp.cov(white[10:].T), sp.eye(2), decimal=1)
+        # white noise estimate gives a scaled identity
+        ce = TimeSeriesCovE.white_noise_init(10, 2, std=2.0)
+        whf = ce.get_whitening_filter(tf=3, chan_set=(0, 1))
+        assert_almost_equal(whf[:, -1], sp.eye(2) * 0.5)
+        assert_almost_equal(whf[:, :-1], 0.0)
+
 ##---MAIN
 
 if __name__ == '__main__':
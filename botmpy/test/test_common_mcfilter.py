@@ -49,11 +49,28 @@ except ImportError:
     import unittest as ut
 
 from numpy.testing import assert_equal, assert_almost_equal
+import os
+import shutil
+import tempfile
+import threading
 import scipy as sp
 from botmpy.common.mcfilter.mcfilter_cy import (
-    _mcfilter_cy32, _mcfilter_cy64, _mcfilter_hist_cy32, _mcfilter_hist_cy64)
+    _mcfilter_cy32, _mcfilter_cy64, _mcfilter_hist_cy32, _mcfilter_hist_cy64,
+    _mcfilter_bank_hist_cy32, _mcfilter_bank_hist_cy64,
+    _mcfilter_bank_hist_adc_cy32)
 from botmpy.common.mcfilter.mcfilter_py import (
-    _mcfilter_py, _mcfilter_hist_py)
+    _mcfilter_py, _mcfilter_hist_py, _mcfilter_bank_hist_py)
+from botmpy.common.mcfilter.mcfilter_fft import (
+    _mcfilter_fft, _mcfilter_hist_fft, _mcfilter_bank_hist_fft)
+from botmpy.common.mcfilter import (mcfilter, mcfilter_hist,
+                                    mcfilter_bank_hist, select_backend,
+                                    get_n_threads, set_n_threads)
+from botmpy.common.mcfilter import mcfilter_mt
+from botmpy.common.mcfilter.mcfilter_mt import get_segments
+from botmpy.common.mcfilter.mcfilter_tune import (cache_key, load_cache,
+                                                  save_cache)
+from botmpy.common.mcfilter import BACKENDS, tune, _TUNED, _check_backend
+from botmpy.common.mcfilter import lowrank_factors, lowrank_rebuild
 
 ##---TESTS
 
@@ -168,6 +185,24 @@ class TestMcFilter(ut.TestCase):
         cut = int(sp.floor(5.0 / 2))
         assert_equal(data[:-cut], sp.array([fout[cut:]]).T)
 
+    def testShortChunksInPlace(self):
+        """test history update for chunks shorter than the history"""
+        tf = 9
+        nc = 2
+        data = sp.randn(40, nc)
+        filt = sp.randn(tf, nc)
+        fout_ref = _mcfilter_hist_cy64(data, filt, sp.zeros((tf - 1, nc)))[0]
+        for kernel in [_mcfilter_hist_cy64, _mcfilter_hist_fft,
+                       _mcfilter_hist_py]:
+            hist = sp.zeros((tf - 1, nc))
+            fout = []
+            for i in xrange(0, 40, 3):
+                fo, hist_out = kernel(data[i:i + 3], filt, hist)
+                self.assertIs(hist_out, hist)
+                fout.append(fo)
+            assert_almost_equal(sp.concatenate(fout), fout_ref)
+            assert_equal(hist, data[-(tf - 1):])
+
     def testMcfilterRecoveryPy(self):
         data = sp.zeros((100, 1), dtype=sp.float64)
         data[sp.arange(0, 100, 10)] = 1.0
@@ -178,6 +213,288 @@ class TestMcFilter(ut.TestCase):
         assert_equal(data, sp.array([fout]).T)
 
 
+
+class TestMcFilterFFT(ut.TestCase):
+    def testFFTVsCyBatch(self):
+        """test fft and cython batch filtering"""
+        tf = 21
+        nc = 4
+        data = sp.randn(1000, nc)
+        filt = sp.randn(tf, nc)
+        assert_almost_equal(_mcfilter_fft(data, filt),
+                            _mcfilter_cy64(data, filt), decimal=4)
+
+    def testFFTVsCyHistory(self):
+        """test fft and cython online filtering over several chunks"""
+        tf = 65
+        nc = 4
+        data = sp.randn(3000, nc)
+        filt = sp.randn(tf, nc)
+        hist_fft = sp.zeros((tf - 1, nc))
+        hist_cy = sp.zeros((tf - 1, nc))
+        for chunk in [data[:1000], data[1000:1010], data[1010:]]:
+            fofft, hist_fft = _mcfilter_hist_fft(chunk, filt, hist_fft)
+            focy, hist_cy = _mcfilter_hist_cy64(chunk, filt, hist_cy)
+            assert_almost_equal(fofft, focy, decimal=4)
+            assert_equal(hist_fft, hist_cy)
+
+    def testBackendSwitch(self):
+        """test switching backends between chunks"""
+        tf = 65
+        nc = 4
+        data = sp.randn(2000, nc).astype(sp.float32)
+        filt = sp.randn(tf, nc).astype(sp.float32)
+        fout_ref = mcfilter_hist(data, filt, backend='direct')[0]
+        hist = sp.zeros((tf - 1, nc), dtype=sp.float32)
+        fout = []
+        for i, backend in enumerate(['fft', 'direct', 'fft', 'auto']):
+            fo, hist = mcfilter_hist(data[i * 500:(i + 1) * 500], filt, hist,
+                                     backend=backend)
+            fout.append(fo)
+        assert_almost_equal(sp.concatenate(fout), fout_ref, decimal=3)
+        self.assertRaises(ValueError, mcfilter, data, filt, backend='foo')
+
+    def testSelectBackend(self):
+        self.assertEqual(select_backend(10, 65, 4), 'direct')
+        self.assertEqual(select_backend(100000, 65, 16), 'fft')
+        self.assertEqual(select_backend(100000, 3, 1), 'direct')
+
+
+class TestMcFilterBank(ut.TestCase):
+    def setUp(self):
+        self.tf = 21
+        self.nc = 4
+        self.nf = 5
+        self.data = sp.randn(1500, self.nc)
+        self.bank = sp.randn(self.nf, self.tf, self.nc)
+
+    def _single_filter_reference(self, chunks):
+        rval = []
+        for k in xrange(self.nf):
+            hist = sp.zeros((self.tf - 1, self.nc))
+            fout = []
+            for chunk in chunks:
+                fo, hist = _mcfilter_hist_cy64(chunk, self.bank[k], hist)
+                fout.append(fo)
+            rval.append(sp.concatenate(fout))
+        return sp.vstack(rval).T, hist
+
+    def testBankVsSingle(self):
+        """test bank kernels against the single filter kernel"""
+        chunks = [self.data[:700], self.data[700:710], self.data[710:]]
+        fout_ref, hist_ref = self._single_filter_reference(chunks)
+        for kernel, dec in [(_mcfilter_bank_hist_cy64, 7),
+                            (_mcfilter_bank_hist_py, 7),
+                            (_mcfilter_bank_hist_fft, 7)]:
+            hist = sp.zeros((self.tf - 1, self.nc))
+            fout = []
+            for chunk in chunks:
+                fo, hist = kernel(chunk, self.bank, hist)
+                fout.append(fo)
+            assert_almost_equal(sp.concatenate(fout), fout_ref, decimal=dec)
+            assert_equal(hist, hist_ref)
+
+    def testBankCy32(self):
+        data = self.data.astype(sp.float32)
+        bank = self.bank.astype(sp.float32)
+        hist = sp.zeros((self.tf - 1, self.nc), dtype=sp.float32)
+        fout, hist = _mcfilter_bank_hist_cy32(data, bank, hist)
+        for k in xrange(self.nf):
+            fo = _mcfilter_hist_cy32(
+                data, bank[k], sp.zeros_like(hist))[0]
+            assert_almost_equal(fout[:, k], fo, decimal=4)
+        assert_equal(hist, data[-(self.tf - 1):])
+
+    def testBankDispatch(self):
+        fout_ref = mcfilter_bank_hist(self.data, self.bank,
+                                      backend='direct')[0]
+        fout_fft = mcfilter_bank_hist(self.data, self.bank, backend='fft')[0]
+        self.assertEqual(fout_ref.shape, (self.data.shape[0], self.nf))
+        assert_almost_equal(fout_fft, fout_ref)
+        self.assertRaises(ValueError, mcfilter_bank_hist, self.data,
+                          self.bank[0])
+
+    def testBankLowRank(self):
+        """test low-rank factorisation of a bank spanned by few filters"""
+        coef_ref = sp.randn(self.nf, 2)
+        bank = sp.tensordot(coef_ref, self.bank[:2], axes=1)
+        comps, coefs, err = lowrank_factors(bank, tol=1e-8)
+        self.assertEqual(comps.shape, (2, self.tf, self.nc))
+        self.assertEqual(coefs.shape, (self.nf, 2))
+        self.assertTrue(sp.all(err < 1e-8))
+        fout_ref = mcfilter_bank_hist(self.data, bank)[0]
+        fout = lowrank_rebuild(mcfilter_bank_hist(self.data, comps)[0], coefs)
+        assert_almost_equal(fout, fout_ref)
+        # rank limit and reported error
+        comps, coefs, err = lowrank_factors(self.bank, tol=0.0, max_rank=2)
+        self.assertEqual(comps.shape[0], 2)
+        rec = sp.tensordot(coefs, comps, axes=1)
+        err_ref = (sp.sqrt(((rec - self.bank) ** 2).sum(axis=2).sum(axis=1)) /
+                   sp.sqrt((self.bank ** 2).sum(axis=2).sum(axis=1)))
+        assert_almost_equal(err, err_ref)
+
+
+class TestMcFilterThreaded(ut.TestCase):
+    def setUp(self):
+        self.tf = 21
+        self.nc = 4
+        self.data = sp.randn(10000, self.nc)
+        self.filt = sp.randn(self.tf, self.nc)
+
+    def tearDown(self):
+        set_n_threads(1)
+
+    def testSegments(self):
+        self.assertEqual(get_segments(10000, 1), [(0, 10000)])
+        segs = get_segments(10000, 4)
+        self.assertEqual(len(segs), 4)
+        self.assertEqual(segs[0][0], 0)
+        self.assertEqual(segs[-1][1], 10000)
+        self.assertEqual(len(get_segments(100, 4)), 1)
+        self.assertRaises(ValueError, set_n_threads, 0)
+
+    def testPoolMap(self):
+        """test the shared pool with concurrent maps of different sizes"""
+        size0 = mcfilter_mt._POOL_SIZE
+        errors = []
+
+        def run(k):
+            try:
+                for n in xrange(1, 8):
+                    items = range(n + k)
+                    rval = mcfilter_mt._pool_map(lambda x: x * 2, items)
+                    self.assertEqual(rval, [x * 2 for x in items])
+            except Exception, ex:
+                errors.append(ex)
+
+        threads = [threading.Thread(target=run, args=(k,)) for k in xrange(3)]
+        for th in threads:
+            th.start()
+        for th in threads:
+            th.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(mcfilter_mt._POOL_SIZE, max(size0, 9))
+        self.assertEqual(mcfilter_mt._POOL_USERS, 0)
+
+    def testThreadedHistory(self):
+        """test threaded filtering over several chunks"""
+        hist_ref = sp.zeros((self.tf - 1, self.nc))
+        hist = sp.zeros((self.tf - 1, self.nc))
+        for chunk in [self.data[:7000], self.data[7000:7010],
+                      self.data[7010:]]:
+            fo_ref, hist_ref = mcfilter_hist(chunk, self.filt, hist_ref,
+                                             backend='direct', n_threads=1)
+            fo, hist = mcfilter_hist(chunk, self.filt, hist,
+                                     backend='threaded', n_threads=3)
+            assert_almost_equal(fo, fo_ref)
+            assert_equal(hist, hist_ref)
+
+    def testThreadedBatchAndBank(self):
+        set_n_threads(4)
+        self.assertEqual(get_n_threads(), 4)
+        fout = mcfilter(self.data, self.filt, backend='threaded')
+        fout_ref = mcfilter(self.data, self.filt, backend='direct')
+        assert_almost_equal(fout, fout_ref, decimal=4)
+        bank = sp.randn(3, self.tf, self.nc)
+        fout = mcfilter_bank_hist(self.data, bank, backend='threaded')[0]
+        fout_ref = mcfilter_bank_hist(self.data, bank, backend='direct')[0]
+        assert_almost_equal(fout, fout_ref)
+
+
+class TestMcFilterADC(ut.TestCase):
+    def setUp(self):
+        self.tf = 21
+        self.gain = sp.array([0.1, 0.2, 0.3, 0.4, 0.5])
+        self.offset = sp.array([1.0, 2.0, -3.0, 4.0, 5.0])
+        self.chan = (0, 2, 3)
+        self.raw = (sp.randn(6000, 5) * 300).astype(sp.int16)
+        self.bank = sp.randn(3, self.tf, len(self.chan))
+        self.data = (self.raw * self.gain + self.offset)[:, self.chan]
+
+    def testADCVsFloat(self):
+        """test integer input against converted float input"""
+        fout_ref, hist_ref = mcfilter_bank_hist(self.data, self.bank,
+                                                backend='direct')
+        for backend in BACKENDS:
+            hist = sp.zeros((self.tf - 1, len(self.chan)))
+            fout = []
+            for chunk in [self.raw[:5000], self.raw[5000:5010],
+                          self.raw[5010:]]:
+                fo, hist = mcfilter_bank_hist(
+                    chunk, self.bank, hist, backend=backend, n_threads=2,
+                    chan_set=self.chan, gain=self.gain, offset=self.offset)
+                fout.append(fo)
+            assert_almost_equal(sp.vstack(fout), fout_ref)
+            assert_almost_equal(hist, hist_ref)
+        fout = mcfilter_hist(self.raw, self.bank[0], chan_set=self.chan,
+                             gain=self.gain, offset=self.offset)[0]
+        assert_almost_equal(fout, fout_ref[:, 0])
+
+    def testADCKernelCy32(self):
+        bank = self.bank.astype(sp.float32)
+        hist = sp.zeros((self.tf - 1, len(self.chan)), dtype=sp.float32)
+        fout, hist = _mcfilter_bank_hist_adc_cy32(
+            self.raw, bank, hist, sp.array(self.chan, dtype=sp.intp),
+            self.gain[list(self.chan)].astype(sp.float32),
+            self.offset[list(self.chan)].astype(sp.float32))
+        fout_ref = _mcfilter_bank_hist_py(
+            self.data.astype(sp.float32), bank, sp.zeros_like(hist))[0]
+        assert_almost_equal(fout / 100, fout_ref / 100, decimal=3)
+
+
+class TestMcFilterRegistry(ut.TestCase):
+    def setUp(self):
+        self.tf = 21
+        self.nc = 4
+        self.data = sp.randn(3000, self.nc)
+        self.bank = sp.randn(3, self.tf, self.nc)
+        self.tuned = dict(_TUNED)
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        _TUNED.clear()
+        _TUNED.update(self.tuned)
+        shutil.rmtree(self.tmp)
+
+    def testBackendsAgree(self):
+        """test all registered backends against each other"""
+        self.assertEqual(
+            set(BACKENDS) & {'direct', 'threaded', 'fft', 'numpy'},
+            {'direct', 'threaded', 'fft', 'numpy'})
+        fout_ref = mcfilter_bank_hist(self.data, self.bank,
+                                      backend='direct')[0]
+        for backend in BACKENDS:
+            fout = mcfilter_bank_hist(self.data, self.bank,
+                                      backend=backend)[0]
+            assert_almost_equal(fout, fout_ref)
+            fout = mcfilter_hist(self.data, self.bank[0], backend=backend)[0]
+            assert_almost_equal(fout, fout_ref[:, 0])
+
+    def testTune(self):
+        name = tune(sp.float64, self.tf, self.nc, 3000, nf=3, repeats=1,
+                    save=False)
+        self.assertIn(name, BACKENDS)
+        key = cache_key(sp.float64, self.tf, self.nc, 3000, 3, 1)
+        self.assertEqual(_TUNED[key], name)
+        # a tuned choice is used for auto selection
+        _TUNED[key] = 'numpy'
+        self.assertEqual(_check_backend(
+            None, sp.dtype(sp.float64), 2500, self.tf, self.nc, 3), 'numpy')
+        self.assertRaises(ValueError, _check_backend, 'foo',
+                          sp.dtype(sp.float64), 2500, self.tf, self.nc)
+
+    def testCachePersistence(self):
+        path = os.path.join(self.tmp, 'sub', 'cache.json')
+        self.assertEqual(load_cache(path), {})
+        cache = {cache_key(sp.float32, 47, 4, 1000, 20, 2): 'fft'}
+        self.assertTrue(save_cache(cache, path))
+        self.assertEqual(load_cache(path), cache)
+        self.assertEqual(cache.keys()[0], 'float32:47:4:1024:20:2')
+        with open(path, 'w') as f:
+            f.write('{broken')
+        self.assertEqual(load_cache(path), {})
+
+
 """
 def mcfilter_hist_py_test(inp=None, plot=False):
     if inp is None:
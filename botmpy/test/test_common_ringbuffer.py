@@ -135,6 +135,51 @@ class TestMxRingbuffer(ut.TestCase):
         assert_equal(self.rb.mean(2), sp.eye(4) * 5.5)
         assert_equal(self.rb.mean(1), sp.eye(4) * 6.0)
 
+    def testRunningMean(self):
+        """running sum against the mean over the contents"""
+
+        rb = MxRingBuffer(5, 3, dtype=sp.float64, resum=7)
+        for i in xrange(23):
+            rb.append(sp.randn(3) * (i + 1))
+            assert_almost_equal(rb.mean(), sp.mean(rb[:], axis=0))
+        # resum happened within the last 7 appends
+        self.assertLess(rb._n_since_resum, 7)
+        rb.fill(sp.ones(3))
+        assert_equal(rb.mean(), sp.ones(3))
+        rb.capacity = 3
+        assert_almost_equal(rb.mean(), sp.ones(3))
+        rb.clear()
+        assert_equal(rb.mean(), sp.zeros(3))
+        self.assertRaises(ValueError, MxRingBuffer, 5, 3, None, 0)
+
+    def testExtendBlock(self):
+        """test block extend against single appends"""
+
+        rb = MxRingBuffer(6, (4, 4))
+        for n in [0, 4, 5, 1, 14, 3]:
+            block = sp.randn(n, 4, 4)
+            self.rb.extend(block)
+            for item in block:
+                rb.append(item)
+            self.assertEqual(len(self.rb), len(rb))
+            assert_equal(self.rb[:], rb[:])
+            assert_almost_equal(self.rb.mean(), rb.mean(), decimal=5)
+        self.assertRaises(ValueError, self.rb.extend, sp.ones((2, 4, 3)))
+
+    def testViews(self):
+        """test ordered views on the contents"""
+
+        self.assertEqual(len(self.rb.views()[0]), 0)
+        self.rb.extend([sp.eye(4) * (i + 1) for i in xrange(4)])
+        self.assertEqual(len(self.rb.views()), 1)
+        self.rb.extend([sp.eye(4) * (i + 5) for i in xrange(4)])
+        views = self.rb.views()
+        self.assertEqual(len(views), 2)
+        assert_equal(sp.concatenate(views), self.rb[:])
+        assert_equal(views[0][0], sp.eye(4) * 3)
+        # views share memory with the buffer
+        self.assertTrue(sp.may_share_memory(views[0], self.rb._data))
+
     def testIndexing(self):
         """test for indexing elements and slices"""
 
@@ -153,5 +198,21 @@ class TestMxRingbuffer(ut.TestCase):
             assert_equal(self.rb[i], sp.eye(4) * (i + 4))
         assert_equal(self.rb[:2], sp.array([sp.eye(4) * 4, sp.eye(4) * 5]))
 
+    def testVersion(self):
+        """test version counter on changes"""
+
+        v = self.rb.version
+        self.rb.append(sp.eye(4))
+        self.assertGreater(self.rb.version, v)
+        v = self.rb.version
+        self.rb.mean()
+        self.rb[:]
+        self.assertEqual(self.rb.version, v)
+        for op in [lambda: self.rb.fill(sp.eye(4)), self.rb.clear,
+                   lambda: self.rb.extend([sp.eye(4)])]:
+            op()
+            self.assertGreater(self.rb.version, v)
+            v = self.rb.version
+
 if __name__ == '__main__':
     ut.main()
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+#_____________________________________________________________________________
+#
+# Copyright (c) 2012 Berlin Institute of Technology
+# All rights reserved.
+#
+# Developed by:	Neural Information Processing Group (NI)
+#               School for Electrical Engineering and Computer Science
+#               Berlin Institute of Technology
+#               MAR 5-6, Marchstr. 23, 10587 Berlin, Germany
+#               http://www.ni.tu-berlin.de/
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to
+# deal with the Software without restriction, including without limitation the
+# rights to use, copy, modify, merge, publish, distribute, sublicense, and/or
+# sell copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# * Redistributions of source code must retain the above copyright notice,
+#   this list of conditions and the following disclaimers.
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimers in the documentation
+#   and/or other materials provided with the distribution.
+# * Neither the names of Neural Information Processing Group (NI), Berlin
+#   Institute of Technology, nor the names of its contributors may be used to
+#   endorse or promote products derived from this Software without specific
+#   prior written permission.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# CONTRIBUTORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+# WITH THE SOFTWARE.
+#_____________________________________________________________________________
+#
+# Acknowledgements:
+#   Philipp Meier <pmeier82@gmail.com>
+#_____________________________________________________________________________
+#
+
+
+##---IMPORTS
+
+try:
+    import unittest2 as ut
+except ImportError:
+    import unittest as ut
+
+import os
+import shutil
+import tempfile
+from numpy.testing import assert_equal
+import scipy as sp
+from botmpy.common import SpikeStore
+
+##---TESTS
+
+class TestSpikeStore(ut.TestCase):
+    def setUp(self):
+        self.st = SpikeStore(capacity=4)
+
+    def testAppendGrow(self):
+        for t in xrange(10):
+            self.st.append(100 - t, t % 3, disc=t, ovlp=t == 5)
+        self.assertEqual(len(self.st), 10)
+        self.assertEqual(self.st.capacity, 16)
+        assert_equal(self.st.get_column('sample'), 100 - sp.arange(10))
+        assert_equal(self.st.get_column('ovlp').nonzero()[0], [5])
+        self.st.extend(sp.arange(20), 7)
+        self.assertEqual(len(self.st), 30)
+        self.assertTrue(sp.isnan(self.st.get_column('disc')[10:]).all())
+        self.assertRaises(KeyError, self.st.get_column, 'foo')
+
+    def testUnitViews(self):
+        self.st.extend([5, 3, 9, 1, 7], [1, 0, 1, 0, 2],
+                       disc=[.5, .3, .9, .1, .7])
+        assert_equal(self.st.get_units(), [0, 1, 2])
+        u1 = self.st.get_unit(1)
+        assert_equal(u1, [5, 9])
+        assert_equal(self.st.get_unit(1, 'disc'), sp.float32([.5, .9]))
+        assert_equal(self.st.get_unit(3), [])
+        # views share memory with the store
+        u1[:] += 100
+        assert_equal(self.st.get_unit(1), [105, 109])
+
+    def testKeepClear(self):
+        self.st.extend(sp.arange(10), 0)
+        self.st.keep(sp.arange(6) % 2 == 0, start=4)
+        assert_equal(self.st.get_column('sample'), [0, 1, 2, 3, 4, 6, 8])
+        self.assertRaises(ValueError, self.st.keep, [True], 0)
+        old = self.st.get_unit(0)
+        self.st.clear()
+        self.assertEqual(len(self.st), 0)
+        self.st.extend(sp.arange(3) + 50, 0)
+        assert_equal(old, [0, 1, 2, 3, 4, 6, 8])
+
+    def testSpill(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            fname = os.path.join(tmp, 'spikes')
+            st = SpikeStore(capacity=2, filename=fname)
+            st.extend(sp.arange(100)[::-1], sp.arange(100) % 2)
+            st.append(1000, 1, disc=1.0)
+            st.flush()
+            self.assertTrue(os.path.exists(fname + '.sample'))
+            self.assertEqual(os.path.getsize(fname + '.sample'),
+                             st.capacity * 8)
+            assert_equal(st.get_unit(0), sp.arange(1, 100, 2))
+            assert_equal(st.get_unit(1)[-1], 1000)
+            st.clear()
+            self.assertEqual(len(st), 0)
+            del st
+        finally:
+            shutil.rmtree(tmp)
+
+if __name__ == '__main__':
+    ut.main()
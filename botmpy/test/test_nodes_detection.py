@@ -84,5 +84,18 @@ class TestSortingNodes(ut.TestCase):
         print SD.events
         print SD.threshold
 
+    def testADCInput(self):
+        gain = sp.array([0.01, 0.02])
+        offset = sp.array([0.5, -0.5])
+        raw = sp.around((self.data - offset) / gain).astype(sp.int16)
+        SD_f = SDMteoNode(dtype=sp.float64)
+        SD_f(raw * gain + offset)
+        SD_i = SDMteoNode(adc_gain=gain, adc_offset=offset)
+        SD_i(raw)
+        self.assertEqual(SD_i.dtype, sp.float32)
+        self.assertEqual(SD_i.data.dtype, sp.int16)
+        assert_array_almost_equal(SD_i.energy, SD_f.energy, decimal=3)
+        assert_array_almost_equal(SD_i.events, SD_f.events)
+
 if __name__ == '__main__':
     ut.main()
@@ -50,9 +50,12 @@ except ImportError:
 
 from numpy.testing import assert_equal, assert_almost_equal
 import scipy as sp
+import scipy.linalg as sp_la
+from scipy.signal import lfilter
 from botmpy.common import (TimeSeriesCovE, mcfilter, mcvec_to_conc,
-                            mcvec_from_conc)
-from botmpy.nodes import MatchedFilterNode, NormalisedMatchedFilterNode
+                            mcvec_from_conc, xi_vs_f)
+from botmpy.nodes import (MatchedFilterNode, NormalisedMatchedFilterNode,
+                          FilterBankNode)
 
 ##---TESTS
 
@@ -79,6 +82,188 @@ class TestFilterNodes(ut.TestCase):
         assert_equal(mf_h.f, f)
         assert_equal(nmf_h.f, f / nf)
 
+    def testFilterBankVsFilters(self):
+        """test filter bank output against the individual filters"""
+        tf = self.tf + 1
+        ce = TimeSeriesCovE(tf_max=tf, nc=self.nc)
+        ce.update(self.noise)
+        fb = FilterBankNode(tf=tf, ce=ce, filter_cls=MatchedFilterNode,
+                            dtype=sp.float64)
+        for k in xrange(3):
+            fb.create_filter(sp.randn(tf, self.nc) * (k + 1))
+        x = self.noise * 0.1
+        fout = sp.vstack([fb(x[:400]), fb(x[400:])])
+        self.assertEqual(fout.shape, (self.len, 3))
+        for k, idx in enumerate(fb._idx_active_set):
+            filt = fb.bank[idx]
+            filt.reset_history()
+            fo = sp.concatenate([filt(x[:400]), filt(x[400:])])
+            assert_almost_equal(fout[:, k], fo)
+        fb.reset_history()
+        assert_almost_equal(fb(x[:400]), fout[:400])
+
+    def testFilterBankADC(self):
+        """test integer input against converted float input"""
+        tf = self.tf + 1
+        ce = TimeSeriesCovE(tf_max=tf, nc=self.nc)
+        ce.update(self.noise)
+        gain = sp.array([0.05, 0.2])
+        offset = sp.array([1.0, -1.0])
+        raw = (sp.randn(self.len, self.nc) * 100).astype(sp.int16)
+        x = raw * gain + offset
+        kwargs = dict(tf=tf, ce=ce, filter_cls=MatchedFilterNode,
+                      dtype=sp.float64)
+        fb_f = FilterBankNode(**kwargs)
+        fb_i = FilterBankNode(adc_gain=gain, adc_offset=offset, **kwargs)
+        xi = sp.randn(2, tf, self.nc)
+        for fb in [fb_f, fb_i]:
+            for k in xrange(2):
+                fb.create_filter(xi[k])
+        fout_f = sp.vstack([fb_f(x[:400]), fb_f(x[400:])])
+        fout_i = sp.vstack([fb_i(raw[:400]), fb_i(raw[400:])])
+        assert_almost_equal(fout_i, fout_f)
+        # single filters of the bank take integer input as well
+        filt = fb_i.bank[0]
+        filt.reset_history()
+        assert_almost_equal(filt(raw), fout_f[:, 0])
+
+    def testFilterLazy(self):
+        """test that filters are only recalculated on changes"""
+        ce = TimeSeriesCovE(tf_max=self.tf, nc=self.nc)
+        ce.update(self.noise)
+        mf = MatchedFilterNode(self.tf, self.nc, ce)
+        mf.append_xi_buf(self.xi, recalc=True)
+        f = mf.f
+        snr = mf.snr
+        mf.calc_filter()
+        self.assertIs(mf.f, f)
+        self.assertIs(mf.snr, snr)
+        version = mf.version
+        mf.append_xi_buf(self.xi * 2, recalc=True)
+        self.assertIsNot(mf.f, f)
+        self.assertNotEqual(mf.version, version)
+        f = mf.f
+        ce.update(self.noise)
+        mf.calc_filter()
+        self.assertIsNot(mf.f, f)
+        f = mf.f
+        mf.calc_filter(force=True)
+        self.assertIsNot(mf.f, f)
+        assert_almost_equal(mf.f, f)
+
+    def testFilterBankXcorrs(self):
+        """test incremental xcorr tensor against a full rebuild"""
+        tf = self.tf + 1
+        ce = TimeSeriesCovE(tf_max=tf, nc=self.nc)
+        ce.update(self.noise)
+        fb = FilterBankNode(tf=tf, ce=ce, filter_cls=MatchedFilterNode,
+                            dtype=sp.float64)
+
+        def full():
+            return xi_vs_f(fb.get_template_set(mc=False),
+                           fb.get_filter_set(mc=False), nc=self.nc)
+
+        for k in xrange(4):
+            fb.create_filter(sp.randn(tf, self.nc))
+            assert_almost_equal(fb.xcorrs, full())
+        fb.deactivate(1)
+        self.assertEqual(fb.xcorrs.shape, (3, 3, 2 * tf - 1))
+        assert_almost_equal(fb.xcorrs, full())
+        fb.bank[2].append_xi_buf(sp.randn(tf, self.nc))
+        fb.activate(1, check=True)
+        assert_almost_equal(fb.xcorrs, full())
+
+    def testFilterBankWhiten(self):
+        """test prewhitening mode against the filters on the raw signal"""
+        tf = self.tf + 1
+        ce = TimeSeriesCovE.white_noise_init(tf, self.nc, std=2.0)
+        for filter_cls in [MatchedFilterNode, NormalisedMatchedFilterNode]:
+            kwargs = dict(tf=tf, ce=ce, filter_cls=filter_cls,
+                          dtype=sp.float64)
+            fb = FilterBankNode(**kwargs)
+            fb_w = FilterBankNode(whiten=True, whiten_order=3, **kwargs)
+            for k in xrange(3):
+                xi = sp.randn(tf, self.nc)
+                fb.create_filter(xi)
+                fb_w.create_filter(xi)
+            # for a white noise estimate the modes agree
+            fout = sp.vstack([fb(self.noise[:400]), fb(self.noise[400:])])
+            fout_w = sp.vstack([fb_w(self.noise[:400]),
+                                fb_w(self.noise[400:])])
+            assert_almost_equal(fout_w, fout, decimal=5)
+            assert_almost_equal(fb_w.xcorrs, fb.xcorrs, decimal=5)
+            assert_almost_equal(fb_w.get_filter_set(), fb.get_filter_set(),
+                                decimal=5)
+        self.assertRaises(ValueError, FilterBankNode, whiten=True,
+                          whiten_order=tf, **kwargs)
+
+    def testFilterBankWhitenColoured(self):
+        """test prewhitening mode on coloured noise"""
+        tf = 21
+        rs = sp.random.RandomState(3)
+        # AR(1) noise, strongly correlated in time
+        noise = lfilter([1.0], [1.0, -0.8], rs.randn(20000, self.nc), axis=0)
+        ce = TimeSeriesCovE(tf_max=tf, nc=self.nc)
+        ce.update(noise)
+        proto = sp.cos(sp.linspace(-sp.pi, 3 * sp.pi, tf)) * sp.hanning(tf)
+        xi_set = [sp.vstack((proto * 5, proto * 4)).T,
+                  sp.vstack((proto * .5, proto * 9)).T,
+                  sp.vstack((proto * 3, -proto * 3)).T]
+        x = noise[:2000].copy()
+        for k, pos in enumerate(xrange(100, 1900, 300)):
+            x[pos:pos + tf] += xi_set[k % 3]
+        for filter_cls in [MatchedFilterNode, NormalisedMatchedFilterNode]:
+            kwargs = dict(tf=tf, ce=ce, filter_cls=filter_cls,
+                          dtype=sp.float64)
+            fb = FilterBankNode(**kwargs)
+            fb_w = FilterBankNode(whiten=True, whiten_order=3, **kwargs)
+            for xi in xi_set:
+                fb.create_filter(xi)
+                fb_w.create_filter(xi)
+            fout = sp.vstack([fb(x[:700]), fb(x[700:])])
+            fout_w = sp.vstack([fb_w(x[:700]), fb_w(x[700:])])
+            # streaming whitening approximates the windowed C^-1 within 4%
+            self.assertLess(sp_la.norm(fout_w - fout) / sp_la.norm(fout),
+                            .05)
+
+    def testFilterBankLowRank(self):
+        """test low-rank mode against the full filter bank"""
+        tf = self.tf + 1
+        ce = TimeSeriesCovE(tf_max=tf, nc=self.nc)
+        ce.update(self.noise)
+        kwargs = dict(tf=tf, ce=ce, filter_cls=MatchedFilterNode,
+                      dtype=sp.float64)
+        fb = FilterBankNode(**kwargs)
+        fb_lr = FilterBankNode(lowrank_tol=1e-6, **kwargs)
+        # 6 filters spanned by 2 waveforms
+        base = sp.randn(2, tf, self.nc)
+        for k in xrange(6):
+            xi = base[0] * sp.cos(k) + base[1] * sp.sin(k)
+            fb.create_filter(xi)
+            fb_lr.create_filter(xi)
+        self.assertIsNone(fb.lowrank_rank)
+        self.assertEqual(fb_lr.lowrank_rank, 2)
+        self.assertLess(fb_lr.lowrank_error.max(), 1e-6)
+        x = self.noise * 0.1
+        fout = sp.vstack([fb(x[:400]), fb(x[400:])])
+        fout_lr = sp.vstack([fb_lr(x[:400]), fb_lr(x[400:])])
+        assert_almost_equal(fout_lr, fout, decimal=5)
+        # refactorised after the filters changed
+        ce.update(sp.randn(*self.noise.shape))
+        for node in [fb, fb_lr]:
+            for filt in node.bank.values():
+                filt.calc_filter()
+        assert_almost_equal(fb_lr(x), fb(x), decimal=5)
+        xi = base[0] * 2 + base[1]
+        fb.bank[0].append_xi_buf(xi, recalc=True)
+        fb_lr.bank[0].append_xi_buf(xi, recalc=True)
+        assert_almost_equal(fb_lr(x), fb(x), decimal=5)
+        # no reduction for unrelated filters
+        fb_lr = FilterBankNode(lowrank_tol=1e-6, **kwargs)
+        for k in xrange(3):
+            fb_lr.create_filter(sp.randn(tf, self.nc))
+        self.assertIsNone(fb_lr.lowrank_rank)
+
     """
     # build signals
     signal = sp.zeros_like(noise)
@@ -48,16 +48,70 @@ try:
 except ImportError:
     import unittest as ut
 
+import os
+import shutil
+import tempfile
 import scipy as sp
-from botmpy.common import TimeSeriesCovE, VERBOSE
+from botmpy.common import TimeSeriesCovE, VERBOSE, shifted_matrix_sub
 from botmpy.nodes import BOTMNode
-from numpy.testing import assert_array_almost_equal
+from numpy.testing import (assert_array_almost_equal, assert_array_equal,
+                           assert_allclose)
+
+##---HELPERS
+
+class SqLogBOTMNode(BOTMNode):
+    """BOTM logging the running squared norm of the filter outputs of each
+    epoch together with the squared norm recalculated after the SIC"""
+
+    def __init__(self, **kwargs):
+        super(SqLogBOTMNode, self).__init__(**kwargs)
+        self.sq_log = []
+
+    def _sort_sic(self, i, spk_ep, n_ep, ep_fout, ep_fout_sq, ep_disc,
+                  ovlp_taus, spks):
+        rval = super(SqLogBOTMNode, self)._sort_sic(
+            i, spk_ep, n_ep, ep_fout, ep_fout_sq, ep_disc, ovlp_taus, spks)
+        self.sq_log.append((rval, sp.square(ep_fout).sum(dtype=sp.float64)))
+        return rval
+
+
+class UncachedBOTMNode(SqLogBOTMNode):
+    """BOTM building the SIC subtrahend for the whole epoch from the xcorr
+    tensor, without the cached subtrahend layout"""
+
+    def _get_sic_sub(self, templ_idx, ep_t, ns):
+        sub = sp.zeros((ns, self.nf))
+        for tidx, tau in templ_idx:
+            sub += shifted_matrix_sub(
+                sp.zeros((ns, self.nf)), self._xcorrs[tidx, :, :].T,
+                tau + ep_t - self._tf + 1)
+        return 0, ns, sub
 
 ##---TESTS
 
 class TestSortingNodes(ut.TestCase):
     def setUp(self):
-        pass
+        self.tf = 21
+        self.nc = 2
+        spike_proto_sc = sp.cos(sp.linspace(-sp.pi, 3 * sp.pi, self.tf))
+        spike_proto_sc *= sp.hanning(self.tf)
+        self.xi1 = sp.vstack((spike_proto_sc * 5, spike_proto_sc * 4)).T
+        self.xi2 = sp.vstack((spike_proto_sc * .5, spike_proto_sc * 9)).T
+        self.xi3 = sp.vstack((spike_proto_sc * 3, -spike_proto_sc * 3)).T
+        self.noise = sp.random.RandomState(1).randn(5000, self.nc)
+        self.ce = TimeSeriesCovE(tf_max=self.tf, nc=self.nc)
+        self.ce.update(self.noise)
+
+    def get_signal(self, length, pos_set):
+        """signal with xi1 at pos and xi2 at pos+tau for (pos, tau) in
+        pos_set, on top of the noise"""
+
+        signal = sp.zeros((length, self.nc))
+        for pos, tau in pos_set:
+            signal[pos:pos + self.tf] += self.xi1
+            signal[pos + tau:pos + tau + self.tf] += self.xi2
+        return sp.ascontiguousarray(signal + self.noise[:length],
+                                    dtype=sp.float32)
 
     def testMainSingle(self, verbose=VERBOSE.PLOT):
         import time
@@ -121,5 +175,190 @@ class TestSortingNodes(ut.TestCase):
         for k in FB.rval:
             assert_array_almost_equal(FB.rval[k], test_rval[k], decimal=0)
 
+    def testOverlapLocal(self):
+        TF = self.tf
+        TAUS = range(-5, 6)
+        LEN = 3000
+        FB = BOTMNode(
+            templates=sp.asarray([self.xi1, self.xi2, self.xi3]),
+            ce=self.ce,
+            ovlp_taus=TAUS,
+            noi_pr=.5)
+        FB(self.get_signal(
+            LEN, [(pos, 3) for pos in xrange(10, LEN - TF, 300)]))
+
+        # discriminants over the complete chunk
+        ns, nf = FB._disc.shape
+        full = sp.empty((ns, nf + nf * (nf - 1) / 2 * len(TAUS)),
+                        dtype=FB.dtype)
+        full[:] = sp.nan
+        full[:, :nf] = FB._disc
+        FB._build_overlap(ns, full, TAUS)
+        for oc, (f0, f1, tau) in FB._oc_idx.items():
+            t = sp.arange(max(0, -tau), min(ns, ns - tau))
+            assert_array_almost_equal(
+                full[t, oc],
+                FB._disc[t, f0] + FB._disc[t + tau, f1] -
+                FB.get_xcorrs_at(f0, f1, tau), decimal=4)
+        for start, stop in [(0, 50), (1000, 1100), (ns - 40, ns)]:
+            assert_array_almost_equal(
+                FB._get_disc(start, stop), full[start:stop])
+        thr = FB._get_ovlp_threshold()
+        self.assertLessEqual(thr, FB._lpr_n)
+        hit = sp.nanmax(full, axis=1) > FB._lpr_n
+        self.assertTrue(hit.any())
+        covered = sp.zeros(ns, dtype=bool)
+        for ep in FB._get_spike_epochs():
+            covered[ep[0]:ep[1] + 1] = True
+        self.assertTrue(covered[hit].all())
+        self.assertEqual(len(FB.rval[0]), len(xrange(10, LEN - TF, 300)))
+        self.assertEqual(len(FB.spike_store),
+                         sum([len(st) for st in FB.rval.values()]))
+        self.assertFalse(sp.isnan(FB.spike_store.get_column('disc')).any())
+
+    def testSicSubtrahend(self):
+        LEN = 3000
+        x = self.get_signal(
+            LEN, [(pos, 3) for pos in xrange(10, LEN - self.tf, 300)])
+        templates = sp.asarray([self.xi1, self.xi2, self.xi3])
+        for taus in [None, range(-5, 6)]:
+            for sic_guard in [True, False]:
+                nodes = [cls(templates=templates, ce=self.ce, ovlp_taus=taus,
+                             sic_guard=sic_guard)
+                         for cls in [SqLogBOTMNode, UncachedBOTMNode]]
+                for FB in nodes:
+                    FB(x)
+                    sq = sp.asarray(FB.sq_log)
+                    self.assertGreater(len(sq), 0)
+                    assert_allclose(sq[:, 0], sq[:, 1], rtol=1e-5)
+                self.assertEqual(sorted(nodes[0].rval), sorted(nodes[1].rval))
+                for k in nodes[0].rval:
+                    assert_array_equal(nodes[0].rval[k], nodes[1].rval[k])
+                assert_allclose(sp.asarray(nodes[0].sq_log),
+                                sp.asarray(nodes[1].sq_log), rtol=1e-5)
+
+        # cached layout is rebuilt when the xcorr tensor changes
+        FB = SqLogBOTMNode(templates=templates, ce=self.ce)
+        FB_ref = UncachedBOTMNode(templates=templates, ce=self.ce)
+        FB(x)
+        xc_sub = FB._get_xcorrs_sub()
+        self.assertIs(FB._get_xcorrs_sub(), xc_sub)
+        for node in [FB, FB_ref]:
+            node.bank[0].append_xi_buf(self.xi1 * 2, recalc=True)
+            node._check_internals()
+        xc_sub_new = FB._get_xcorrs_sub()
+        self.assertIsNot(xc_sub_new, xc_sub)
+        self.assertFalse(sp.allclose(xc_sub_new, xc_sub))
+        assert_array_equal(
+            xc_sub_new, (-FB._xcorrs.transpose(0, 2, 1)).astype(FB.dtype))
+        FB(x)
+        FB_ref(x)
+        for k in FB.rval:
+            assert_array_equal(FB.rval[k], FB_ref.rval[k])
+
+    def testPipeline(self):
+        LEN = 5000
+        x = self.get_signal(
+            LEN, [(pos, 40) for pos in xrange(10, LEN - self.tf - 50, 130)])
+        rval = []
+        for pipeline in [False, True]:
+            FB = BOTMNode(
+                templates=sp.asarray([self.xi1, self.xi2]),
+                ce=self.ce,
+                chunk_size=1111,
+                pipeline=pipeline)
+            self.assertEqual(FB.pipeline, pipeline)
+            FB(x[:3000])
+            FB(x[3000:])
+            rval.append(FB.rval)
+        self.assertEqual(sorted(rval[0]), sorted(rval[1]))
+        for k in rval[0]:
+            self.assertGreater(len(rval[0][k]), 0)
+            assert_array_equal(rval[0][k], rval[1][k])
+
+    def testHalo(self):
+        LEN = 4000
+        CS = 500
+        # spikes across the chunk borders
+        x = self.get_signal(
+            LEN, [(pos - 15, 10) for pos in xrange(CS, LEN, CS)])
+        rval = []
+        for chunk_size, halo in [(LEN, 0), (CS, 2 * self.tf)]:
+            FB = BOTMNode(
+                templates=sp.asarray([self.xi1, self.xi2]),
+                ce=self.ce,
+                chunk_size=chunk_size,
+                halo=halo)
+            FB(x)
+            rval.append(FB.rval)
+        self.assertEqual(sorted(rval[0]), sorted(rval[1]))
+        for k in rval[0]:
+            self.assertEqual(len(rval[0][k]), LEN / CS - 1)
+            assert_array_equal(rval[0][k], rval[1][k])
+        self.assertRaises(ValueError, BOTMNode,
+                          templates=sp.asarray([self.xi1]), ce=self.ce,
+                          halo=-1)
+
+    def testSortStream(self):
+        LEN = 4000
+        CS = 1000
+        x = self.get_signal(
+            LEN, [(pos, 50) for pos in xrange(100, LEN - self.tf, 200)])
+        templates = sp.asarray([self.xi1, self.xi2])
+        FB = BOTMNode(templates=templates, ce=self.ce, chunk_size=CS)
+        FB(x)
+        FB_s = BOTMNode(templates=templates, ce=self.ce)
+        rval = list(FB_s.sort_stream(x[i:i + CS] for i in xrange(0, LEN, CS)))
+        self.assertEqual(len(rval), LEN / CS)
+        units = sp.concatenate([units for units, _ in rval])
+        samples = sp.concatenate([samples for _, samples in rval])
+        self.assertTrue((sp.diff(samples) >= 0).all())
+        for k in FB.rval:
+            self.assertGreater(len(FB.rval[k]), 0)
+            assert_array_equal(samples[units == k], FB.rval[k])
+
+    def testStoreFile(self):
+        LEN = 4000
+        x = self.get_signal(
+            LEN, [(pos, 50) for pos in xrange(100, LEN - self.tf, 200)])
+        templates = sp.asarray([self.xi1, self.xi2])
+        tmp = tempfile.mkdtemp()
+        try:
+            for store_file in [None, os.path.join(tmp, 'spikes')]:
+                FB = BOTMNode(templates=templates, ce=self.ce,
+                              store_file=store_file)
+                FB(x)
+                rval = FB.rval
+                rval_copy = dict([(k, rval[k].copy()) for k in rval])
+                # the next call must not change the previous result
+                FB(x[::-1].copy())
+                for k in rval:
+                    self.assertGreater(len(rval[k]), 0)
+                    assert_array_equal(rval[k], rval_copy[k])
+            self.assertTrue(os.path.exists(store_file + '.sample'))
+            del FB
+        finally:
+            shutil.rmtree(tmp)
+
+    def testSpikesAll(self):
+        LEN = 4000
+        pos_set = [(pos, 100) for pos in xrange(100, LEN - 200, 200)]
+        pos_set.append((3900, 5))
+        FB = BOTMNode(templates=sp.asarray([self.xi1, self.xi2]), ce=self.ce)
+        FB(self.get_signal(LEN, pos_set))
+        rval = dict([(k, FB.rval[k].copy()) for k in FB.rval])
+        for rsf in [1., 2.]:
+            for exclude in [False, True]:
+                spks = FB.spikes_all(exclude_overlaps=exclude, align_rsf=rsf)
+                self.assertEqual(sorted(spks), sorted(FB.rval))
+                for u in FB.rval:
+                    assert_array_almost_equal(
+                        spks[u], FB.spikes_u(u, exclude_overlaps=exclude,
+                                             align_rsf=rsf))
+                    assert_array_equal(FB.rval[u], rval[u])
+        spks = FB.spikes_all()
+        self.assertLess(sum([len(spks[u]) for u in spks]),
+                        sum([len(FB.rval[u]) for u in FB.rval]))
+
 if __name__ == '__main__':
     ut.main()